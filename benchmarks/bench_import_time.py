@@ -0,0 +1,153 @@
+"""
+Import Time Benchmark
+
+This benchmark measures the cold import time of the modules that workers and CLI tools import
+on every launch, with `python -X importtime` in a fresh interpreter per run, and reports:
+    - the best and median cumulative import time of every module
+    - the modules that took the most time to import themselves (`--top`)
+
+A budget file lists the allowed import time of every module and the packages it must not import
+(e.g. `rag.rag_api` must not import LangChain, which is only loaded when a store is created or
+queried). Budgets are stored together with the time of the calibration loop of
+`bench_message_hot_paths`, so they are scaled to the speed of the machine before they are
+compared. With `--budget`, the run fails (exit code 1) when a module is over its budget or
+imports a forbidden package.
+
+Example Usage:
+    ```bash
+    python -m benchmarks.bench_import_time
+    python -m benchmarks.bench_import_time --budget
+    python -m benchmarks.bench_import_time --modules rag.rag_api rag.numpy_store --top 20
+    ```
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.bench_message_hot_paths import calibrate
+
+DEFAULT_BUDGET = os.path.join(os.path.dirname(__file__), "baselines", "import_time.json")
+DEFAULT_MODULES = ["message", "chat", "rag.rag_api", "rag.rag_handler"]
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Written to stderr right before the import, so the imports of the interpreter startup are skipped
+MARKER = "-- import time benchmark --"
+
+def import_once(module: str) -> Tuple[float, List[Tuple[str, float]], List[str]]:
+    """
+    Import a module in a fresh interpreter with `-X importtime`.
+
+    Args:
+        module (str): The module to import
+
+    Returns:
+        Tuple[float, List[Tuple[str, float]], List[str]]: The cumulative import time in seconds,
+        the self time in seconds of every imported module, and the names of all loaded modules
+    """
+    code = f"import sys, json; sys.stderr.write({MARKER!r} + '\\n'); import {module}; print(json.dumps(sorted(sys.modules)))"
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPOSITORY_DIR, capture_output=True, text=True, check=True
+    )
+
+    total_us = 0
+    self_times = []
+    lines = process.stderr.split(MARKER, 1)[1].splitlines()
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        self_times.append((name.strip(), int(self_us) / 1e6))
+        # Only the top level entries add up to the import time, the others are included in them
+        if not name.startswith("  "):
+            total_us += int(cumulative_us)
+    return total_us / 1e6, self_times, json.loads(process.stdout)
+
+def measure(module: str, repeat: int) -> Dict[str, Any]:
+    """
+    Import a module `repeat` times.
+
+    Args:
+        module (str): The module to import
+        repeat (int): Number of fresh interpreters
+
+    Returns:
+        Dict[str, Any]: Median and minimum time in seconds, the slowest self times of the
+        fastest run and the loaded modules
+    """
+    runs = [import_once(module) for _ in range(repeat)]
+    best = min(runs, key=lambda run: run[0])
+    return {
+        "median_s": statistics.median(run[0] for run in runs),
+        "min_s": best[0],
+        "self_times": sorted(best[1], key=lambda item: item[1], reverse=True),
+        "modules": best[2],
+    }
+
+def check_budget(results: Dict[str, Dict[str, Any]], calibration_s: float, budget: Dict[str, Any]) -> List[str]:
+    """
+    Compare the best import times and loaded modules of a run against a budget.
+
+    Args:
+        results (Dict[str, Dict[str, Any]]): The measurements by module
+        calibration_s (float): The calibration time of this run
+        budget (Dict[str, Any]): The budget file
+
+    Returns:
+        List[str]: A description of every violation
+    """
+    scale = calibration_s / budget["calibration_s"]
+    violations = []
+    for module, result in results.items():
+        if module not in budget["modules"]:
+            continue
+        module_budget = budget["modules"][module]
+        allowed_s = module_budget["max_ms"] / 1000 * scale
+        if result["min_s"] > allowed_s:
+            violations.append(f"{module}: {1000 * result['min_s']:.1f} ms vs {1000 * allowed_s:.1f} ms budget")
+        for package in module_budget.get("forbidden", []):
+            loaded = [name for name in result["modules"] if name == package or name.startswith(package + ".")]
+            if loaded:
+                violations.append(f"{module}: imports {package} ({len(loaded)} modules)")
+    return violations
+
+def main() -> None:
+    """
+    Parse the arguments, measure every module, print a report and check the budget.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES, help="Modules to import")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=5, help="Slowest imported modules to list per module")
+    parser.add_argument("--budget", nargs="?", const=DEFAULT_BUDGET, help="Fail when a module is over this budget JSON")
+    args = parser.parse_args()
+
+    calibration_s = calibrate()
+    results = {}
+    print(f"calibration={1000 * calibration_s:.1f} ms repeat={args.repeat}")
+    print(f"{'module':<30} {'median ms':>10} {'min ms':>10} {'modules':>8}")
+    for module in args.modules:
+        results[module] = measure(module, args.repeat)
+        print(f"{module:<30} {1000 * results[module]['median_s']:>10.1f} {1000 * results[module]['min_s']:>10.1f} {len(results[module]['modules']):>8}")
+        for name, self_s in results[module]["self_times"][:args.top]:
+            print(f"    {name:<40} {1000 * self_s:>8.1f} ms")
+
+    if args.budget:
+        with open(args.budget) as budget_file:
+            violations = check_budget(results, calibration_s, json.load(budget_file))
+        if violations:
+            print(f"\n{len(violations)} budget violation(s):")
+            for violation in violations:
+                print(f"  {violation}")
+            sys.exit(1)
+        print("\nAll modules within budget.")
+
+if __name__ == "__main__":
+    main()
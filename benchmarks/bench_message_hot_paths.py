@@ -0,0 +1,262 @@
+"""
+Message and Chat Hot Path Benchmark
+
+This benchmark times the message / chat code paths that run on every streamed token or
+every rerun of a Streamlit app:
+    - SinglePartMessage.create_message
+    - token-by-token Chat.append_message_chunk_by_attribute (1,000 / 10,000 / 100,000 tokens)
+    - multipart promotion (alternating message types from the same author)
+    - get_message_type_list on a long chat
+    - to_dict / from_dict on a chat with image, file and audio payloads
+    - validate_type on large lists
+
+Every case is run `--repeat` times and its median and best time are reported; regressions are
+judged on the best time, which is the least sensitive to noise. Baselines are stored as
+JSON together with the time of a fixed pure-Python calibration loop, so a baseline recorded on
+one machine can be compared on another: times are scaled by the ratio of the calibration
+times before they are compared. With `--baseline`, the run fails (exit code 1) when any case
+is slower than its baseline by more than `--threshold`.
+
+Example Usage:
+    ```bash
+    python -m benchmarks.bench_message_hot_paths
+    python -m benchmarks.bench_message_hot_paths --save-baseline benchmarks/baselines/message_hot_paths.json
+    python -m benchmarks.bench_message_hot_paths --baseline benchmarks/baselines/message_hot_paths.json --threshold 0.25
+    python -m benchmarks.bench_message_hot_paths --tokens 1000 10000 --only append
+    ```
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from chat import Chat
+from helper_functions import validate_type
+from message import SinglePartMessage
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "message_hot_paths.json")
+
+def calibrate(loops: int = 1_000_000, runs: int = 7) -> float:
+    """
+    Time a fixed pure-Python loop, used to compare results across machines.
+
+    Args:
+        loops (int): Number of loop iterations
+        runs (int): Number of timed runs
+
+    Returns:
+        float: The best time of all runs in seconds
+    """
+    best = float("inf")
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        total = 0
+        for number in range(loops):
+            total += number % 7
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+def make_media_chat(messages: int, payload_bytes: int) -> Chat:
+    """
+    Build a chat that alternates text with image, file and audio payloads.
+
+    Args:
+        messages (int): Number of media messages
+        payload_bytes (int): Size of every payload
+
+    Returns:
+        Chat: The chat
+    """
+    chat = Chat()
+    payload = os.urandom(payload_bytes)
+    media_types = ["image_base64", "file_base64", "audio_base64"]
+    for number in range(messages):
+        message_type = media_types[number % len(media_types)]
+        chat.append_message(SinglePartMessage.create_message(
+            author="user", author_type="human", message_type="text", message_value={"text": f"Message {number}"}
+        ))
+        chat.append_message(SinglePartMessage.create_message(
+            author="assistant", author_type="genai", message_type=message_type,
+            message_value={"filename": f"payload-{number}", message_type: payload, "mime_type": "application/octet-stream"}
+        ))
+    return chat
+
+def stream_tokens(tokens: int) -> Callable[[], Any]:
+    """
+    Case factory: append `tokens` tokens one by one to a new chat.
+    """
+    def run() -> Chat:
+        chat = Chat()
+        for _ in range(tokens):
+            chat.append_message_chunk_by_attribute(
+                author="assistant", author_type="genai", message_type="text", message_chunk_by_attribute="tok ", key="text"
+            )
+        return chat
+    return run
+
+def create_messages(count: int) -> Callable[[], Any]:
+    """
+    Case factory: create `count` text messages.
+    """
+    def run() -> List[SinglePartMessage]:
+        return [
+            SinglePartMessage.create_message(author="user", author_type="human", message_type="text", message_value={"text": "Hello"})
+            for _ in range(count)
+        ]
+    return run
+
+def promote_multipart(parts: int) -> Callable[[], Any]:
+    """
+    Case factory: stream alternating message types from one author, so the first change
+    promotes the message to a multipart message and every later one extends it.
+    """
+    def run() -> Chat:
+        chat = Chat()
+        for number in range(parts):
+            message_type, key = ("text", "text") if number % 2 == 0 else ("rag_response", "answer")
+            chat.append_message_chunk_by_attribute(
+                author="assistant", author_type="genai", message_type=message_type, message_chunk_by_attribute="tok ", key=key
+            )
+        return chat
+    return run
+
+def message_type_list(messages: int) -> Callable[[], Any]:
+    """
+    Case factory: get the message types of a long chat that alternates text messages
+    and multipart answers.
+    """
+    chat = Chat()
+    for _ in range(messages // 2):
+        chat.append_message(SinglePartMessage.create_message(
+            author="user", author_type="human", message_type="text", message_value={"text": "Hello"}
+        ))
+        for message_type, key in (("text", "text"), ("rag_response", "answer")):
+            chat.append_message_chunk_by_attribute(
+                author="assistant", author_type="genai", message_type=message_type, message_chunk_by_attribute="Hi", key=key
+            )
+    return chat.get_message_type_list
+
+def round_trip(messages: int, payload_bytes: int) -> Callable[[], Any]:
+    """
+    Case factory: serialize a chat with media payloads and load it again.
+    """
+    chat = make_media_chat(messages, payload_bytes)
+    return lambda: Chat.from_dict(chat.to_dict())
+
+def validate_list(items: int) -> Callable[[], Any]:
+    """
+    Case factory: validate a large list of store IDs and a large dict of lists.
+    """
+    store_ids = [f"store-{number}" for number in range(items)]
+    postings = {f"term-{number}": [number, number + 1] for number in range(items // 10)}
+    def run() -> bool:
+        return validate_type(store_ids, Union[str, list[str]]) and validate_type(postings, dict[str, list[int]])
+    return run
+
+def build_cases(tokens: List[int]) -> List[Tuple[str, Callable[[], Callable[[], Any]]]]:
+    """
+    Return the benchmark cases as (name, factory) pairs; factories do the setup and
+    return the function to time.
+
+    Args:
+        tokens (List[int]): The token counts of the streaming cases
+
+    Returns:
+        List[Tuple[str, Callable[[], Callable[[], Any]]]]: The cases
+    """
+    cases = [("create_message[1000]", lambda: create_messages(1_000))]
+    cases += [(f"append_chunk_by_attribute[{count}]", lambda count=count: stream_tokens(count)) for count in tokens]
+    cases += [
+        ("multipart_promotion[1000]", lambda: promote_multipart(1_000)),
+        ("get_message_type_list[1000]", lambda: message_type_list(1_000)),
+        ("to_dict_from_dict_media[100x64KB]", lambda: round_trip(100, 64 * 1024)),
+        ("validate_type[100000]", lambda: validate_list(100_000)),
+    ]
+    return cases
+
+def time_case(factory: Callable[[], Callable[[], Any]], repeat: int) -> Dict[str, float]:
+    """
+    Run one case `repeat` times.
+
+    Args:
+        factory (Callable[[], Callable[[], Any]]): The case factory
+        repeat (int): Number of timed runs
+
+    Returns:
+        Dict[str, float]: Median, minimum and maximum time in seconds
+    """
+    function = factory()
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start_time)
+    return {"median_s": statistics.median(times), "min_s": min(times), "max_s": max(times)}
+
+def compare(results: Dict[str, Dict[str, float]], calibration_s: float, baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Compare the best times of a run against a baseline.
+
+    Args:
+        results (Dict[str, Dict[str, float]]): The times by case
+        calibration_s (float): The calibration time of this run
+        baseline (Dict[str, Any]): A baseline written with --save-baseline
+        threshold (float): Allowed relative slowdown, e.g. 0.25 for 25%
+
+    Returns:
+        List[str]: A description of every regression
+    """
+    scale = calibration_s / baseline["calibration_s"]
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline["results"]:
+            continue
+        expected = baseline["results"][name]["min_s"] * scale
+        if result["min_s"] > expected * (1.0 + threshold):
+            regressions.append(f"{name}: {1000 * result['min_s']:.2f} ms vs {1000 * expected:.2f} ms baseline (+{100 * (result['min_s'] / expected - 1):.0f}%)")
+    return regressions
+
+def main() -> None:
+    """
+    Parse the arguments, run the cases, print a report and check the baseline.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--tokens", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="Token counts of the streaming cases")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    parser.add_argument("--only", help="Only run cases whose name contains this text")
+    parser.add_argument("--baseline", nargs="?", const=DEFAULT_BASELINE, help="Fail on regressions against this baseline JSON")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative slowdown against the baseline")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="Write the results to this baseline JSON")
+    args = parser.parse_args()
+
+    calibration_s = calibrate()
+    results = {}
+    print(f"calibration={1000 * calibration_s:.1f} ms repeat={args.repeat}")
+    print(f"{'case':<40} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for name, factory in build_cases(args.tokens):
+        if args.only and args.only not in name:
+            continue
+        results[name] = time_case(factory, args.repeat)
+        print(f"{name:<40} {1000 * results[name]['median_s']:>10.2f} {1000 * results[name]['min_s']:>10.2f} {1000 * results[name]['max_s']:>10.2f}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump({"python": sys.version.split()[0], "calibration_s": calibration_s, "results": results}, baseline_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, calibration_s, json.load(baseline_file), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {100 * args.threshold:.0f}%:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {100 * args.threshold:.0f}%.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Offline RAG Benchmark
+
+This benchmark measures ingestion and query performance of `rag.rag_api.RAGService` without
+an OpenAI key: the service is created with deterministic local embeddings (feature hashing of
+the word tokens) and a stub LLM (`FakeListLLM`), so every run embeds and retrieves the same way.
+
+It runs `create_vectorstore` over the bundled `rag/test-data/*.pdf` and over synthetic text
+corpora of configurable size, for every requested backend and retrieval mode, and reports:
+    - total ingestion time and the busy time of its parse, split, embed and index stages
+      (the stages run concurrently)
+    - mean and p95 latency of retrieval alone and of a full `query` (retrieval + stub LLM)
+    - peak RSS of the run
+    - size of the store on disk
+
+Every configuration runs in a fresh process, so peak RSS belongs to that configuration only.
+Files are parsed by `--parse-workers` processes with a cold parse cache, so parse time measures
+the parsing itself; compare runs with different worker counts to check how it scales.
+Parsing the PDFs needs `unstructured` and `pdfminer.six`; the "chroma" backend needs `chromadb`.
+
+Example Usage:
+    ```bash
+    python -m benchmarks.bench_rag_offline
+    python -m benchmarks.bench_rag_offline --synthetic 100 1000 --words 800 --backends numpy --retrieval-modes vector hybrid
+    python -m benchmarks.bench_rag_offline --no-pdfs --synthetic 5000 --json rag_offline.json
+    python -m benchmarks.bench_rag_offline --no-pdfs --synthetic 1000 --parse-workers 1  # serial parsing
+    ```
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from langchain.llms.fake import FakeListLLM
+
+from rag.lexical_index import tokenize
+from rag.parsing import DocumentParser
+from rag.rag_api import RAGService
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rag", "test-data")
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic local embeddings: every word token is hashed to a signed dimension and the
+    resulting bag-of-words vector is normalized. Texts sharing words get similar vectors, so
+    retrieval behaves sensibly without a model.
+
+    Attributes:
+        dim (int): Vector dimension
+        embed_seconds (float): Total time spent embedding
+    """
+
+    def __init__(self, dim: int = 384):
+        """
+        Initialize the embeddings.
+
+        Args:
+            dim (int): Vector dimension
+        """
+        self.dim = dim
+        self.embed_seconds = 0.0
+
+    def _embed(self, text: str) -> List[float]:
+        """
+        Embed one text.
+        """
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += 1.0 if digest & (1 << 63) else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        start_time = time.perf_counter()
+        vectors = [self._embed(text) for text in texts]
+        self.embed_seconds += time.perf_counter() - start_time
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+class _TimedRAGService(RAGService):
+    """
+    A RAGService that records the busy time of every ingestion stage. The stages run
+    concurrently, so their times can add up to more than the total ingestion time.
+
+    Attributes:
+        stage_seconds (Dict[str, float]): Time per stage; "index" includes the embedding time
+        chunk_texts (List[str]): The texts of the indexed chunks, used to sample queries
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.stage_seconds = {"parse": 0.0, "split": 0.0, "index": 0.0}
+        self.chunk_texts = []
+
+    def _iter_documents(self, files):
+        parsed_files = super()._iter_documents(files)
+        while True:
+            start_time = time.perf_counter()
+            documents = next(parsed_files, None)
+            self.stage_seconds["parse"] += time.perf_counter() - start_time
+            if documents is None:
+                return
+            yield documents
+
+    def _split_documents(self, documents, chunking_options=None):
+        start_time = time.perf_counter()
+        chunks = super()._split_documents(documents, chunking_options)
+        self.stage_seconds["split"] += time.perf_counter() - start_time
+        return chunks
+
+    def _add_batch(self, vectorstore, lexical_index, batch):
+        start_time = time.perf_counter()
+        super()._add_batch(vectorstore, lexical_index, batch)
+        self.stage_seconds["index"] += time.perf_counter() - start_time
+        self.chunk_texts.extend(chunk.page_content for chunk in batch)
+
+def make_synthetic_corpus(directory: str, documents: int, words: int, seed: int) -> List[str]:
+    """
+    Write a synthetic text corpus with a Zipf-like word distribution.
+
+    Args:
+        directory (str): Directory the text files are written to
+        documents (int): Number of documents
+        words (int): Words per document
+        seed (int): Random seed
+
+    Returns:
+        List[str]: The paths of the documents
+    """
+    rng = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ne", "ru", "sa", "te", "vo", "zu", "pri", "dal", "gen"]
+    vocabulary = sorted({"".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(20_000)})
+    weights = [1.0 / rank for rank in range(1, len(vocabulary) + 1)]
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for number in range(documents):
+        sentences = []
+        document_words = rng.choices(vocabulary, weights=weights, k=words)
+        for start in range(0, words, 15):
+            sentences.append(" ".join(document_words[start:start + 15]).capitalize() + ".")
+        path = os.path.join(directory, f"document-{number:06d}.txt")
+        with open(path, "w") as document_file:
+            document_file.write("\n".join(" ".join(sentences[start:start + 5]) for start in range(0, len(sentences), 5)))
+        paths.append(path)
+    return paths
+
+def make_queries(chunks: List[str], count: int, seed: int) -> List[str]:
+    """
+    Sample queries as short word windows of the indexed chunks.
+
+    Args:
+        chunks (List[str]): The chunk texts
+        count (int): Number of queries
+        seed (int): Random seed
+
+    Returns:
+        List[str]: The queries
+    """
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        words = rng.choice(chunks).split()
+        start = rng.randint(0, max(len(words) - 6, 0))
+        queries.append(" ".join(words[start:start + 6]))
+    return queries
+
+def directory_bytes(directory: str) -> int:
+    """
+    Return the total size of all files below a directory.
+    """
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory)
+        for name in names
+    )
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """
+    Return the mean and p95 of latencies in milliseconds.
+    """
+    return {
+        "mean_ms": 1000 * statistics.mean(latencies),
+        "p95_ms": 1000 * float(np.percentile(latencies, 95)),
+    }
+
+def run_configuration(configuration: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build one store and query it. Runs in its own process.
+
+    Args:
+        configuration (Dict[str, Any]): Corpus files, backend, retrieval mode and query settings
+
+    Returns:
+        Dict[str, Any]: The measurements
+    """
+    embeddings = HashingEmbeddings(dim=configuration["dim"])
+    with tempfile.TemporaryDirectory() as persist_dir:
+        service = _TimedRAGService(
+            persist_dir=persist_dir,
+            vector_backend=configuration["backend"],
+            retrieval_mode=configuration["retrieval_mode"],
+            retrieval_options={"k": configuration["k"]},
+            chunking_options=configuration["chunking_options"],
+            embeddings=embeddings,
+            llm_factory=lambda streaming=False: FakeListLLM(responses=["This is a stub answer."]),
+            document_parser=DocumentParser(cache_dir=os.path.join(persist_dir, ".parse_cache"), max_workers=configuration["parse_workers"])
+        )
+
+        start_time = time.perf_counter()
+        result = service.create_vectorstore(files=configuration["files"], store_id="bench")
+        total_seconds = time.perf_counter() - start_time
+
+        queries = make_queries(service.chunk_texts, configuration["queries"], configuration["seed"])
+
+        retriever = service._create_retriever("bench")
+        retrieve_latencies = []
+        for query in queries:
+            query_start = time.perf_counter()
+            retriever.get_relevant_documents(query)
+            retrieve_latencies.append(time.perf_counter() - query_start)
+
+        query_latencies = []
+        for query in queries:
+            query_start = time.perf_counter()
+            service.query("bench", query)
+            query_latencies.append(time.perf_counter() - query_start)
+
+        disk_bytes = directory_bytes(os.path.join(persist_dir, "bench"))
+
+    return {
+        "corpus": configuration["corpus"],
+        "parse_workers": service.document_parser.max_workers,
+        "backend": configuration["backend"],
+        "retrieval_mode": configuration["retrieval_mode"],
+        "files": len(configuration["files"]),
+        "chunks": result["document_count"],
+        "ingest_s": total_seconds,
+        "parse_s": service.stage_seconds["parse"],
+        "split_s": service.stage_seconds["split"],
+        "embed_s": embeddings.embed_seconds,
+        "index_s": service.stage_seconds["index"] - embeddings.embed_seconds,
+        "retrieve": latency_summary(retrieve_latencies),
+        "query": latency_summary(query_latencies),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "disk_mb": disk_bytes / 1e6,
+    }
+
+def run_isolated(configuration: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run a configuration in a fresh process so its peak RSS is not shared with other runs.
+    Unlike the workers of a `multiprocessing.Pool`, the process is not a daemon, so the
+    document parser can start its own worker processes in it.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(run_configuration, configuration).result()
+
+def main() -> None:
+    """
+    Parse the arguments, run every configuration and print a report.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--synthetic", type=int, nargs="*", default=[100, 1000], help="Document counts of the synthetic corpora")
+    parser.add_argument("--words", type=int, default=500, help="Words per synthetic document")
+    parser.add_argument("--no-pdfs", action="store_true", help="Skip the bundled rag/test-data PDFs")
+    parser.add_argument("--backends", nargs="+", default=["numpy", "chroma"], help="Vector backends to run")
+    parser.add_argument("--retrieval-modes", nargs="+", default=["vector", "hybrid"], help="Retrieval modes to run")
+    parser.add_argument("--queries", type=int, default=50, help="Queries per configuration")
+    parser.add_argument("--k", type=int, default=4, help="Results per query")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Chunk size in tokens")
+    parser.add_argument("--chunk-overlap", type=int, default=32, help="Chunk overlap in tokens")
+    parser.add_argument("--parse-workers", type=int, default=None, help="Parsing processes, defaults to the available CPUs")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        corpora = {}
+        if not args.no_pdfs:
+            corpora["test-data-pdfs"] = sorted(glob.glob(os.path.join(TEST_DATA_DIR, "*.pdf")))
+        for documents in args.synthetic:
+            corpora[f"synthetic-{documents}"] = make_synthetic_corpus(
+                os.path.join(corpus_dir, str(documents)), documents, args.words, args.seed
+            )
+
+        results = []
+        print(f"{'corpus':<18} {'backend':<7} {'mode':<7} {'chunks':>7} {'ingest s':>8} {'parse s':>8} {'split s':>8} {'embed s':>8} {'index s':>8} "
+              f"{'retr ms':>8} {'retr p95':>8} {'query ms':>9} {'rss MB':>8} {'disk MB':>8}")
+        for corpus, files in corpora.items():
+            for backend in args.backends:
+                for retrieval_mode in args.retrieval_modes:
+                    result = run_isolated({
+                        "corpus": corpus, "files": files, "backend": backend, "retrieval_mode": retrieval_mode,
+                        "queries": args.queries, "k": args.k, "dim": args.dim, "seed": args.seed,
+                        "parse_workers": args.parse_workers,
+                        "chunking_options": {"chunk_size": args.chunk_size, "chunk_overlap": args.chunk_overlap},
+                    })
+                    results.append(result)
+                    print(
+                        f"{corpus:<18} {backend:<7} {retrieval_mode:<7} {result['chunks']:>7} {result['ingest_s']:>8.2f} {result['parse_s']:>8.2f} "
+                        f"{result['split_s']:>8.2f} {result['embed_s']:>8.2f} {result['index_s']:>8.2f} "
+                        f"{result['retrieve']['mean_ms']:>8.2f} {result['retrieve']['p95_ms']:>8.2f} {result['query']['mean_ms']:>9.2f} "
+                        f"{result['peak_rss_mb']:>8.1f} {result['disk_mb']:>8.2f}"
+                    )
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump({"arguments": vars(args), "results": results}, json_file, indent=2)
+
+if __name__ == "__main__":
+    main()
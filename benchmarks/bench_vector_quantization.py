@@ -0,0 +1,155 @@
+"""
+Vector Quantization Benchmark
+
+This benchmark reports the recall / latency / memory trade-offs of the embedding storage
+types of `rag.numpy_store.NumpyVectorStore` ("float32", "float16", "int8"), with and
+without full-precision re-ranking. It runs on synthetic clustered embeddings, so it needs
+neither an API key nor any documents.
+
+For every configuration it reports:
+    - recall@k against exact float32 search
+    - mean and p95 query latency
+    - resident bytes (the matrix that is scanned on every query, plus int8 scales)
+    - total bytes on disk (including the float32 copy kept for re-ranking)
+
+Example Usage:
+    ```bash
+    python -m benchmarks.bench_vector_quantization --rows 100000 --dim 384 --queries 200
+    python -m benchmarks.bench_vector_quantization --json quantization.json
+    ```
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from rag.numpy_store import NumpyVectorStore
+
+CONFIGURATIONS = [
+    {"dtype": "float32", "full_precision_rerank": False},
+    {"dtype": "float16", "full_precision_rerank": False},
+    {"dtype": "float16", "full_precision_rerank": True},
+    {"dtype": "int8", "full_precision_rerank": False},
+    {"dtype": "int8", "full_precision_rerank": True},
+]
+
+class _UnusedEmbeddings(Embeddings):
+    """
+    Placeholder embeddings; the benchmark only inserts and searches raw vectors.
+    """
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> List[float]:
+        raise NotImplementedError
+
+def make_embeddings(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """
+    Generate clustered, normalized vectors that resemble text embeddings.
+
+    Args:
+        rows (int): Number of vectors
+        dim (int): Vector dimension
+        clusters (int): Number of clusters
+        seed (int): Random seed
+
+    Returns:
+        np.ndarray: The (rows, dim) float32 vectors
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, size=rows)] + 0.5 * rng.normal(size=(rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def directory_bytes(directory: str, filenames: List[str]) -> int:
+    """
+    Sum the size of the given files of a directory (missing files count as 0).
+    """
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in filenames if os.path.exists(os.path.join(directory, name)))
+
+def run_configuration(vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int, configuration: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a store with one configuration and measure recall, latency and size.
+
+    Args:
+        vectors (np.ndarray): The corpus vectors
+        queries (np.ndarray): The query vectors
+        truth (np.ndarray): Exact top-k rows of every query
+        k (int): Number of results per query
+        configuration (Dict[str, Any]): NumpyVectorStore options
+
+    Returns:
+        Dict[str, Any]: The measurements
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        store = NumpyVectorStore(embedding=_UnusedEmbeddings(), persist_directory=directory, **configuration)
+        texts = [str(row) for row in range(len(vectors))]
+        for start in range(0, len(vectors), 10_000):
+            store.add_embeddings(texts[start:start + 10_000], vectors[start:start + 10_000])
+        store.persist()
+
+        latencies = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            start_time = time.perf_counter()
+            rows, _ = store._search(query, k)
+            latencies.append(time.perf_counter() - start_time)
+            hits += len(set(rows.tolist()) & set(expected.tolist()))
+
+        matrix_file = NumpyVectorStore.EMBEDDINGS_FILES[configuration["dtype"]]
+        resident_files = [matrix_file, NumpyVectorStore.SCALES_FILE]
+        embedding_files = resident_files + [NumpyVectorStore.FULL_PRECISION_FILE]
+
+        return {
+            **configuration,
+            "recall_at_k": hits / (len(queries) * k),
+            "mean_latency_ms": 1000 * float(np.mean(latencies)),
+            "p95_latency_ms": 1000 * float(np.percentile(latencies, 95)),
+            "resident_bytes": directory_bytes(directory, resident_files),
+            "disk_bytes": directory_bytes(directory, embedding_files),
+        }
+
+def main() -> None:
+    """
+    Parse the arguments, run every configuration and print a report.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="Number of stored vectors")
+    parser.add_argument("--dim", type=int, default=384, help="Vector dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--k", type=int, default=10, help="Results per query")
+    parser.add_argument("--clusters", type=int, default=256, help="Number of clusters in the synthetic data")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    vectors = make_embeddings(args.rows, args.dim, args.clusters, args.seed)
+    queries = make_embeddings(args.queries, args.dim, args.clusters, args.seed + 1)
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+
+    results = [run_configuration(vectors, queries, truth, args.k, configuration) for configuration in CONFIGURATIONS]
+
+    baseline_bytes = results[0]["resident_bytes"]
+    print(f"rows={args.rows} dim={args.dim} queries={args.queries} k={args.k}")
+    print(f"{'dtype':<8} {'rerank':<7} {'recall@k':>9} {'mean ms':>9} {'p95 ms':>9} {'resident MB':>12} {'reduction':>10} {'disk MB':>9}")
+    for result in results:
+        print(
+            f"{result['dtype']:<8} {str(result['full_precision_rerank']):<7} {result['recall_at_k']:>9.4f} "
+            f"{result['mean_latency_ms']:>9.3f} {result['p95_latency_ms']:>9.3f} "
+            f"{result['resident_bytes'] / 1e6:>12.2f} {baseline_bytes / result['resident_bytes']:>9.2f}x "
+            f"{result['disk_bytes'] / 1e6:>9.2f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump({"arguments": vars(args), "results": results}, json_file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -11,10 +11,39 @@ License Info: See license.txt file
 #
 # Import the correct packages
 #
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import Union, Any
 from datetime import datetime
 from message import SinglePartMessage, MultiPartMessage
+from helper_functions import get_payload_size
+import instrumentation
+
+#
+# Size accounting of a chat
+#
+class _SizeAccounting:
+    """
+    The size accounting state of a chat. Only the messages before the last one are accounted for,
+    as the last message keeps changing while it is streamed and is measured when the size is read.
+
+    Attributes:
+        messages: list: The messages list that is accounted for (the accounting restarts if chat.messages is reassigned).
+        message_sizes: list[dict]: The size by message type of every accounted message.
+        size_by_type: dict: The total size by message type of the accounted messages.
+        size: int: The total size of the accounted messages.
+        memory_budget: Any: The memory budget policy or None.
+        budget_exhausted_at: Optional[int]: The number of messages when the memory budget last could not bring the chat under budget, or None.
+    """
+
+    __slots__ = ("messages", "message_sizes", "size_by_type", "size", "memory_budget", "budget_exhausted_at")
+
+    def __init__(self):
+        self.messages = None
+        self.message_sizes = []
+        self.size_by_type = {}
+        self.size = 0
+        self.memory_budget = None
+        self.budget_exhausted_at = None
 
 #
 # Main Chat class
@@ -32,10 +61,22 @@ class Chat(BaseModel, validate_assignment=True):
         created_at: float: The timestamp the chat was created. 
         updated_at: float: The timestamp the chat message was last updated. 
 
+    Size Accounting:
+        The estimated memory used by the message values is accounted for incrementally: every message
+        is measured once, after the next message is appended (see get_size). Reassigning messages restarts
+        the accounting; a message that is already in the chat must be replaced with set_message. If a memory
+        budget policy is set (see memory_budget.MemoryBudgetPolicy), old media payloads are offloaded,
+        summarized or evicted once the chat grows past the budget. If the policy cannot bring the chat under
+        the budget, it is not applied again until a message is appended, replaced or the messages are reassigned.
+
     Public Instance Methods:
         get_title() -> str        
         get_messages() -> list[Union[SinglePartMessage, MultiPartMessage]]
         get_message_type_list() -> list[str]
+        get_size() -> int
+        get_size_by_type() -> dict
+        get_message_size(index: int) -> int
+        get_memory_budget() -> Any
         get_developer_instructions() -> str
         get_developer_files() -> list[dict]
         get_metadata() -> dict
@@ -50,6 +91,8 @@ class Chat(BaseModel, validate_assignment=True):
         set_developer_files(developer_files: list[dict]) -> None        
         set_metadata(metadata: dict) -> None               
         set_metadata_attribute(attribute_metadata: Any, key: str) -> None               
+        set_message(index: int, message: Union[SinglePartMessage, MultiPartMessage]) -> None
+        set_memory_budget(memory_budget: Any) -> None
 
         append_message(message: Union[SinglePartMessage, MultiPartMessage]) -> None
         append_message_chunk(author: str, author_type: str, message_type: str, message_chunk: dict) -> None
@@ -58,6 +101,10 @@ class Chat(BaseModel, validate_assignment=True):
 
     Public Class Method:
         from_dict() -> dict        
+
+    Private Methods:
+        __update_size_accounting() -> _SizeAccounting
+        __enforce_memory_budget() -> None
     """
     #
     # Attributes:
@@ -69,6 +116,7 @@ class Chat(BaseModel, validate_assignment=True):
     metadata: dict = Field(default_factory = lambda: dict(), description = "Any meta data associated with the chat.") 
     created_at: float = Field(default_factory=lambda: datetime.now().timestamp(), description = "The timestamp the chat was created.", frozen = True)
     updated_at: float = Field(default_factory= lambda: datetime.now().timestamp(), description = "The timestamp the chat was last updated.")
+    _size_accounting: _SizeAccounting = PrivateAttr(default_factory = _SizeAccounting)
 
     #
     # Public Instance Methods:
@@ -112,6 +160,59 @@ class Chat(BaseModel, validate_assignment=True):
 
         return message_type_list    
 
+    def get_size(self) -> int:
+        """
+        Getter for the estimated memory used by all the message values.
+        
+        Returns:
+            size: int: The size of the chat messages in bytes.
+        """        
+        accounting = self.__update_size_accounting()
+        if not self.messages:
+            return accounting.size
+
+        return accounting.size + self.messages[-1].get_size()
+
+    def get_size_by_type(self) -> dict:
+        """
+        Getter for the estimated memory used by the message values per message type (parts of multipart messages are counted by their own type).
+        
+        Returns:
+            size_by_type: dict: The size in bytes keyed by message type.
+        """        
+        size_by_type = dict(self.__update_size_accounting().size_by_type)
+        if self.messages:
+            for message_type, size in self.messages[-1].get_size_by_type().items():
+                size_by_type[message_type] = size_by_type.get(message_type, 0) + size
+
+        return {message_type: size for message_type, size in size_by_type.items() if size}
+
+    def get_message_size(self, index: int) -> int:
+        """
+        Getter for the estimated memory used by one message.
+        
+        Args:
+            index: int: The index of the message.
+
+        Returns:
+            size: int: The size of the message in bytes.
+        """        
+        message_sizes = self.__update_size_accounting().message_sizes
+        index = range(len(self.messages))[index]
+        if index < len(message_sizes):
+            return sum(message_sizes[index].values())
+
+        return self.messages[index].get_size()
+
+    def get_memory_budget(self) -> Any:
+        """
+        Getter for the memory budget policy.
+        
+        Returns:
+            memory_budget: Any: The memory budget policy or None.
+        """        
+        return self._size_accounting.memory_budget
+
     def get_developer_instructions(self) -> str:
         """
         Getter for developer instructionss.
@@ -249,6 +350,53 @@ class Chat(BaseModel, validate_assignment=True):
 
         return None                
     
+    def set_message(self, index: int, message: Union[SinglePartMessage, MultiPartMessage]) -> None:
+        """
+        Replace a message (or account for a change made directly to a message).
+
+        Args:
+            index: int: The index of the message.
+            message: Union[SinglePartMessage, MultiPartMessage]: The new message.
+
+        Returns:
+            None
+        """                
+        self.messages[index] = message
+
+        # Re-account the message if it was already accounted for
+        accounting = self.__update_size_accounting()
+        index = range(len(self.messages))[index]
+        if index < len(accounting.message_sizes):
+            new_size_by_type = message.get_size_by_type()
+            for message_type, size in accounting.message_sizes[index].items():
+                accounting.size_by_type[message_type] -= size
+                accounting.size -= size
+            for message_type, size in new_size_by_type.items():
+                accounting.size_by_type[message_type] = accounting.size_by_type.get(message_type, 0) + size
+                accounting.size += size
+            accounting.message_sizes[index] = new_size_by_type
+        accounting.budget_exhausted_at = None
+
+        self.update_updated_at()
+
+        return None
+
+    def set_memory_budget(self, memory_budget: Any) -> None:
+        """
+        Setter for the memory budget policy. The policy is applied right away and after every append.
+
+        Args:
+            memory_budget: Any: A memory_budget.MemoryBudgetPolicy, or None to remove the budget.
+
+        Returns:
+            None
+        """                
+        self._size_accounting.memory_budget = memory_budget
+        self._size_accounting.budget_exhausted_at = None
+        self.__enforce_memory_budget()
+
+        return None
+
     def append_message(self, message: Union[SinglePartMessage, MultiPartMessage]) -> None: 
         """
         Add a message to the messages list, including multipart if from the same author/author_type.
@@ -274,8 +422,10 @@ class Chat(BaseModel, validate_assignment=True):
             else:
                 new_message = MultiPartMessage.create_message(author = message.get_author(), author_type = message.get_author_type(), message_list = [self.messages[-1], message])
                 self.messages[-1] = new_message
+                if instrumentation.enabled:
+                    instrumentation.increment("chat.multipart_promotions")
             
-
+        self.__enforce_memory_budget()
         self.update_updated_at()
 
         return None
@@ -295,6 +445,11 @@ class Chat(BaseModel, validate_assignment=True):
             None
         """                
 
+        # Count the chunk if instrumentation is enabled
+        if instrumentation.enabled:
+            instrumentation.increment("chat.chunk_appends", method = "append_message_chunk")
+            instrumentation.increment("chat.chunk_bytes", get_payload_size(message_chunk), method = "append_message_chunk")
+
         # If no messages or new author/author_type then add to the message list 
         if (len(self.messages) == 0) or (author != self.messages[-1].get_author()) or (author_type != self.messages[-1].get_author_type()):
             message = SinglePartMessage.create_message(author = author, author_type = author_type, message_type = message_type, message_value = message_chunk)
@@ -312,11 +467,14 @@ class Chat(BaseModel, validate_assignment=True):
                 new_message1 = SinglePartMessage.create_message(author = author, author_type = author_type, message_type = message_type, message_value = message_chunk)
                 new_message2 = MultiPartMessage.create_message(author = author, author_type = author_type, message_list = [self.messages[-1], new_message1])
                 self.messages[-1] = new_message2
+                if instrumentation.enabled:
+                    instrumentation.increment("chat.multipart_promotions")
 
             # Then if the previous message type is not same (but multipart) then you augment the multipart message
             elif ("multipart" == self.messages[-1].get_message_type()):
                 self.messages[-1].append_message_chunk(message_type = message_type, message_chunk = message_chunk)     
 
+        self.__enforce_memory_budget()
         self.update_updated_at()
 
         return None
@@ -337,10 +495,15 @@ class Chat(BaseModel, validate_assignment=True):
             None
         """                
 
+        # Count the chunk if instrumentation is enabled
+        if instrumentation.enabled:
+            instrumentation.increment("chat.chunk_appends", method = "append_message_chunk_by_attribute")
+            instrumentation.increment("chat.chunk_bytes", get_payload_size(message_chunk_by_attribute), method = "append_message_chunk_by_attribute")
+
         # If no messages or new author/author_type then add to the message list (we will create an empty message and augment)
         if (len(self.messages) == 0) or (author != self.messages[-1].get_author()) or (author_type != self.messages[-1].get_author_type()):
             message = SinglePartMessage.create_empty_message(author = author, author_type = author_type, message_type = message_type)
-            message.append_message_chunk_by_attribute(message_chunk_attribute = message_chunk_by_attribute, key = key)
+            message.append_message_chunk_by_attribute(message_value_by_attribute = message_chunk_by_attribute, key = key)
             self.messages.append(message)     
 
         # If the author is the same and author_type is the same
@@ -348,20 +511,23 @@ class Chat(BaseModel, validate_assignment=True):
             
             # Then if message type is the same then you just augment the message
             if (message_type == self.messages[-1].get_message_type()):
-                self.messages[-1].append_message_chunk_by_attribute(message_chunk_attribute = message_chunk_by_attribute, key = key)
+                self.messages[-1].append_message_chunk_by_attribute(message_value_by_attribute = message_chunk_by_attribute, key = key)
 
             # Then if the previous message type is not same (but not multipart) then you create a multipart message and add this (we will create an empty message and augment)
             elif ("multipart" != self.messages[-1].get_message_type()):
                 new_message1 = SinglePartMessage.create_empty_message(author = author, author_type = author_type, message_type = message_type)
-                new_message1.append_message_chunk_by_attribute(message_chunk_attribute = message_chunk_by_attribute, key = key)                
+                new_message1.append_message_chunk_by_attribute(message_value_by_attribute = message_chunk_by_attribute, key = key)                
                 new_message2 = MultiPartMessage.create_message(author = author, author_type = author_type, message_list = [self.messages[-1], new_message1])
                 self.messages[-1] = new_message2
+                if instrumentation.enabled:
+                    instrumentation.increment("chat.multipart_promotions")
 
             # Then if the previous message type is not same (but multipart) then you augment the multipart message
             elif ("multipart" == self.messages[-1].get_message_type()):
-                self.messages[-1].append_message_chunk_by_attribute(message_type = message_type, message_chunk_attribute = message_chunk_by_attribute)     
+                self.messages[-1].append_message_chunk_by_attribute(message_type = message_type, message_chunk_by_attribute = message_chunk_by_attribute, key = key)     
 
-        # Update the time
+        # Apply the memory budget and update the time
+        self.__enforce_memory_budget()
         self.update_updated_at()
 
         return None    
@@ -381,6 +547,59 @@ class Chat(BaseModel, validate_assignment=True):
 
         return None
 
+    #
+    # Private Methods:
+    #
+    def __update_size_accounting(self) -> _SizeAccounting:
+        """
+        Accounts for the messages that were appended since the last update. The last message is still
+        growing while it is streamed, so only the messages before it are accounted for. If the messages
+        were reassigned, the accounting starts over.
+
+        Returns:
+            accounting: _SizeAccounting: The size accounting of the chat.
+        """                
+        accounting = self.__pydantic_private__["_size_accounting"]
+        if accounting.messages is not self.messages:
+            accounting.messages = self.messages
+            accounting.message_sizes = []
+            accounting.size_by_type = {}
+            accounting.size = 0
+            accounting.budget_exhausted_at = None
+        message_sizes = accounting.message_sizes
+        size_by_type = accounting.size_by_type
+        for index in range(len(message_sizes), len(self.messages) - 1):
+            message_size_by_type = self.messages[index].get_size_by_type()
+            for message_type, size in message_size_by_type.items():
+                size_by_type[message_type] = size_by_type.get(message_type, 0) + size
+                accounting.size += size
+            message_sizes.append(message_size_by_type)
+
+        return accounting
+
+    def __enforce_memory_budget(self) -> None:
+        """
+        Applies the memory budget policy if the chat is over its budget. If the policy could not bring the
+        chat under the budget (the newest messages alone are over it), it is skipped until a message is appended.
+
+        Returns:
+            None
+        """                
+        # Read through __pydantic_private__, this runs on every streamed chunk and is much faster than the private attribute lookup
+        memory_budget = self.__pydantic_private__["_size_accounting"].memory_budget
+        if memory_budget is None:
+            return None
+
+        accounting = self.__update_size_accounting()
+        if (accounting.budget_exhausted_at == len(self.messages)) or (self.get_size() <= memory_budget.max_bytes):
+            return None
+
+        memory_budget.enforce(self)
+        if self.get_size() > memory_budget.max_bytes:
+            accounting.budget_exhausted_at = len(self.messages)
+
+        return None
+
     #
     # Public Class Methods:
     #    
@@ -6,6 +6,7 @@ This file contains some helper functions for the chat class.
 Functions contained here include:
 - timestamp_to_datetimestr(timestamp: float, format: str = "%I:%M %p, %B %d, %Y") -> str: Function to convert a timestamp into a string with a given format.
 - validate_type(value, expected_type) -> bool: Function to validate types against a type hint
+- get_payload_size(value) -> int: Function to estimate the size of a message value or chunk
 
 Author: M. Saif Mehkari
 Version: 1.0
@@ -14,6 +15,7 @@ License Info: See license.txt file
 
 from typing import get_origin, get_args, Literal, Union, List, Dict, Tuple
 from datetime import datetime 
+import sys
 
 def timestamp_to_datetimestr(timestamp: float, format: str = "%I:%M %p, %B %d, %Y") -> str:
     """
@@ -78,4 +80,32 @@ def validate_type(value, expected_type) -> bool:
     if isinstance(value, origin):
         return True
 
-    return False
\ No newline at end of file
+    return False
+
+def get_payload_size(value) -> int:
+    """
+    Estimates the size of a message value or chunk in bytes: the length of strings and bytes,
+    the sum of the sizes of the items of containers, and sys.getsizeof of other values. Strings
+    and bytes cost O(1) to measure (strings are not encoded, so they count one byte per character).
+    The chat size accounting and the chat.chunk_bytes counter both use this function.
+
+    Args:
+        value: The value to measure.
+
+    Returns:
+        int: The estimated size in bytes.
+    """
+
+    # Handle strings and bytes
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+
+    # Handle containers
+    if isinstance(value, dict):
+        return sum(get_payload_size(item) for item in value.values())
+
+    if isinstance(value, (list, tuple, set)):
+        return sum(get_payload_size(item) for item in value)
+
+    # Handle other simple values (numbers, booleans, ...)
+    return sys.getsizeof(value)
\ No newline at end of file
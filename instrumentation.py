@@ -0,0 +1,529 @@
+"""
+utils/chat_utils/instrumentation.py
+
+This file contains an optional instrumentation layer for the hot paths of the chat, message and RAG classes.
+
+Instrumentation is off by default. While it is off, every hook is a check of the module level `enabled`
+flag (or a call returning a shared no-op context manager), so the instrumented code runs at practically
+full speed. Once enabled, counters, timers and spans are forwarded to one or more sinks. Per-message hot
+paths only record timers; the coarse RAG stages are recorded as spans (which also record a timer).
+Sinks:
+- MetricsRegistry: in-process counters and timers, with Prometheus text exposition (to_prometheus)
+- SpanRecorder: OpenTelemetry-style span records, optionally passed on to an exporter callable
+
+Metrics recorded by this package:
+- message.validate (timer): SinglePartMessage.validate_message_value
+- message.validate_type (timer): validate_type checks of message value attributes
+- chat.chunk_appends (counter, label method): Chat.append_message_chunk / append_message_chunk_by_attribute calls
+- chat.chunk_bytes (counter, label method): size of the appended chunks (see helper_functions.get_payload_size)
+- chat.multipart_promotions (counter): single part messages promoted to multipart messages
+- rag.create_vectorstore, rag.load, rag.split, rag.embed, rag.persist, rag.lexical_index (timers): ingestion stages
+- rag.query, rag.query_stream, rag.first_token, rag.embed_query, rag.retrieve, rag.generate (timers): query stages
+
+Example:
+    import instrumentation
+
+    registry = instrumentation.enable()
+    ...
+    print(registry.to_prometheus())
+    instrumentation.disable()
+
+Version: 1.0
+License Info: See license.txt file
+"""
+
+#
+# Import the correct packages
+#
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+#
+# Module state
+#
+enabled = False
+_sinks = []
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+#
+# Sinks
+#
+class Sink:
+    """
+    Base class of the instrumentation sinks. All record methods do nothing by default.
+
+    Public Instance Methods:
+        record_counter(name: str, value: float, labels: dict) -> None
+        record_timer(name: str, seconds: float, labels: dict) -> None
+        record_span(span: Span) -> None
+    """
+
+    def record_counter(self, name: str, value: float, labels: dict) -> None:
+        """
+        Records an increment of a counter.
+
+        Args:
+            name: str: The name of the counter.
+            value: float: The increment.
+            labels: dict: The labels of the counter.
+        """
+        return None
+
+    def record_timer(self, name: str, seconds: float, labels: dict) -> None:
+        """
+        Records one observation of a timer.
+
+        Args:
+            name: str: The name of the timer.
+            seconds: float: The observed duration in seconds.
+            labels: dict: The labels of the timer.
+        """
+        return None
+
+    def record_span(self, span: "Span") -> None:
+        """
+        Records a finished span.
+
+        Args:
+            span: Span: The finished span.
+        """
+        return None
+
+class MetricsRegistry(Sink):
+    """
+    An in-process sink that aggregates counters and timers.
+
+    Attributes:
+        counters: dict: Counter values by (name, labels).
+        timers: dict: Timer aggregates {"count", "sum", "max"} by (name, labels).
+
+    Public Instance Methods:
+        get_counter(name: str, **labels) -> float
+        get_timer(name: str, **labels) -> dict
+        snapshot() -> dict
+        reset() -> None
+        to_prometheus(prefix: str = "") -> str
+    """
+
+    def __init__(self):
+        """
+        Constructor for an empty registry.
+        """
+        self.counters = {}
+        self.timers = {}
+        self._lock = threading.Lock()
+
+    def record_counter(self, name: str, value: float, labels: dict) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        return None
+
+    def record_timer(self, name: str, seconds: float, labels: dict) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            timer = self.timers.setdefault(key, {"count": 0, "sum": 0.0, "max": 0.0})
+            timer["count"] += 1
+            timer["sum"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+        return None
+
+    def get_counter(self, name: str, **labels) -> float:
+        """
+        Getter for a counter value.
+
+        Args:
+            name: str: The name of the counter.
+            labels: The labels of the counter.
+
+        Returns:
+            value: float: The counter value, 0 if it was never incremented.
+        """
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def get_timer(self, name: str, **labels) -> dict:
+        """
+        Getter for a timer aggregate.
+
+        Args:
+            name: str: The name of the timer.
+            labels: The labels of the timer.
+
+        Returns:
+            timer: dict: {"count", "sum", "max"} of the observed durations in seconds.
+        """
+        return dict(self.timers.get((name, tuple(sorted(labels.items()))), {"count": 0, "sum": 0.0, "max": 0.0}))
+
+    def snapshot(self) -> dict:
+        """
+        Returns a copy of all metrics.
+
+        Returns:
+            snapshot: dict: {"counters": [...], "timers": [...]} with one entry per name and label set.
+        """
+        with self._lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self.counters.items()],
+                "timers": [{"name": name, "labels": dict(labels), **timer} for (name, labels), timer in self.timers.items()],
+            }
+
+    def reset(self) -> None:
+        """
+        Removes all metrics.
+        """
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+        return None
+
+    def to_prometheus(self, prefix: str = "") -> str:
+        """
+        Renders all metrics in the Prometheus text exposition format. Counters become
+        <name>_total counters and timers become <name>_seconds summaries (count and sum).
+
+        Args:
+            prefix: str: A prefix for all metric names, e.g. "chat_utils_".
+
+        Returns:
+            text: str: The exposition text.
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+
+        for metric_name, samples, kind in (("_total", counters, "counter"), ("_seconds", timers, "summary")):
+            seen = set()
+            for (name, labels), value in samples:
+                full_name = prefix + _prometheus_name(name) + metric_name
+                if full_name not in seen:
+                    seen.add(full_name)
+                    lines.append(f"# TYPE {full_name} {kind}")
+                label_text = _prometheus_labels(labels)
+                if kind == "counter":
+                    lines.append(f"{full_name}{label_text} {value}")
+                else:
+                    lines.append(f"{full_name}_count{label_text} {value['count']}")
+                    lines.append(f"{full_name}_sum{label_text} {value['sum']}")
+
+        return "\n".join(lines) + "\n"
+
+class SpanRecorder(Sink):
+    """
+    A sink that keeps the most recent spans as OpenTelemetry-style records.
+
+    Attributes:
+        spans: deque: The most recent span records.
+        exporter: Optional[Callable[[dict], None]]: Called with every span record, e.g. to send it to a collector.
+
+    Public Instance Methods:
+        get_spans() -> list[dict]
+        clear() -> None
+    """
+
+    def __init__(self, max_spans: int = 10_000, exporter: Optional[Callable[[dict], None]] = None):
+        """
+        Constructor for the span recorder.
+
+        Args:
+            max_spans: int: The number of span records to keep.
+            exporter: Optional[Callable[[dict], None]]: Called with every span record.
+        """
+        self.spans = deque(maxlen=max_spans)
+        self.exporter = exporter
+
+    def record_span(self, span: "Span") -> None:
+        record = span.to_dict()
+        self.spans.append(record)
+        if self.exporter is not None:
+            self.exporter(record)
+        return None
+
+    def get_spans(self) -> list[dict]:
+        """
+        Getter for the recorded spans, oldest first.
+
+        Returns:
+            spans: list[dict]: The span records.
+        """
+        return list(self.spans)
+
+    def clear(self) -> None:
+        """
+        Removes all recorded spans.
+        """
+        self.spans.clear()
+        return None
+
+#
+# Timers and spans
+#
+class Timer:
+    """
+    A timed block that records its duration as a timer, without creating a span.
+
+    Attributes:
+        name: str: The name of the timer.
+        labels: dict: The labels of the timer.
+    """
+
+    __slots__ = ("name", "labels", "_start")
+
+    def __init__(self, name: str, labels: dict):
+        """
+        Constructor for a timer.
+
+        Args:
+            name: str: The name of the timer.
+            labels: dict: The labels of the timer.
+        """
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> "Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        seconds = time.perf_counter() - self._start
+        for sink in _sinks:
+            sink.record_timer(self.name, seconds, self.labels)
+        return None
+
+class Span:
+    """
+    A timed operation. Entering the span starts it, leaving it records its duration as a timer
+    of the same name and passes the span to the sinks. Spans opened inside a span become its children.
+
+    Attributes:
+        name: str: The name of the span.
+        attributes: dict: The attributes of the span.
+        trace_id: str: The ID shared by a span and its descendants.
+        span_id: str: The ID of the span.
+        parent_span_id: Optional[str]: The ID of the enclosing span.
+        start_time_unix_nano: int: The start time.
+        end_time_unix_nano: int: The end time.
+        status: str: "OK", or "ERROR" if the span was left with an exception.
+    """
+
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_span_id", "start_time_unix_nano",
+                 "end_time_unix_nano", "status", "_start", "_token")
+
+    def __init__(self, name: str, attributes: dict):
+        """
+        Constructor for a span.
+
+        Args:
+            name: str: The name of the span.
+            attributes: dict: The attributes of the span.
+        """
+        self.name = name
+        self.attributes = attributes
+        self.status = "OK"
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.parent_span_id = parent.span_id if parent is not None else None
+        self.span_id = os.urandom(8).hex()
+        self._token = _current_span.set(self)
+        self.start_time_unix_nano = time.time_ns()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        seconds = time.perf_counter() - self._start
+        self.end_time_unix_nano = self.start_time_unix_nano + int(seconds * 1e9)
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.status = "ERROR"
+        for sink in _sinks:
+            sink.record_timer(self.name, seconds, {})
+            sink.record_span(self)
+        return None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """
+        Setter for a span attribute.
+
+        Args:
+            key: str: The attribute name.
+            value: Any: The attribute value.
+        """
+        self.attributes[key] = value
+        return None
+
+    def to_dict(self) -> dict:
+        """
+        Returns the span as an OpenTelemetry-style record.
+
+        Returns:
+            record: dict: The span record.
+        """
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "start_time_unix_nano": self.start_time_unix_nano,
+            "end_time_unix_nano": self.end_time_unix_nano,
+            "attributes": dict(self.attributes),
+            "status": self.status,
+        }
+
+class _NoOpSpan:
+    """
+    The timer and span returned while instrumentation is disabled.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoOpSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        return None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        return None
+
+_NO_OP_SPAN = _NoOpSpan()
+_default_registry = MetricsRegistry()
+
+#
+# Public functions
+#
+def enable(*sinks: Sink) -> MetricsRegistry:
+    """
+    Turns instrumentation on.
+
+    Args:
+        sinks: Sink: The sinks to record to. Defaults to the default MetricsRegistry.
+
+    Returns:
+        registry: MetricsRegistry: The first MetricsRegistry among the sinks, or the default registry.
+    """
+    global enabled
+    _sinks[:] = sinks or [_default_registry]
+    enabled = True
+    return next((sink for sink in _sinks if isinstance(sink, MetricsRegistry)), _default_registry)
+
+def disable() -> None:
+    """
+    Turns instrumentation off. Recorded metrics are kept.
+    """
+    global enabled
+    enabled = False
+    _sinks.clear()
+    return None
+
+def get_registry() -> MetricsRegistry:
+    """
+    Getter for the default registry.
+
+    Returns:
+        registry: MetricsRegistry: The default registry.
+    """
+    return _default_registry
+
+def increment(name: str, value: float = 1, **labels) -> None:
+    """
+    Increments a counter. Does nothing while instrumentation is disabled.
+
+    Args:
+        name: str: The name of the counter.
+        value: float: The increment.
+        labels: The labels of the counter.
+    """
+    if enabled:
+        for sink in _sinks:
+            sink.record_counter(name, value, labels)
+    return None
+
+def observe(name: str, seconds: float, **labels) -> None:
+    """
+    Records a duration of a timer. Does nothing while instrumentation is disabled.
+
+    Args:
+        name: str: The name of the timer.
+        seconds: float: The duration in seconds.
+        labels: The labels of the timer.
+    """
+    if enabled:
+        for sink in _sinks:
+            sink.record_timer(name, seconds, labels)
+    return None
+
+def timer(name: str, **labels) -> Any:
+    """
+    Returns a context manager that records the duration of the enclosed block as a timer.
+
+    Args:
+        name: str: The name of the timer.
+        labels: The labels of the timer.
+
+    Returns:
+        timer: Timer: A new timer, or a shared no-op timer while instrumentation is disabled.
+    """
+    if enabled:
+        return Timer(name, labels)
+    return _NO_OP_SPAN
+
+def span(name: str, **attributes) -> Any:
+    """
+    Returns a context manager that times the enclosed block as a span.
+
+    Args:
+        name: str: The name of the span (and of its timer).
+        attributes: The attributes of the span.
+
+    Returns:
+        span: Span: A new span, or a shared no-op span while instrumentation is disabled.
+    """
+    if enabled:
+        return Span(name, attributes)
+    return _NO_OP_SPAN
+
+def traced(name: str) -> Callable:
+    """
+    Decorator that records every call of a function as a span. While instrumentation is
+    disabled the function is called directly.
+
+    Args:
+        name: str: The name of the span.
+
+    Returns:
+        decorator: Callable: The decorator.
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with Span(name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+#
+# Private functions
+#
+def _prometheus_name(name: str) -> str:
+    """
+    Converts a metric name to a valid Prometheus name.
+    """
+    return "".join(character if character.isalnum() else "_" for character in name)
+
+def _prometheus_labels(labels: tuple) -> str:
+    """
+    Renders a label tuple in the Prometheus format.
+    """
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f"{_prometheus_name(key)}=\"{value}\"" for (key, _), value in zip(labels, escaped)) + "}"
@@ -0,0 +1,228 @@
+"""
+utils/chat_utils/media_cache.py
+
+This file contains the MediaCache class, a content-addressed on-disk cache for message payloads (files, images, audio)
+and for the display-size thumbnails of images.
+
+Payloads are written once to <cache_dir>/<sha256>.<extension> and referenced by URL instead of being
+inlined into the page as data: URLs. By default the cache lives in Streamlit's static folder, so the
+app must be run with static serving enabled:
+
+    streamlit run app.py --server.enableStaticServing true
+
+Any other web server that serves cache_dir can be used by passing its url_prefix.
+
+Version: 1.0
+License Info: See license.txt file
+"""
+
+#
+# Import the correct packages
+#
+import hashlib
+import io
+import mimetypes
+import os
+import tempfile
+from typing import Optional
+
+try:
+    import fitz  # PyMuPDF, optional for PDF thumbnails
+except ImportError:
+    fitz = None
+
+try:
+    from PIL import Image  # Pillow, optional for image thumbnails
+except ImportError:
+    Image = None
+
+#
+# Main MediaCache class
+#
+class MediaCache:
+    """
+    A class to store message payloads on disk by content hash and to reference them by URL.
+
+    Attributes:
+        cache_dir: str: The directory the payloads are written to.
+        url_prefix: str: The URL under which cache_dir is served.
+        thumbnail_width: int: The default width of image thumbnails in pixels.
+
+    Public Instance Methods:
+        get_content_hash(data: bytes) -> str
+        put(data: bytes, mime_type: str) -> str
+        get_url(data: bytes, mime_type: str) -> str
+        get_path(data: bytes, mime_type: str) -> str
+        get_pdf_thumbnail_url(data: bytes, width: int = 300) -> Optional[str]
+        get_image_thumbnail(data: bytes, width: int = None) -> Optional[bytes]
+    """
+
+    def __init__(self, cache_dir: str = "static/media_cache", url_prefix: str = "app/static/media_cache", thumbnail_width: int = 640):
+        """
+        Constructor for the media cache.
+
+        Args:
+            cache_dir: str: The directory the payloads are written to.
+            url_prefix: str: The URL under which cache_dir is served.
+            thumbnail_width: int: The default width of image thumbnails in pixels.
+        """
+        self.cache_dir = cache_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        self.thumbnail_width = thumbnail_width
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_content_hash(self, data: bytes) -> str:
+        """
+        Computes the content hash of a payload.
+
+        Args:
+            data: bytes: The payload.
+
+        Returns:
+            content_hash: str: The sha256 hex digest of the payload.
+        """
+        return hashlib.sha256(data).hexdigest()
+
+    def put(self, data: bytes, mime_type: str) -> str:
+        """
+        Writes a payload to the cache unless it is already there.
+
+        Args:
+            data: bytes: The payload.
+            mime_type: str: The mime type of the payload, used for the file extension.
+
+        Returns:
+            filename: str: The name of the cached file inside cache_dir.
+        """
+        extension = mimetypes.guess_extension(mime_type or "") or ".bin"
+        filename = f"{self.get_content_hash(data)}{extension}"
+        self._write_once(filename, data)
+
+        return filename
+
+    def get_url(self, data: bytes, mime_type: str) -> str:
+        """
+        Caches a payload and returns the URL it is served under.
+
+        Args:
+            data: bytes: The payload.
+            mime_type: str: The mime type of the payload.
+
+        Returns:
+            url: str: The URL of the cached payload.
+        """
+        return f"{self.url_prefix}/{self.put(data, mime_type)}"
+
+    def get_path(self, data: bytes, mime_type: str) -> str:
+        """
+        Caches a payload and returns its path on disk.
+
+        Args:
+            data: bytes: The payload.
+            mime_type: str: The mime type of the payload.
+
+        Returns:
+            path: str: The path of the cached payload.
+        """
+        return os.path.join(self.cache_dir, self.put(data, mime_type))
+
+    def get_pdf_thumbnail_url(self, data: bytes, width: int = 300) -> Optional[str]:
+        """
+        Renders the first page of a PDF as a PNG thumbnail (once) and returns its URL.
+
+        Args:
+            data: bytes: The PDF payload.
+            width: int: The width of the thumbnail in pixels.
+
+        Returns:
+            url: Optional[str]: The URL of the thumbnail, or None if PyMuPDF is not installed or the PDF cannot be rendered.
+        """
+        if fitz is None:
+            return None
+
+        filename = f"{self.get_content_hash(data)}.page1.w{width}.png"
+        if not os.path.exists(os.path.join(self.cache_dir, filename)):
+            try:
+                with fitz.open(stream=data, filetype="pdf") as document:
+                    page = document[0]
+                    zoom = width / page.rect.width
+                    thumbnail = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png")
+            except Exception:
+                return None
+            self._write_once(filename, thumbnail)
+
+        return f"{self.url_prefix}/{filename}"
+
+    def get_image_thumbnail(self, data: bytes, width: int = None) -> Optional[bytes]:
+        """
+        Returns a display-size thumbnail of an image, generating and caching it the first time.
+
+        Thumbnails are cached by content hash and width. Images that are not wider than the
+        thumbnail are returned as they are; an empty marker file records this, so they are not
+        decoded again. Images with transparency are stored as PNG, all others as JPEG.
+
+        Args:
+            data: bytes: The image payload.
+            width: int: The maximum width of the thumbnail in pixels. Defaults to thumbnail_width.
+
+        Returns:
+            thumbnail: Optional[bytes]: The thumbnail, or None if Pillow is not installed or the image cannot be read.
+        """
+        if Image is None:
+            return None
+
+        width = width or self.thumbnail_width
+        content_hash = self.get_content_hash(data)
+        path = os.path.join(self.cache_dir, f"{content_hash}.w{width}.thumb")
+        original_marker = f"{content_hash}.w{width}.original"
+        if os.path.exists(path):
+            with open(path, "rb") as thumbnail_file:
+                return thumbnail_file.read()
+        if os.path.exists(os.path.join(self.cache_dir, original_marker)):
+            return data
+
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except Exception:
+            return None
+
+        if image.width <= width:
+            self._write_once(original_marker, b"")
+            return data
+
+        image.thumbnail((width, round(image.height * width / image.width)))
+        buffer = io.BytesIO()
+        if image.mode in ("RGBA", "LA", "P"):
+            image.save(buffer, format="PNG", optimize=True)
+        else:
+            image.convert("RGB").save(buffer, format="JPEG", quality=85)
+        thumbnail = buffer.getvalue()
+        self._write_once(os.path.basename(path), thumbnail)
+
+        return thumbnail
+
+    #
+    # Private Methods:
+    #
+    def _write_once(self, filename: str, data: bytes) -> None:
+        """
+        Atomically writes a file to the cache if it does not exist yet.
+
+        Args:
+            filename: str: The name of the file inside cache_dir.
+            data: bytes: The content of the file.
+
+        Returns:
+            None
+        """
+        path = os.path.join(self.cache_dir, filename)
+        if os.path.exists(path):
+            return None
+
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+
+        return None
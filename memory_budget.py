@@ -0,0 +1,176 @@
+"""
+utils/chat_utils/memory_budget.py
+
+This file contains the MemoryBudgetPolicy class, which keeps the memory used by a chat under a limit
+by reducing the oldest media payloads (image_base64, file_base64, audio_base64 messages).
+
+A policy is attached to a chat with chat.set_memory_budget(policy). Every time the chat grows past
+max_bytes, old media messages are reduced (oldest first, never the keep_recent newest messages) until
+the chat is back under target_ratio * max_bytes. If that is not possible, because the keep_recent newest
+messages alone are over the budget, the chat does not apply the policy again until a message is appended.
+Reducing a message is one of the following actions:
+- "offload": the payload is written to a MediaCache and the message becomes the matching *_url message
+- "summarize": the message becomes a short text message describing the removed payload
+- "evict": the payload is dropped; the message keeps its type with an empty payload
+
+Example:
+    from media_cache import MediaCache
+    from memory_budget import MemoryBudgetPolicy
+
+    chat.set_memory_budget(MemoryBudgetPolicy(max_bytes=50_000_000, action="offload", media_cache=MediaCache()))
+
+Version: 1.0
+License Info: See license.txt file
+"""
+
+#
+# Import the correct packages
+#
+from typing import Any, Optional
+import message_types
+from message import SinglePartMessage
+
+# Media message types that can be reduced, mapped to their URL message type and a readable name
+MEDIA_MESSAGE_TYPES = {
+    "image_base64": ("image_url", "image"),
+    "file_base64": ("file_url", "file"),
+    "audio_base64": ("audio_url", "audio"),
+}
+
+#
+# Main MemoryBudgetPolicy class
+#
+class MemoryBudgetPolicy:
+    """
+    A class to keep the memory used by a chat under a budget by reducing old media payloads.
+
+    Attributes:
+        max_bytes: int: The memory budget of the chat in bytes.
+        action: str: How media payloads are reduced: "offload", "summarize" or "evict".
+        media_cache: Any: The media_cache.MediaCache payloads are offloaded to (required for "offload").
+        keep_recent: int: The number of newest messages that are never reduced.
+        target_ratio: float: The chat is reduced to target_ratio * max_bytes, so that it is not reduced again on every append.
+
+    Public Instance Methods:
+        is_over_budget(chat: Chat) -> bool
+        enforce(chat: Chat) -> int
+    """
+
+    ACTIONS = ("offload", "summarize", "evict")
+
+    def __init__(self, max_bytes: int, action: str = "offload", media_cache: Any = None, keep_recent: int = 2, target_ratio: float = 0.8):
+        """
+        Constructor for the memory budget policy.
+
+        Args:
+            max_bytes: int: The memory budget of the chat in bytes.
+            action: str: How media payloads are reduced: "offload", "summarize" or "evict".
+            media_cache: Any: The media_cache.MediaCache payloads are offloaded to (required for "offload").
+            keep_recent: int: The number of newest messages that are never reduced.
+            target_ratio: float: The fraction of max_bytes the chat is reduced to.
+        """
+        if action not in self.ACTIONS:
+            raise ValueError(f"Unknown memory budget action {action}.")
+        if (action == "offload") and (media_cache is None):
+            raise ValueError("The offload action needs a media cache.")
+
+        self.max_bytes = max_bytes
+        self.action = action
+        self.media_cache = media_cache
+        self.keep_recent = keep_recent
+        self.target_ratio = target_ratio
+
+    def is_over_budget(self, chat: Any) -> bool:
+        """
+        Checks if a chat uses more memory than the budget.
+
+        Args:
+            chat: Chat: The chat.
+
+        Returns:
+            over_budget: bool: True if the chat is over the budget.
+        """
+        return chat.get_size() > self.max_bytes
+
+    def enforce(self, chat: Any) -> int:
+        """
+        Reduces the oldest media messages of a chat until it is back under target_ratio * max_bytes.
+
+        Args:
+            chat: Chat: The chat.
+
+        Returns:
+            freed: int: The number of bytes freed.
+        """
+        size_before = chat.get_size()
+        if size_before <= self.max_bytes:
+            return 0
+
+        target = self.max_bytes * self.target_ratio
+        messages = chat.get_messages()
+        for index in range(max(len(messages) - self.keep_recent, 0)):
+            if chat.get_size() <= target:
+                break
+
+            message = messages[index]
+            if message.get_message_type() == "multipart":
+                reduced = False
+                for part_index, part in enumerate(message.get_message_list()):
+                    new_part = self._reduce_message(part)
+                    if new_part is not None:
+                        message.set_message(part_index, new_part)
+                        reduced = True
+                if reduced:
+                    chat.set_message(index, message)
+            else:
+                new_message = self._reduce_message(message)
+                if new_message is not None:
+                    chat.set_message(index, new_message)
+
+        return size_before - chat.get_size()
+
+    #
+    # Private Methods:
+    #
+    def _reduce_message(self, message: SinglePartMessage) -> Optional[SinglePartMessage]:
+        """
+        Creates the reduced version of a media message.
+
+        Args:
+            message: SinglePartMessage: The message.
+
+        Returns:
+            message: Optional[SinglePartMessage]: The reduced message, or None if the message has no media payload.
+        """
+        message_type = message.get_message_type()
+        if message_type not in MEDIA_MESSAGE_TYPES:
+            return None
+
+        payload = message.get_message_value_by_attribute(message_type)
+        if not payload:
+            return None
+
+        url_message_type, media_name = MEDIA_MESSAGE_TYPES[message_type]
+        filename = message.get_message_value_by_attribute("filename")
+        mime_type = message.get_message_value_by_attribute("mime_type")
+        metadata = {**message.get_metadata(), "reduced_by": self.action, "reduced_bytes": len(payload)}
+
+        if self.action == "offload":
+            new_message_type = url_message_type
+            message_value = {"filename": filename, "url": self.media_cache.get_url(payload, mime_type), "mime_type": mime_type}
+        elif self.action == "summarize":
+            new_message_type = "text"
+            message_value = {"text": f"[{media_name} {filename} ({mime_type}, {len(payload) / 1024:.1f} KB) removed to save memory]"}
+        else:
+            new_message_type = message_type
+            message_value = {"filename": filename, message_type: b"", "mime_type": mime_type}
+
+        # Keep author and creation time, so the message keeps its place and display key
+        return SinglePartMessage(author = message.get_author(),
+                                 author_type = message.get_author_type(),
+                                 message_type = new_message_type,
+                                 message_value = message_value,
+                                 message_value_keys = message_types.message_types[new_message_type]["message_value_keys"],
+                                 message_value_attribute_types = message_types.message_types[new_message_type]["message_value_attribute_types"],
+                                 metadata = metadata,
+                                 created_at = message.get_created_at())
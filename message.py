@@ -14,8 +14,10 @@ License Info: See license.txt file
 from pydantic import BaseModel, Field, model_validator
 from typing import Literal, Any, final, Tuple
 import message_types
-from helper_functions import validate_type
+import instrumentation
+from helper_functions import validate_type, get_payload_size
 from datetime import datetime
+import copy
 
 ##############################################
 # Base Message Content Class
@@ -216,6 +218,8 @@ class SinglePartMessage(BaseMessageClass, validate_assignment=True):
         get_message_value_by_attribute(key: str) -> Any
         get_message_value_keys() -> set
         get_message_value_attribute_types() -> dict
+        get_size() -> int
+        get_size_by_type() -> dict
 
         set_message_value(message_value: dict) -> None
         set_message_value_by_attribute(message_value_by_attribute: Any, key: str) -> None
@@ -246,11 +250,37 @@ class SinglePartMessage(BaseMessageClass, validate_assignment=True):
     #
     # Additional validation
     #
+    @model_validator(mode='before')
+    @classmethod
+    def fill_optional_message_value_keys(cls, data: Any) -> Any:
+        """
+        Fills in the optional attributes of the message type that a message created or serialized before
+        they were added doesn't have, with their empty values.
+        """
+        if not(isinstance(data, dict)) or not(isinstance(data.get("message_value"), dict)):
+            return data
+        message_type = message_types.message_types.get(data.get("message_type"))
+        optional_keys = message_type.get("optional_message_value_keys", set()) if message_type else set()
+        missing_keys = [key for key in optional_keys if key not in data["message_value"]]
+        if not(missing_keys):
+            return data
+
+        data = dict(data)
+        data["message_value"] = dict(data["message_value"])
+        data["message_value_keys"] = set(data.get("message_value_keys", message_type["message_value_keys"]))
+        data["message_value_attribute_types"] = dict(data.get("message_value_attribute_types", message_type["message_value_attribute_types"]))
+        for key in missing_keys:
+            data["message_value"][key] = copy.deepcopy(message_type["empty_message_value"][key])
+            data["message_value_keys"].add(key)
+            data["message_value_attribute_types"][key] = message_type["message_value_attribute_types"][key]
+        return data
+
     @model_validator(mode='after')
     def validate_message_value(self):        
 
         # Check the message value structure and raise errors if not correct
-        valid_message, error_string = self.__check_message_value_structure(self.message_value, self.message_value_keys, self.message_value_attribute_types)
+        with instrumentation.timer("message.validate"):
+            valid_message, error_string = self.__check_message_value_structure(self.message_value, self.message_value_keys, self.message_value_attribute_types)
         if not(valid_message):
             raise ValueError(error_string)
 
@@ -298,6 +328,24 @@ class SinglePartMessage(BaseMessageClass, validate_assignment=True):
         """                
         return self.message_value_attribute_types  
 
+    def get_size(self) -> int:
+        """
+        Getter for the estimated memory used by the message value. This is cheap, as strings and bytes are measured in O(1).
+        
+        Returns:
+            size: int: The size of the message value in bytes.
+        """                
+        return get_payload_size(self.message_value)
+
+    def get_size_by_type(self) -> dict:
+        """
+        Getter for the size of the message value by message type.
+        
+        Returns:
+            size_by_type: dict: The size of the message value in bytes keyed by the message type.
+        """                
+        return {self.message_type: self.get_size()}
+
     def set_message_value(self, message_value: dict) -> None:
         """
         Setter for message value.
@@ -498,7 +546,10 @@ class SinglePartMessage(BaseMessageClass, validate_assignment=True):
             error_string: str: The string with the error if any
         """     
 
-        if validate_type(message_value_by_attribute, message_value_attribute_types[key]):
+        with instrumentation.timer("message.validate_type"):
+            valid_type = validate_type(message_value_by_attribute, message_value_attribute_types[key])
+
+        if valid_type:
             valid_type = True
             error_string = ""
         else:
@@ -583,6 +634,8 @@ class MultiPartMessage(BaseMessageClass, validate_assignment=True):
         get_message_list() -> list[SinglePartMessage]
         get_message(index: int) -> SinglePartMessage
         get_message_type_list() -> list[str]
+        get_size() -> int
+        get_size_by_type() -> dict
 
         set_message_list(message_list: list[SinglePartMessage]) -> None
         set_message(index: int, message: SinglePartMessage) -> None
@@ -640,6 +693,29 @@ class MultiPartMessage(BaseMessageClass, validate_assignment=True):
         
         return message_type_list
 
+    def get_size(self) -> int:
+        """
+        Getter for the estimated memory used by all the parts of the message.
+
+        Returns:
+            size: int: The size of the message values in bytes.
+        """
+        return sum(message.get_size() for message in self.message_list)
+
+    def get_size_by_type(self) -> dict:
+        """
+        Getter for the size of the parts by message type.
+
+        Returns:
+            size_by_type: dict: The size of the message values in bytes keyed by the message type.
+        """
+        size_by_type = {}
+        for message in self.message_list:
+            message_type = message.get_message_type()
+            size_by_type[message_type] = size_by_type.get(message_type, 0) + message.get_size()
+
+        return size_by_type
+
     def set_message_list(self, message_list: list[SinglePartMessage]) -> None:
         """
         Setter for the message list.
@@ -737,12 +813,12 @@ class MultiPartMessage(BaseMessageClass, validate_assignment=True):
         # If previous message type is not same then you create a new message and add this (we will create an empty message and augment)
         elif (message_type != self.message_list[-1].get_message_type()):
             message = SinglePartMessage.create_empty_message(author = self.author, author_type = self.author_type, message_type = message_type)
-            message.append_message_chunk_by_attribute(message_chunk_attribute = message_chunk_by_attribute, key = key)
+            message.append_message_chunk_by_attribute(message_value_by_attribute = message_chunk_by_attribute, key = key)
             self.message_list.append(message)     
 
         # If message type is the same as the last message in the multipart, then augment the message
         elif (message_type == self.message_list[-1].get_message_type()):
-            self.message_list[-1].append_message_chunk_by_attribute(message_chunk_attribute = message_chunk_by_attribute, key = key)
+            self.message_list[-1].append_message_chunk_by_attribute(message_value_by_attribute = message_chunk_by_attribute, key = key)
 
         # Update the time
         self.update_updated_at()
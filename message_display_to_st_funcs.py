@@ -1,9 +1,10 @@
 from datetime import datetime
 from message import SinglePartMessage, MultiPartMessage
-import random
 import helper_functions as hf
 import base64
 
+MEDIA_MESSAGE_TYPES = ["image_base64", "image_url", "file_base64", "file_url", "audio_base64", "audio_url"]
+
 def get_display_info(message):
     """Get display informations for a message
     """
@@ -13,6 +14,22 @@ def get_display_info(message):
 
     return author, author_type, display_datetime
 
+def get_message_key(message, index=None):
+    """Get a stable key for a message that is the same on every Streamlit rerun
+
+    Args:
+        message (SinglePartMessage / MultiPartMessage): The message
+        index (int, optional): Position of the message in the chat. Defaults to None.
+
+    Returns:
+        str: The key of the message
+    """
+    key = f"{message.get_author_type()}-{message.get_author()}-{message.get_created_at()}"
+    if index is not None:
+        key = f"{index}-{key}"
+
+    return key
+
 def write_display_info(st, display_info, include_datetime: bool = True):
     """Write author info and optional datetime to streamlit
     """
@@ -22,35 +39,93 @@ def write_display_info(st, display_info, include_datetime: bool = True):
     else:
         st.write(f"{author} ({author_type})")
 
-def write_single_chat_to_st(message, st, include_datetime: bool = True):
-    """Write a single part message to Streamlit as its original element.
+def build_single_chat_fragments(message, key: str, media_cache=None):
+    """Build the Streamlit calls that draw a single part message without drawing it.
+
+    Each fragment is a tuple (streamlit function name or function(st, ...), args, kwargs),
+    so the fragments of an unchanged message can be cached and replayed with `replay_fragments`.
+
+    With a media cache, file payloads are written to it once and referenced by URL instead of
+    being inlined into the page, and the full preview is only loaded when it is switched on.
+    Base64 images are drawn from a cached display-size thumbnail with a link to the full
+    resolution image.
 
     Args:
         message (SinglePartMessage): Message object, Single
-        st (_type_): Streamlit
-        include_datetime (bool, optional): Defaults to True.
+        key (str): Stable key of the message, used for the widget keys
+        media_cache (MediaCache, optional): Cache to serve file payloads from. Defaults to None.
 
     Raises:
         ValueError: If message type is invalid
+
+    Returns:
+        list[tuple]: The fragments of the message
     """
     message_type = message.get_message_type()
+    fragments = []
 
     # Text message type
     if message_type == "text":
         text = message.get_message_value_by_attribute("text")
-        st.write(text)
+        fragments.append(("write", (text,), {}))
+
+    # Image message type drawn from a thumbnail (full resolution on demand)
+    elif message_type == "image_base64" and media_cache is not None:
+        filename = message.get_message_value_by_attribute("filename")
+        mime_type = message.get_message_value_by_attribute("mime_type")
+        image_bytes = message.get_message_value_by_attribute("image_base64")
+        thumbnail = media_cache.get_image_thumbnail(image_bytes)
+
+        if thumbnail is None:
+            fragments.append(("image", (image_bytes,), {"caption": filename, "use_container_width": True}))
+        else:
+            fragments.append(("image", (thumbnail,), {"caption": filename, "use_container_width": True}))
+            if len(thumbnail) < len(image_bytes):
+                full_url = media_cache.get_url(image_bytes, mime_type)
+                fragments.append(("markdown", (f"""
+                    <a href="{full_url}" target="_blank">🔍 Full resolution</a>
+                """,), {"unsafe_allow_html": True}))
 
     # Image message type
     elif message_type in ["image_base64", "image_url"]:
         filename = message.get_message_value_by_attribute("filename")
         image_data = message.get_message_value_by_attribute("image_base64") if message_type == "image_base64" else message.get_message_value_by_attribute("url")
-        st.image(image_data, caption=filename, use_container_width=True)
+        fragments.append(("image", (image_data,), {"caption": filename, "use_container_width": True}))
+
+    # File message type served from the media cache (Download link + lazy preview + Open in New Tab)
+    elif message_type == "file_base64" and media_cache is not None:
+        filename = message.get_message_value_by_attribute("filename")
+        mime_type = message.get_message_value_by_attribute("mime_type")
+        file_bytes = message.get_message_value_by_attribute("file_base64")
+        file_url = media_cache.get_url(file_bytes, mime_type)
+
+        # Download link
+        fragments.append(("markdown", (f"""
+            <a href="{file_url}" download="{filename}">⬇️ Download {filename}</a>
+        """,), {"unsafe_allow_html": True}))
+
+        # First page thumbnail (for PDFs, if it can be rendered)
+        if mime_type == "application/pdf":
+            thumbnail_url = media_cache.get_pdf_thumbnail_url(file_bytes)
+            if thumbnail_url:
+                fragments.append(("markdown", (f"""
+                    <a href="{file_url}" target="_blank"><img src="{thumbnail_url}" width="300"></a>
+                """,), {"unsafe_allow_html": True}))
+
+        # File preview on demand (for PDFs & images)
+        if mime_type.startswith("image/") or mime_type == "application/pdf":
+            fragments.append((write_file_preview, (file_url, filename), {"key": f"{key}-preview"}))
+
+        # Open in new tab option
+        fragments.append(("markdown", (f"""
+            <a href="{file_url}" target="_blank">🔗 Preview {filename}</a>
+        """,), {"unsafe_allow_html": True}))
 
     # File message type (Enable preview + Open in New Tab)
     elif message_type in ["file_base64", "file_url"]:
         filename = message.get_message_value_by_attribute("filename")
         mime_type = message.get_message_value_by_attribute("mime_type")
-        
+
         if message_type == "file_base64":
             file_bytes = message.get_message_value_by_attribute("file_base64")
             file_url = f"data:{mime_type};base64,{file_bytes}"
@@ -59,49 +134,310 @@ def write_single_chat_to_st(message, st, include_datetime: bool = True):
             file_url = file_data  # Direct URL
 
         # Download button
-        st.download_button(
-            key=random.randint(1, 10000),
-            label=f"Download {filename}",
-            data=file_bytes if message_type == "file_base64" else file_data,
-            file_name=filename,
-            mime=mime_type,
-        )
+        fragments.append(("download_button", (), {
+            "key": f"{key}-download",
+            "label": f"Download {filename}",
+            "data": file_bytes if message_type == "file_base64" else file_data,
+            "file_name": filename,
+            "mime": mime_type,
+        }))
 
         # File preview (for PDFs & images)
         if mime_type.startswith("image/") or mime_type == "application/pdf":
-            st.markdown(f"""
+            fragments.append(("markdown", (f"""
                 <iframe src="{file_url}" width="100%" height="500px"></iframe>
-            """, unsafe_allow_html=True)
+            """,), {"unsafe_allow_html": True}))
 
         # Open in new tab option
-        st.markdown(f"""
+        fragments.append(("markdown", (f"""
             <a href="{file_url}" target="_blank">🔗 Preview {filename}</a>
-        """, unsafe_allow_html=True)
+        """,), {"unsafe_allow_html": True}))
 
     # Audio message type
     elif message_type in ["audio_base64", "audio_url"]:
         audio_data = message.get_message_value_by_attribute("audio_base64") if message_type == "audio_base64" else message.get_message_value_by_attribute("url")
-        st.audio(data=audio_data)
+        fragments.append(("audio", (), {"data": audio_data}))
 
     # Raise error
     else:
         raise ValueError("Invalid Message Type")
-        
-def write_chat_to_st(message, st, include_datetime: bool = True):
+
+    return fragments
+
+def replay_fragments(st, fragments, key_suffix: str = ""):
+    """Draw fragments built by `build_single_chat_fragments`
+
+    Args:
+        st (_type_): Streamlit (or a Streamlit container)
+        fragments (list[tuple]): The fragments to draw
+        key_suffix (str, optional): Suffix for the widget keys. Defaults to "".
+    """
+    for function_name, args, kwargs in fragments:
+        if key_suffix and "key" in kwargs:
+            kwargs = {**kwargs, "key": f"{kwargs['key']}{key_suffix}"}
+        if callable(function_name):
+            function_name(st, *args, **kwargs)
+        else:
+            getattr(st, function_name)(*args, **kwargs)
+
+def write_file_preview(st, file_url: str, filename: str, key: str):
+    """Write a preview switch and, only when it is on, the iframe preview of a file
+
+    Args:
+        st (_type_): Streamlit
+        file_url (str): URL of the file
+        filename (str): Name of the file
+        key (str): Stable widget key of the switch
+    """
+    if st.checkbox(f"Show preview of {filename}", key=key):
+        st.markdown(f"""
+            <iframe src="{file_url}" width="100%" height="500px"></iframe>
+        """, unsafe_allow_html=True)
+
+def write_single_chat_to_st(message, st, include_datetime: bool = True, key: str = None, media_cache=None):
+    """Write a single part message to Streamlit as its original element.
+
+    Args:
+        message (SinglePartMessage): Message object, Single
+        st (_type_): Streamlit
+        include_datetime (bool, optional): Defaults to True.
+        key (str, optional): Stable key of the message. Defaults to the key from `get_message_key`.
+        media_cache (MediaCache, optional): Cache to serve file payloads from. Defaults to None.
+
+    Raises:
+        ValueError: If message type is invalid
+    """
+    if key is None:
+        key = get_message_key(message)
+
+    replay_fragments(st, build_single_chat_fragments(message, key, media_cache))
+
+def write_chat_to_st(message, st, include_datetime: bool = True, key: str = None, media_cache=None):
     """Generic display function that can work for both message types
 
     Args:
         message (SinglePartMessage / MultiPartMessage): The message to be displayed
         st (_type_): Streamlit
         include_datetime (bool, optional): Defaults to True.
+        key (str, optional): Stable key of the message. Defaults to the key from `get_message_key`.
+        media_cache (MediaCache, optional): Cache to serve file payloads from. Defaults to None.
     """
+    if key is None:
+        key = get_message_key(message)
+
     display_info = get_display_info(message)
     author, author_type, display_datetime = display_info
 
     with st.chat_message(author_type):
         write_display_info(st, display_info, include_datetime)
         if hf.validate_type(message, SinglePartMessage):
-            write_single_chat_to_st(message, st, include_datetime)
+            write_single_chat_to_st(message, st, include_datetime, key, media_cache)
         else:
-            for mes in message.get_message_list():
-                write_single_chat_to_st(mes, st, include_datetime)
\ No newline at end of file
+            for part_index, mes in enumerate(message.get_message_list()):
+                write_single_chat_to_st(mes, st, include_datetime, f"{key}-{part_index}", media_cache)
+
+class ChatRenderer:
+    """Incremental renderer for a list of chat messages.
+
+    The fragments of every message are cached by the stable message key together with the
+    message's `updated_at`, so only new or changed messages are rebuilt. `render` draws all
+    messages into one placeholder each (once per Streamlit run), and `update` then only
+    redraws the placeholders of messages that changed since, e.g. the streaming tail.
+    `render_window` only draws the last messages, with "load earlier" pagination and lazy
+    placeholders for older media.
+
+    Example:
+        renderer = get_chat_renderer(st)
+        renderer.render(chat.get_messages(), st)
+        for token in tokens:
+            chat.append_message_chunk_by_attribute(...)
+            renderer.update(chat.get_messages(), st)
+    """
+
+    def __init__(self, include_datetime: bool = True, media_cache=None):
+        """
+        Args:
+            include_datetime (bool, optional): Defaults to True.
+            media_cache (MediaCache, optional): Cache to serve file payloads from. Defaults to None.
+        """
+        self.include_datetime = include_datetime
+        self.media_cache = media_cache
+        self.fragment_cache = {}  # key -> (updated_at, lazy, display_info, [fragments of every part])
+        self.placeholders = {}  # key -> (placeholder, updated_at drawn, lazy) for the current run
+        self.redraw_counts = {}  # key -> number of redraws of the message in the current run
+        self.start = 0  # index of the first drawn message in the current run
+        self.expanded = set()  # keys of messages whose lazy media was expanded
+
+    def render(self, messages, st, start: int = 0, lazy_media_before: int = 0, expanded: set = None):
+        """Draw the messages from `start` on, reusing the cached fragments of unchanged messages.
+
+        Args:
+            messages (list[SinglePartMessage / MultiPartMessage]): The messages of the chat
+            st (_type_): Streamlit
+            start (int, optional): Index of the first message to draw. Defaults to 0.
+            lazy_media_before (int, optional): Media of messages before this index are drawn as lazy placeholders. Defaults to 0.
+            expanded (set, optional): Keys of messages whose media is drawn even if lazy. Defaults to None.
+        """
+        self.placeholders = {}
+        self.redraw_counts = {}
+        self.start = start
+        self.expanded = expanded if expanded is not None else set()
+        for index in range(start, len(messages)):
+            message = messages[index]
+            key = get_message_key(message, index)
+            lazy = index < lazy_media_before and key not in self.expanded
+            self._draw(message, key, st.empty(), lazy)
+
+        # Drop the cache of messages that are not drawn (anymore), which keeps the cache bounded by the window
+        for key in set(self.fragment_cache) - set(self.placeholders):
+            del self.fragment_cache[key]
+
+    def render_window(self, messages, st, window_size: int = 50, media_window: int = 10, name: str = "chat_window"):
+        """Draw only the last messages of a long chat.
+
+        The last `window_size` messages are drawn, and a "load earlier" button extends the
+        window by another `window_size` messages. Media (images, files, audio) of all but
+        the last `media_window` messages are drawn as lazy placeholders with a "show"
+        button, so their payload is only sent to the browser on demand.
+
+        Args:
+            messages (list[SinglePartMessage / MultiPartMessage]): The messages of the chat
+            st (_type_): Streamlit
+            window_size (int, optional): Number of messages per page. Defaults to 50.
+            media_window (int, optional): Number of last messages whose media is always drawn. Defaults to 10.
+            name (str, optional): Prefix of the session state and widget keys. Defaults to "chat_window".
+        """
+        visible_key = f"{name}-visible"
+        expanded_key = f"{name}-expanded"
+        if visible_key not in st.session_state:
+            st.session_state[visible_key] = window_size
+        if expanded_key not in st.session_state:
+            st.session_state[expanded_key] = set()
+
+        start = max(0, len(messages) - st.session_state[visible_key])
+        if start > 0:
+            st.button(
+                f"Load {min(window_size, start)} earlier messages ({start} hidden)",
+                key=f"{name}-load-earlier",
+                on_click=_load_earlier_messages,
+                args=(st.session_state, visible_key, window_size),
+            )
+
+        self.render(messages, st, start, len(messages) - media_window, st.session_state[expanded_key])
+
+    def update(self, messages, st):
+        """Redraw only the messages that changed since they were last drawn and add new ones.
+
+        Args:
+            messages (list[SinglePartMessage / MultiPartMessage]): The messages of the chat
+            st (_type_): Streamlit
+        """
+        for index in range(self.start, len(messages)):
+            message = messages[index]
+            key = get_message_key(message, index)
+            if key not in self.placeholders:
+                self._draw(message, key, st.empty(), False)
+            elif self.placeholders[key][1] != message.get_updated_at():
+                self.redraw_counts[key] = self.redraw_counts.get(key, 0) + 1
+                self._draw(message, key, self.placeholders[key][0], self.placeholders[key][2])
+
+    def _get_fragments(self, message, key, lazy):
+        """Get the display info and part fragments of a message, from the cache when unchanged
+        """
+        updated_at = message.get_updated_at()
+        cached = self.fragment_cache.get(key)
+        if cached is not None and cached[0] == updated_at and cached[1] == lazy:
+            return cached[2], cached[3]
+
+        display_info = get_display_info(message)
+        if hf.validate_type(message, SinglePartMessage):
+            parts = [(message, key)]
+        else:
+            parts = [(mes, f"{key}-{part_index}") for part_index, mes in enumerate(message.get_message_list())]
+
+        part_fragments = []
+        for part, part_key in parts:
+            if lazy and part.get_message_type() in MEDIA_MESSAGE_TYPES:
+                part_fragments.append(build_lazy_media_fragments(part, part_key, key, self.expanded))
+            else:
+                part_fragments.append(build_single_chat_fragments(part, part_key, self.media_cache))
+
+        self.fragment_cache[key] = (updated_at, lazy, display_info, part_fragments)
+        return display_info, part_fragments
+
+    def _draw(self, message, key, placeholder, lazy):
+        """Draw a message into its placeholder
+        """
+        display_info, part_fragments = self._get_fragments(message, key, lazy)
+        redraw_count = self.redraw_counts.get(key, 0)
+        key_suffix = f"-redraw{redraw_count}" if redraw_count else ""
+
+        # The placeholder holds a single element, so drawing a new container replaces the old one
+        chat_box = placeholder.container().chat_message(display_info[1])
+        write_display_info(chat_box, display_info, self.include_datetime)
+        for fragments in part_fragments:
+            replay_fragments(chat_box, fragments, key_suffix)
+
+        self.placeholders[key] = (placeholder, message.get_updated_at(), lazy)
+
+def build_lazy_media_fragments(message, key: str, message_key: str, expanded: set):
+    """Build a lightweight placeholder for a media message that is drawn in full on demand.
+
+    Args:
+        message (SinglePartMessage): Message object, Single (image, file or audio)
+        key (str): Stable key of the message part, used for the widget key
+        message_key (str): Stable key of the whole message, added to `expanded` when shown
+        expanded (set): Keys of messages whose media is drawn in full
+
+    Returns:
+        list[tuple]: The fragments of the placeholder
+    """
+    filename = message.get_message_value_by_attribute("filename")
+    media_kind = message.get_message_type().split("_")[0]
+
+    return [
+        ("caption", (f"{media_kind.capitalize()}: {filename}",), {}),
+        ("button", (f"Show {filename or media_kind}",), {"key": f"{key}-show", "on_click": expanded.add, "args": (message_key,)}),
+    ]
+
+def _load_earlier_messages(session_state, visible_key: str, window_size: int):
+    """Button callback that extends a chat window by one page
+    """
+    session_state[visible_key] += window_size
+
+def write_chat_window_to_st(messages, st, window_size: int = 50, media_window: int = 10, include_datetime: bool = True, name: str = "chat_window", media_cache=None):
+    """Display the last messages of a chat with "load earlier" pagination and lazy media
+
+    Args:
+        messages (list[SinglePartMessage / MultiPartMessage]): The messages of the chat
+        st (_type_): Streamlit
+        window_size (int, optional): Number of messages per page. Defaults to 50.
+        media_window (int, optional): Number of last messages whose media is always drawn. Defaults to 10.
+        include_datetime (bool, optional): Defaults to True.
+        name (str, optional): Prefix of the session state and widget keys. Defaults to "chat_window".
+        media_cache (MediaCache, optional): Cache to serve file payloads from. Defaults to None.
+
+    Returns:
+        ChatRenderer: The renderer, whose `update` can be used to stream new content
+    """
+    renderer = get_chat_renderer(st, f"{name}-renderer", include_datetime, media_cache)
+    renderer.render_window(messages, st, window_size, media_window, name)
+
+    return renderer
+
+def get_chat_renderer(st, name: str = "chat_renderer", include_datetime: bool = True, media_cache=None):
+    """Get the `ChatRenderer` kept in the Streamlit session state, creating it on first use
+
+    Args:
+        st (_type_): Streamlit
+        name (str, optional): Session state key of the renderer. Defaults to "chat_renderer".
+        include_datetime (bool, optional): Defaults to True.
+        media_cache (MediaCache, optional): Cache to serve file payloads from. Defaults to None.
+
+    Returns:
+        ChatRenderer: The renderer of the session
+    """
+    if name not in st.session_state:
+        st.session_state[name] = ChatRenderer(include_datetime, media_cache)
+
+    return st.session_state[name]
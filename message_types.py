@@ -13,14 +13,20 @@ type_name : {
         ...
         name of attribute # N: type of attribute # N,
         },
-    "empty_message_value": Value of an empty message of this type
+    "empty_message_value": Value of an empty message of this type,
+    "optional_message_value_keys": set(list of attributes added after the type was created) (optional)
  }
 
+Messages created or serialized before an optional attribute was added don't have it; it is filled in
+with its value from "empty_message_value" when the message is created or loaded.
+
 Author: M. Saif Mehkari
 Version: 1.0
 License Info: See license.txt file
 """
 
+from typing import Union
+
 message_types = {
     # Text Type     
     "text":{
@@ -118,32 +124,106 @@ message_types = {
         "empty_message_value":{"store_id": "", "files": []}
     },
 
-    # RAG Query Type
+    # RAG Query Type (store_id can be a single store ID or a list of store IDs to query together,
+    # filter is a metadata filter expression like {"file_name": "report.pdf"} or {} to search all chunks)
     "rag_query":{
-        "message_value_keys": set(["store_id", "query"]),
+        "message_value_keys": set(["store_id", "query", "filter"]),
         "message_value_attribute_types":{
-            "store_id": str,
+            "store_id": Union[str, list[str]],
             "query": str,
+            "filter": dict,
         },
-        "empty_message_value":{"store_id": "", "query": ""}
+        "empty_message_value":{"store_id": "", "query": "", "filter": {}},
+        "optional_message_value_keys": set(["filter"])
     },
 
-    # RAG Response Type
+    # RAG Response Type (job_id is set when a store is built by a background job)
     "rag_response":{
-        "message_value_keys": set(["type", "store_id", "answer", "document_count", "message"]),
+        "message_value_keys": set(["type", "store_id", "answer", "document_count", "message", "job_id"]),
         "message_value_attribute_types":{
             "type": str,
-            "store_id": str,
+            "store_id": Union[str, list[str]],
             "answer": str,
             "document_count": int,
             "message": str,
+            "job_id": str,
         },
         "empty_message_value":{
             "type": "",
             "store_id": "",
             "answer": "",
             "document_count": 0,
+            "message": "",
+            "job_id": ""
+        },
+        "optional_message_value_keys": set(["job_id"])
+    },
+
+    # RAG Job Status Type (a status request only needs the job_id, responses carry the progress of the build)
+    "rag_job_status":{
+        "message_value_keys": set(["job_id", "store_id", "status", "files_done", "files_total", "document_count", "message"]),
+        "message_value_attribute_types":{
+            "job_id": str,
+            "store_id": str,
+            "status": str,
+            "files_done": int,
+            "files_total": int,
+            "document_count": int,
+            "message": str,
+        },
+        "empty_message_value":{
+            "job_id": "",
+            "store_id": "",
+            "status": "",
+            "files_done": 0,
+            "files_total": 0,
+            "document_count": 0,
             "message": ""
         }
+    },
+
+    # RAG Store Stats Type (a stats request only needs the store_id, responses carry the disk usage of the store)
+    "rag_store_stats":{
+        "message_value_keys": set(["store_id", "vector_backend", "chunk_count", "embedding_bytes", "index_bytes", "document_bytes", "free_bytes", "total_bytes", "fragmentation"]),
+        "message_value_attribute_types":{
+            "store_id": str,
+            "vector_backend": str,
+            "chunk_count": int,
+            "embedding_bytes": int,
+            "index_bytes": int,
+            "document_bytes": int,
+            "free_bytes": int,
+            "total_bytes": int,
+            "fragmentation": float,
+        },
+        "empty_message_value":{
+            "store_id": "",
+            "vector_backend": "",
+            "chunk_count": 0,
+            "embedding_bytes": 0,
+            "index_bytes": 0,
+            "document_bytes": 0,
+            "free_bytes": 0,
+            "total_bytes": 0,
+            "fragmentation": 0.0
+        }
+    },
+
+    # RAG Compact Store Type
+    "rag_compact_store":{
+        "message_value_keys": set(["store_id"]),
+        "message_value_attribute_types":{
+            "store_id": str,
+        },
+        "empty_message_value":{"store_id": ""}
+    },
+
+    # RAG Delete Store Type
+    "rag_delete_store":{
+        "message_value_keys": set(["store_id"]),
+        "message_value_attribute_types":{
+            "store_id": str,
+        },
+        "empty_message_value":{"store_id": ""}
     }
 }
\ No newline at end of file
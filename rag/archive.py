@@ -0,0 +1,214 @@
+"""
+RAG Store Archives
+
+This module provides the store archives of `RAGService.export_store` and `RAGService.import_store`.
+An archive is a single tar file holding the whole persisted store directory (chunks, embeddings,
+vector index, metadata and BM25 indexes, store configuration and build manifest) and an archive
+manifest, `store_archive.json`, with:
+
+    - the format version, the store ID, the backend and the chunk count of the store
+    - the path, size and SHA-256 checksum of every file of the store
+
+Files are hashed while they are written to or read from the archive, so both take a single pass
+over the data. SQLite databases (Chroma's `chroma.sqlite3`) are archived from a consistent snapshot
+taken with the SQLite backup API. Imports are extracted into a hidden directory of the persist
+directory, verified against the manifest and only then moved into place, so a damaged archive never
+leaves a partial store behind. The files are used as they are: a NumPy store memory-maps the
+extracted embedding matrix, nothing is embedded or inserted again.
+
+Example:
+    ```python
+    from rag.archive import read_archive_manifest
+
+    print(read_archive_manifest("manuals.tar"))
+    # {"format_version": 1, "store_id": "manuals", "vector_backend": "numpy", "chunk_count": 1200, ...}
+    ```
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import time
+from typing import Any, BinaryIO, Dict, List
+
+ARCHIVE_MANIFEST = "store_archive.json"
+ARCHIVE_FORMAT_VERSION = 1
+STORE_PREFIX = "store/"  # Archive path prefix of the store files
+
+class _HashingReader:
+    """
+    A file wrapper that computes the SHA-256 digest of everything read through it.
+    """
+
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file.read(size)
+        self.digest.update(data)
+        return data
+
+def write_archive(directory: str, archive_path: str, store_info: Dict[str, Any], compress: bool = False) -> Dict[str, Any]:
+    """
+    Write the files of a store directory and their manifest to an archive.
+
+    Temporary files of interrupted writes are left out. The archive is written next to its
+    destination and renamed when it is complete.
+
+    Args:
+        directory (str): The store directory
+        archive_path (str): Path of the archive
+        store_info (Dict[str, Any]): Store ID ("store_id"), backend ("vector_backend") and
+            chunk count ("chunk_count") recorded in the manifest
+        compress (bool): Whether to compress the archive with gzip; embeddings compress poorly,
+            so archives are uncompressed by default
+
+    Returns:
+        Dict[str, Any]: The archive manifest
+    """
+    files = []
+    temp_path = archive_path + ".tmp"
+    with tarfile.open(temp_path, "w:gz" if compress else "w") as archive:
+        for relative_path in _store_files(directory):
+            path = os.path.join(directory, relative_path)
+            snapshot_path = _snapshot_database(path) if path.endswith(".sqlite3") else None
+            try:
+                source_path = snapshot_path or path
+                tar_info = archive.gettarinfo(source_path, arcname=STORE_PREFIX + relative_path)
+                with open(source_path, "rb") as source_file:
+                    reader = _HashingReader(source_file)
+                    archive.addfile(tar_info, reader)
+                files.append({"path": relative_path, "size": tar_info.size, "sha256": reader.digest.hexdigest()})
+            finally:
+                if snapshot_path is not None:
+                    os.remove(snapshot_path)
+
+        manifest = {
+            "format_version": ARCHIVE_FORMAT_VERSION,
+            "store_id": store_info["store_id"],
+            "vector_backend": store_info["vector_backend"],
+            "chunk_count": store_info["chunk_count"],
+            "created_at": time.time(),
+            "files": files,
+        }
+        manifest_data = json.dumps(manifest, indent=1).encode("utf-8")
+        tar_info = tarfile.TarInfo(ARCHIVE_MANIFEST)
+        tar_info.size = len(manifest_data)
+        tar_info.mtime = int(manifest["created_at"])
+        archive.addfile(tar_info, io.BytesIO(manifest_data))
+    os.replace(temp_path, archive_path)
+    return manifest
+
+def read_archive_manifest(archive_path: str) -> Dict[str, Any]:
+    """
+    Read the manifest of an archive.
+
+    Args:
+        archive_path (str): Path of the archive
+
+    Returns:
+        Dict[str, Any]: The archive manifest
+
+    Raises:
+        ValueError: If the file is not a store archive or has an unsupported format version
+    """
+    try:
+        with tarfile.open(archive_path, "r:*") as archive:
+            manifest_file = archive.extractfile(ARCHIVE_MANIFEST)
+            manifest = json.load(manifest_file)
+    except (tarfile.TarError, KeyError) as error:
+        raise ValueError(f"{archive_path} is not a store archive: {error}") from error
+    if manifest.get("format_version") != ARCHIVE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported store archive format version {manifest.get('format_version')}")
+    return manifest
+
+def extract_archive(archive_path: str, destination: str) -> Dict[str, Any]:
+    """
+    Extract the store files of an archive into a new directory, verifying every file
+    against the size and checksum in the manifest.
+
+    The files are extracted into a hidden temporary directory next to the destination,
+    which is renamed to the destination once all files are verified.
+
+    Args:
+        archive_path (str): Path of the archive
+        destination (str): The store directory to create; it must not exist
+
+    Returns:
+        Dict[str, Any]: The archive manifest
+
+    Raises:
+        ValueError: If the archive is damaged, incomplete or contains paths outside the store
+    """
+    manifest = read_archive_manifest(archive_path)
+    expected = {file["path"]: file for file in manifest["files"]}
+    for relative_path in expected:
+        normalized_path = os.path.normpath(relative_path)
+        if os.path.isabs(normalized_path) or normalized_path.split(os.sep)[0] == "..":
+            raise ValueError(f"Store archive path {relative_path} is outside the store")
+    parent = os.path.dirname(os.path.abspath(destination))
+    os.makedirs(parent, exist_ok=True)
+    temp_directory = tempfile.mkdtemp(prefix=".import-", dir=parent)
+    try:
+        extracted = set()
+        with tarfile.open(archive_path, "r:*") as archive:
+            for member in archive:
+                if member.name == ARCHIVE_MANIFEST:
+                    continue
+                relative_path = member.name[len(STORE_PREFIX):] if member.name.startswith(STORE_PREFIX) else None
+                if not member.isfile() or relative_path not in expected:
+                    raise ValueError(f"Unexpected archive member {member.name}")
+                target_path = os.path.join(temp_directory, relative_path)
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                reader = _HashingReader(archive.extractfile(member))
+                with open(target_path, "wb") as target_file:
+                    shutil.copyfileobj(reader, target_file, 1 << 20)
+                file = expected[relative_path]
+                if member.size != file["size"] or reader.digest.hexdigest() != file["sha256"]:
+                    raise ValueError(f"Checksum mismatch for {relative_path}")
+                extracted.add(relative_path)
+
+        missing = set(expected) - extracted
+        if missing:
+            raise ValueError(f"Store archive is missing {sorted(missing)}")
+        os.rename(temp_directory, destination)
+    except BaseException:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+        raise
+    return manifest
+
+def _store_files(directory: str) -> List[str]:
+    """
+    Return the paths of the files of a store directory relative to it, without temporary files
+    and SQLite journals (databases are archived from a snapshot that includes them).
+    """
+    paths = []
+    for current_directory, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.endswith((".tmp", ".sqlite3-wal", ".sqlite3-shm", ".sqlite3-journal")):
+                continue
+            path = os.path.join(current_directory, filename)
+            paths.append(os.path.relpath(path, directory).replace(os.sep, "/"))
+    return sorted(paths)
+
+def _snapshot_database(path: str) -> str:
+    """
+    Copy a SQLite database with the backup API, which sees a consistent state even while
+    another connection writes to it, and return the path of the copy.
+    """
+    handle, snapshot_path = tempfile.mkstemp(suffix=".sqlite3")
+    os.close(handle)
+    source = sqlite3.connect(path, timeout=30)
+    target = sqlite3.connect(snapshot_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    return snapshot_path
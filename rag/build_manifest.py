@@ -0,0 +1,152 @@
+"""
+RAG Build Manifest
+
+This module provides `BuildManifest`, the checkpoint of a store build. `RAGService.create_vectorstore`
+keeps one per store in `<persist_dir>/<store_id>/build_manifest.json`, recording:
+    - the configuration of the build and the content hash of every file
+    - the number of chunks of every file that was completely indexed
+    - the number of chunks that were indexed so far, checkpointed while the build runs
+
+When a build with the same configuration and files is started again after a failure, it
+resumes from the checkpoint: completed files are not parsed again (unless the store is hybrid,
+whose BM25 index is rebuilt) and chunks that are already in the store are not embedded again.
+
+Example:
+    ```python
+    from rag.build_manifest import BuildManifest
+
+    manifest = BuildManifest.load("./chroma_db/my_store")
+    if manifest is not None:
+        print(manifest.get_progress())
+        # {"status": "building", "files_total": 10, "files_done": 3, "document_count": 1536}
+    ```
+"""
+
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+class BuildManifest:
+    """
+    The checkpoint of a store build.
+
+    Attributes:
+        directory (str): The store directory the manifest is kept in
+        config (Dict[str, Any]): The configuration of the build
+        files (List[Dict[str, Any]]): Path, content hash and chunk count (None until the file
+            is completely indexed) of every file
+        document_count (int): Number of chunks indexed at the last checkpoint
+        base_count (int): Number of chunks the store already held before the build (stores
+            persisted without a manifest are added to)
+        status (str): "building" or "complete"
+        resumed_from (int): Number of chunks that were already indexed when the build started
+        updated_at (float): Time of the last checkpoint
+    """
+
+    MANIFEST_FILE = "build_manifest.json"
+
+    def __init__(self, directory: str, config: Dict[str, Any], files: List[Dict[str, Any]]):
+        """
+        Initialize a manifest for a new build.
+
+        Args:
+            directory (str): The store directory
+            config (Dict[str, Any]): The configuration of the build
+            files (List[Dict[str, Any]]): Path and content hash ("path", "hash") of every file
+        """
+        self.directory = directory
+        self.config = config
+        self.files = [{"path": file["path"], "hash": file["hash"], "chunks": None} for file in files]
+        self.document_count = 0
+        self.base_count = 0
+        self.status = "building"
+        self.resumed_from = 0
+        self.updated_at = time.time()
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["BuildManifest"]:
+        """
+        Load the manifest of a store.
+
+        Args:
+            directory (str): The store directory
+
+        Returns:
+            Optional[BuildManifest]: The manifest, or None if the store has none
+        """
+        manifest_path = os.path.join(directory, cls.MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as manifest_file:
+            data = json.load(manifest_file)
+
+        manifest = cls(directory, data["config"], data["files"])
+        manifest.files = data["files"]
+        manifest.document_count = data["document_count"]
+        manifest.base_count = data.get("base_count", 0)
+        manifest.status = data["status"]
+        manifest.resumed_from = data.get("resumed_from", 0)
+        manifest.updated_at = data.get("updated_at", 0.0)
+        return manifest
+
+    def matches(self, config: Dict[str, Any], files: List[Dict[str, Any]]) -> bool:
+        """
+        Check if a build with this configuration and these files can resume from this manifest.
+
+        Args:
+            config (Dict[str, Any]): The configuration of the new build
+            files (List[Dict[str, Any]]): Path and content hash of every file of the new build
+
+        Returns:
+            bool: True if the configuration and the files (in order) are the same
+        """
+        return self.config == config and [(file["path"], file["hash"]) for file in self.files] == [(file["path"], file["hash"]) for file in files]
+
+    def completed_prefix(self) -> int:
+        """
+        Return the number of leading files that were completely indexed.
+        """
+        count = 0
+        for file in self.files:
+            if file["chunks"] is None:
+                break
+            count += 1
+        return count
+
+    def get_progress(self) -> Dict[str, Any]:
+        """
+        Return the progress of the build.
+
+        Returns:
+            Dict[str, Any]: Status, number of files, completed files, indexed chunks, chunks
+            already indexed when the build (re)started, and the time of the last checkpoint
+        """
+        return {
+            "status": self.status,
+            "files_total": len(self.files),
+            "files_done": sum(1 for file in self.files if file["chunks"] is not None),
+            "document_count": self.document_count,
+            "resumed_from": self.resumed_from,
+            "updated_at": self.updated_at,
+        }
+
+    def save(self) -> None:
+        """
+        Write the manifest, atomically replacing the previous checkpoint.
+        """
+        self.updated_at = time.time()
+        data = {
+            "status": self.status,
+            "config": self.config,
+            "files": self.files,
+            "document_count": self.document_count,
+            "base_count": self.base_count,
+            "resumed_from": self.resumed_from,
+            "updated_at": self.updated_at,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = os.path.join(self.directory, self.MANIFEST_FILE + ".tmp")
+        with open(temp_path, "w") as manifest_file:
+            json.dump(data, manifest_file)
+        os.replace(temp_path, os.path.join(self.directory, self.MANIFEST_FILE))
@@ -0,0 +1,107 @@
+"""
+RAG Callbacks
+
+This module provides the LangChain callback handlers and wrappers used by `RAGService`:
+    - TokenQueueHandler: forwards the generated LLM tokens to a queue for streaming
+    - StageTimingHandler: records retrieval and generation time as instrumentation timers
+    - InstrumentedEmbeddings: records embedding calls as instrumentation spans
+
+They subclass LangChain classes, so they live apart from `rag.rag_api`, which only
+imports this module when a store is created or queried.
+
+Example:
+    ```python
+    from queue import Queue
+    from rag.callbacks import StageTimingHandler, TokenQueueHandler
+
+    token_queue = Queue()
+    result = chain({"question": query}, callbacks=[TokenQueueHandler(token_queue), StageTimingHandler()])
+    ```
+"""
+
+import time
+from queue import Queue
+from typing import Any, Dict, List
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.embeddings.base import Embeddings
+
+import instrumentation
+
+class TokenQueueHandler(BaseCallbackHandler):
+    """
+    Callback handler that forwards each newly generated LLM token to a queue.
+
+    Attributes:
+        token_queue (Queue): Queue the generated tokens are put on
+    """
+
+    def __init__(self, token_queue: Queue):
+        """
+        Initialize the handler.
+
+        Args:
+            token_queue (Queue): Queue the generated tokens are put on
+        """
+        self.token_queue = token_queue
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        """
+        Put a newly generated token on the queue.
+
+        Args:
+            token (str): The generated token
+        """
+        self.token_queue.put(token)
+
+class StageTimingHandler(BaseCallbackHandler):
+    """
+    Callback handler that records the retrieval and generation time of a chain run
+    as the "rag.retrieve" and "rag.generate" instrumentation timers.
+    """
+
+    def __init__(self):
+        """
+        Initialize the handler.
+        """
+        self.start_times = {}
+
+    def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: Any, **kwargs: Any) -> None:
+        self.start_times[run_id] = time.perf_counter()
+
+    def on_retriever_end(self, documents: Any, *, run_id: Any, **kwargs: Any) -> None:
+        if run_id in self.start_times:
+            instrumentation.observe("rag.retrieve", time.perf_counter() - self.start_times.pop(run_id))
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: Any, **kwargs: Any) -> None:
+        self.start_times[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: Any, *, run_id: Any, **kwargs: Any) -> None:
+        if run_id in self.start_times:
+            instrumentation.observe("rag.generate", time.perf_counter() - self.start_times.pop(run_id))
+
+class InstrumentedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that records embedding calls as "rag.embed" and
+    "rag.embed_query" instrumentation spans.
+
+    Attributes:
+        embeddings (Embeddings): The wrapped embeddings
+    """
+
+    def __init__(self, embeddings: Embeddings):
+        """
+        Initialize the wrapper.
+
+        Args:
+            embeddings (Embeddings): The wrapped embeddings
+        """
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with instrumentation.span("rag.embed", texts=len(texts)):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with instrumentation.span("rag.embed_query"):
+            return self.embeddings.embed_query(text)
@@ -0,0 +1,310 @@
+"""
+RAG Chunking
+
+This module provides the chunking stage of `RAGService.create_vectorstore`. `StructuredTextSplitter`
+splits documents along their structure and sizes the chunks in tokens of the embedding model:
+
+    - texts are split into sections at headings (Markdown "#" headings, underlined headings and
+      numbered headings like "2.1 Results"), sections into paragraphs and paragraphs into
+      sentences; only sentences longer than a chunk are split at word boundaries
+    - sentences are packed into chunks of up to `chunk_size` tokens without crossing a heading,
+      and every chunk repeats whole trailing sentences of the previous one, up to `chunk_overlap`
+      tokens
+    - every sentence is tokenized once; chunk sizes are sums of sentence sizes, so the overlap
+      is never tokenized again
+
+Tokens are counted with `tiktoken` when it is installed, otherwise they are approximated by
+counting words and punctuation. With `length_unit="characters"`, sizes are in characters instead.
+
+Example:
+    ```python
+    from rag.chunking import StructuredTextSplitter
+
+    splitter = StructuredTextSplitter(chunk_size=256, chunk_overlap=32)
+    chunks = splitter.split_documents(documents)
+    print(splitter.last_stats)  # {"chunks": 120, "tokens": 27400, "overlap_tokens": 2100}
+    ```
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple
+
+from langchain.docstore.document import Document
+
+# Default chunking options of new stores
+DEFAULT_CHUNKING_OPTIONS = {
+    "chunk_size": 256,
+    "chunk_overlap": 32,
+    "length_unit": "tokens",
+    "encoding_name": "cl100k_base",
+    "respect_headings": True,
+}
+
+LENGTH_UNITS = ("tokens", "characters")
+
+_MARKDOWN_HEADING = re.compile(r"^#{1,6}\s+\S")
+_NUMBERED_HEADING = re.compile(r"^(\d+\.)*\d+\.?\s+[A-Z][^.!?]{0,80}$")
+_UNDERLINE = re.compile(r"^(=+|-+)\s*$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+_APPROXIMATE_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+@lru_cache(maxsize=None)
+def get_length_function(length_unit: str = "tokens", encoding_name: str = "cl100k_base") -> Callable[[str], int]:
+    """
+    Return the function that measures the size of a text.
+
+    Args:
+        length_unit (str): "tokens" or "characters"
+        encoding_name (str): The `tiktoken` encoding of the embedding model
+
+    Returns:
+        Callable[[str], int]: The length function
+    """
+    if length_unit == "characters":
+        return len
+    if length_unit != "tokens":
+        raise ValueError(f"Unknown length unit {length_unit}")
+
+    try:
+        import tiktoken
+    except ImportError:
+        return lambda text: len(_APPROXIMATE_TOKEN.findall(text))
+    encoding = tiktoken.get_encoding(encoding_name)
+    return lambda text: len(encoding.encode_ordinary(text))
+
+def is_heading(line: str, next_line: str = "") -> bool:
+    """
+    Check if a line is a heading.
+
+    Args:
+        line (str): The line
+        next_line (str): The line after it, to detect underlined headings
+
+    Returns:
+        bool: True if the line is a heading
+    """
+    line = line.strip()
+    if not line:
+        return False
+    return bool(_MARKDOWN_HEADING.match(line) or _NUMBERED_HEADING.match(line) or _UNDERLINE.match(next_line.strip()))
+
+class StructuredTextSplitter:
+    """
+    Splits documents into chunks along headings, paragraphs and sentences, sized in tokens.
+
+    Attributes:
+        chunk_size (int): Maximum size of a chunk
+        chunk_overlap (int): Maximum size of the whole sentences repeated from the previous chunk
+        length_unit (str): Unit of the sizes, "tokens" or "characters"
+        encoding_name (str): The `tiktoken` encoding used to count tokens
+        respect_headings (bool): Whether chunks end at headings
+        last_stats (Dict[str, int]): Number of chunks, total size and repeated overlap size of
+            the last `split_documents`
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = DEFAULT_CHUNKING_OPTIONS["chunk_size"],
+        chunk_overlap: int = DEFAULT_CHUNKING_OPTIONS["chunk_overlap"],
+        length_unit: str = DEFAULT_CHUNKING_OPTIONS["length_unit"],
+        encoding_name: str = DEFAULT_CHUNKING_OPTIONS["encoding_name"],
+        respect_headings: bool = DEFAULT_CHUNKING_OPTIONS["respect_headings"]
+    ):
+        """
+        Initialize the splitter.
+
+        Args:
+            chunk_size (int): Maximum size of a chunk
+            chunk_overlap (int): Maximum size of the whole sentences repeated from the previous chunk
+            length_unit (str): Unit of the sizes, "tokens" or "characters"
+            encoding_name (str): The `tiktoken` encoding used to count tokens
+            respect_headings (bool): Whether chunks end at headings
+
+        Raises:
+            ValueError: If the sizes or the length unit are invalid
+        """
+        if length_unit not in LENGTH_UNITS:
+            raise ValueError(f"Unknown length unit {length_unit}")
+        if chunk_size <= 0 or not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_size must be positive and chunk_overlap between 0 and chunk_size")
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_unit = length_unit
+        self.encoding_name = encoding_name
+        self.respect_headings = respect_headings
+        self.last_stats = {"chunks": 0, "tokens": 0, "overlap_tokens": 0}
+        self._length = get_length_function(length_unit, encoding_name)
+
+    def get_options(self) -> Dict[str, Any]:
+        """
+        Return the options of the splitter, as persisted in the store configuration.
+
+        Returns:
+            Dict[str, Any]: The options
+        """
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "length_unit": self.length_unit,
+            "encoding_name": self.encoding_name,
+            "respect_headings": self.respect_headings,
+        }
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """
+        Split documents into chunks. Every chunk keeps the metadata of its document and gets
+        its size ("chunk_length") and the heading of its section ("heading") if there is one.
+
+        Args:
+            documents (List[Document]): The documents to split
+
+        Returns:
+            List[Document]: The chunks
+        """
+        stats = {"chunks": 0, "tokens": 0, "overlap_tokens": 0}
+        chunks = []
+        for document in documents:
+            for text, size, overlap_size, heading in self._split_text(document.page_content):
+                metadata = {**document.metadata, "chunk_length": size}
+                if heading:
+                    metadata["heading"] = heading
+                chunks.append(Document(page_content=text, metadata=metadata))
+                stats["chunks"] += 1
+                stats["tokens"] += size
+                stats["overlap_tokens"] += overlap_size
+        self.last_stats = stats
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        """
+        Split a text into chunks.
+
+        Args:
+            text (str): The text
+
+        Returns:
+            List[str]: The chunk texts
+        """
+        return [chunk[0] for chunk in self._split_text(text)]
+
+    def _split_text(self, text: str) -> List[Tuple[str, int, int, str]]:
+        """
+        Split a text into chunks.
+
+        Returns:
+            List[Tuple[str, int, int, str]]: The text, size, size of the repeated overlap and
+            section heading of every chunk
+        """
+        chunks = []
+        for heading, paragraphs in self._sections(text):
+            # Units are (text, size, starts a paragraph); each one is measured once
+            units = []
+            for paragraph in paragraphs:
+                for number, (sentence, size) in enumerate(self._sentences(paragraph)):
+                    units.append((sentence, size, number == 0))
+            chunks.extend((chunk_text, size, overlap_size, heading) for chunk_text, size, overlap_size in self._pack(units, heading))
+        return chunks
+
+    def _sections(self, text: str) -> List[Tuple[str, List[str]]]:
+        """
+        Split a text into sections at headings, and sections into paragraphs. The heading
+        is the first paragraph of its section.
+        """
+        lines = text.splitlines()
+        sections = [("", [])]
+        paragraph = []
+
+        def end_paragraph() -> None:
+            if paragraph:
+                sections[-1][1].append(" ".join(paragraph))
+                paragraph.clear()
+
+        for number, line in enumerate(lines):
+            next_line = lines[number + 1] if number + 1 < len(lines) else ""
+            if _UNDERLINE.match(line.strip()) and number > 0 and is_heading(lines[number - 1], line):
+                continue
+            if not line.strip():
+                end_paragraph()
+            elif self.respect_headings and is_heading(line, next_line):
+                end_paragraph()
+                heading = line.strip().lstrip("#").strip()
+                sections.append((heading, [heading]))
+            else:
+                paragraph.append(line.strip())
+        end_paragraph()
+        return [section for section in sections if section[1]]
+
+    def _sentences(self, paragraph: str) -> List[Tuple[str, int]]:
+        """
+        Split a paragraph into sentences, and sentences longer than a chunk into word runs.
+
+        Returns:
+            List[Tuple[str, int]]: The text and size of every sentence
+        """
+        sentences = []
+        for sentence in _SENTENCE_END.split(paragraph):
+            size = self._length(sentence)
+            if size <= self.chunk_size:
+                sentences.append((sentence, size))
+                continue
+            run = []
+            run_size = 0
+            for word in sentence.split():
+                word_size = self._length(word)
+                if run and run_size + word_size > self.chunk_size:
+                    sentences.append((" ".join(run), run_size))
+                    run, run_size = [], 0
+                run.append(word)
+                run_size += word_size
+            if run:
+                sentences.append((" ".join(run), run_size))
+        return sentences
+
+    def _pack(self, units: List[Tuple[str, int, bool]], heading: str) -> List[Tuple[str, int, int]]:
+        """
+        Pack sentences into chunks of up to `chunk_size`, each starting with whole trailing
+        sentences of the previous chunk of up to `chunk_overlap`. A heading that does not fit
+        with the first sentence of its section is only kept in the chunk metadata.
+
+        Returns:
+            List[Tuple[str, int, int]]: The text, size and size of the repeated overlap of every chunk
+        """
+        chunks = []
+        current = []
+        current_size = 0
+        overlap_size = 0
+        for unit in units:
+            if current and current_size + unit[1] > self.chunk_size:
+                if heading and not chunks and len(current) == 1:
+                    # Drop the heading rather than emitting it as a chunk of its own
+                    current, current_size = [unit], unit[1]
+                    continue
+                chunks.append((self._join(current), current_size, overlap_size))
+                # Carry over whole trailing sentences, as long as they fit the overlap and the next unit
+                carried = []
+                carried_size = 0
+                for previous in reversed(current):
+                    if carried_size + previous[1] > min(self.chunk_overlap, self.chunk_size - unit[1]):
+                        break
+                    carried.insert(0, previous)
+                    carried_size += previous[1]
+                current, current_size, overlap_size = carried, carried_size, carried_size
+            current.append(unit)
+            current_size += unit[1]
+        if current:
+            chunks.append((self._join(current), current_size, overlap_size))
+        return chunks
+
+    @staticmethod
+    def _join(units: List[Tuple[str, int, bool]]) -> str:
+        """
+        Join sentences, keeping paragraph breaks.
+        """
+        text = ""
+        for number, (sentence, _, starts_paragraph) in enumerate(units):
+            if number:
+                text += "\n\n" if starts_paragraph else " "
+            text += sentence
+        return text
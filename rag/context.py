@@ -0,0 +1,247 @@
+"""
+RAG Context Packing
+
+This module provides `ContextPacker`, which turns the chunks retrieved for a question into the
+context passed to the LLM by the chains of `RAGService`:
+
+    - duplicate chunks (the same text from several stores or files) and chunks contained in
+      another retrieved chunk are dropped
+    - chunks are selected best first as long as they fit the token budget `max_tokens`; the text
+      a chunk shares with selected neighbours (the chunk overlap) is not counted twice
+    - selected chunks that follow each other in the same file are merged into one passage, and
+      the overlap between them is removed
+
+The chunks of a store are numbered at ingestion ("chunk_id" is "<store_id>-<number>"), so
+neighbours are chunks with consecutive numbers; every chunk starts with the trailing sentences
+of the previous one (see `rag.chunking`), which is the overlap that is removed.
+
+Example:
+    ```python
+    from rag.context import ContextPacker
+
+    packer = ContextPacker(max_tokens=1024)
+    passages = packer.pack(documents)
+    print(packer.last_stats)  # {"chunks": 8, "selected": 6, "passages": 3, "tokens": 1010, "saved_tokens": 490}
+    ```
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+
+import instrumentation
+from rag.chunking import get_length_function
+
+# Default context options of the chains of a service
+DEFAULT_CONTEXT_OPTIONS = {
+    "max_tokens": 2048,
+    "merge_adjacent": True,
+    "length_unit": "tokens",
+    "encoding_name": "cl100k_base",
+}
+
+def chunk_position(document: Document) -> Optional[Tuple[str, int]]:
+    """
+    Return the store and number of the chunk a document was retrieved from.
+
+    Args:
+        document (Document): The retrieved document
+
+    Returns:
+        Optional[Tuple[str, int]]: The store ID and chunk number, or None for documents
+        without a numbered "chunk_id"
+    """
+    chunk_id = document.metadata.get("chunk_id")
+    if not isinstance(chunk_id, str):
+        return None
+    store_id, _, number = chunk_id.rpartition("-")
+    return (store_id, int(number)) if store_id and number.isdigit() else None
+
+def text_overlap(left: str, right: str, min_overlap: int = 16) -> int:
+    """
+    Return the length of the longest end of a text that another text starts with.
+
+    Args:
+        left (str): The text whose end is compared
+        right (str): The text whose start is compared
+        min_overlap (int): Minimum overlap in characters; shorter overlaps are not counted
+
+    Returns:
+        int: The number of overlapping characters, or 0
+    """
+    if min(len(left), len(right)) < min_overlap:
+        return 0
+    probe = right[:min_overlap]
+    # The earliest match is the longest overlap
+    start = left.find(probe, max(0, len(left) - len(right)))
+    while start != -1:
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start = left.find(probe, start + 1)
+    return 0
+
+class ContextPacker:
+    """
+    Packs retrieved chunks into a context of at most `max_tokens` tokens.
+
+    Attributes:
+        max_tokens (Optional[int]): Token budget of the context, or None for no budget
+        merge_adjacent (bool): Whether chunks that follow each other in a file are merged
+        length_unit (str): Unit of the budget, "tokens" or "characters"
+        encoding_name (str): The `tiktoken` encoding tokens are counted with
+        separator (str): Separator of chunks that are merged without overlapping text
+        last_stats (Dict[str, int]): Number of retrieved chunks, selected chunks, passages,
+            context tokens and tokens saved (duplicates, overlaps and chunks over budget)
+            of the last `pack` call
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = DEFAULT_CONTEXT_OPTIONS["max_tokens"],
+        merge_adjacent: bool = DEFAULT_CONTEXT_OPTIONS["merge_adjacent"],
+        length_unit: str = DEFAULT_CONTEXT_OPTIONS["length_unit"],
+        encoding_name: str = DEFAULT_CONTEXT_OPTIONS["encoding_name"],
+        separator: str = "\n\n"
+    ):
+        """
+        Initialize the packer.
+
+        Args:
+            max_tokens (Optional[int]): Token budget of the context, or None for no budget
+            merge_adjacent (bool): Whether chunks that follow each other in a file are merged
+            length_unit (str): Unit of the budget, "tokens" or "characters"
+            encoding_name (str): The `tiktoken` encoding tokens are counted with
+            separator (str): Separator of chunks that are merged without overlapping text
+
+        Raises:
+            ValueError: If the budget is not positive or the length unit is unknown
+        """
+        if max_tokens is not None and max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        self.max_tokens = max_tokens
+        self.merge_adjacent = merge_adjacent
+        self.length_unit = length_unit
+        self.encoding_name = encoding_name
+        self.separator = separator
+        self._length_function: Callable[[str], int] = get_length_function(length_unit, encoding_name)
+        self.last_stats = {"chunks": 0, "selected": 0, "passages": 0, "tokens": 0, "saved_tokens": 0}
+
+    def pack(self, documents: List[Document]) -> List[Document]:
+        """
+        Pack retrieved chunks into the passages of a context.
+
+        Args:
+            documents (List[Document]): The retrieved chunks, best first
+
+        Returns:
+            List[Document]: The passages, ordered by their best chunk. A merged passage has the
+            metadata of its first chunk, the best "score" of its chunks and the IDs of all its
+            chunks under "chunk_ids"
+        """
+        retrieved_tokens = 0
+        selected: List[Tuple[int, Document]] = []
+        positions: Dict[Tuple[str, int], Document] = {}
+        seen_texts = set()
+        used_tokens = 0
+        for rank, document in enumerate(documents):
+            text = document.page_content
+            retrieved_tokens += self._length_function(text)
+            normalized = " ".join(text.split())
+            if not normalized or normalized in seen_texts or any(text in other.page_content for _, other in selected):
+                continue
+
+            # Text shared with the selected neighbours is already in the context
+            position = chunk_position(document) if self.merge_adjacent else None
+            start, end = 0, len(text)
+            if position is not None:
+                previous = positions.get((position[0], position[1] - 1))
+                following = positions.get((position[0], position[1] + 1))
+                if previous is not None:
+                    start = text_overlap(previous.page_content, text)
+                if following is not None:
+                    end = max(start, len(text) - text_overlap(text, following.page_content))
+            tokens = self._length_function(text[start:end])
+
+            if self.max_tokens is not None and used_tokens + tokens > self.max_tokens:
+                if selected:
+                    # Smaller chunks further down may still fit
+                    continue
+                document = Document(page_content=self._truncate(text, self.max_tokens), metadata=dict(document.metadata))
+                tokens = self._length_function(document.page_content)
+                position = None
+
+            seen_texts.add(normalized)
+            selected.append((rank, document))
+            if position is not None:
+                positions[position] = document
+            used_tokens += tokens
+
+        passages = self._merge(selected) if self.merge_adjacent else [document for _, document in selected]
+        self.last_stats = {
+            "chunks": len(documents),
+            "selected": len(selected),
+            "passages": len(passages),
+            "tokens": used_tokens,
+            "saved_tokens": max(retrieved_tokens - used_tokens, 0),
+        }
+        instrumentation.increment("rag.context_tokens", used_tokens)
+        instrumentation.increment("rag.context_saved_tokens", self.last_stats["saved_tokens"])
+        return passages
+
+    def _merge(self, selected: List[Tuple[int, Document]]) -> List[Document]:
+        """
+        Merge selected chunks that follow each other in the same file into passages.
+        """
+        groups: Dict[Any, List[Tuple[int, int, Document]]] = {}
+        for rank, document in selected:
+            position = chunk_position(document)
+            if position is None:
+                groups[("", rank)] = [(rank, 0, document)]
+            else:
+                key = (position[0], document.metadata.get("source"))
+                groups.setdefault(key, []).append((rank, position[1], document))
+
+        passages: List[Tuple[int, Document]] = []
+        for members in groups.values():
+            members.sort(key=lambda member: member[1])
+            run = [members[0]]
+            for member in members[1:]:
+                if member[1] == run[-1][1] + 1:
+                    run.append(member)
+                else:
+                    passages.append(self._merge_run(run))
+                    run = [member]
+            passages.append(self._merge_run(run))
+        return [document for _, document in sorted(passages, key=lambda passage: passage[0])]
+
+    def _merge_run(self, run: List[Tuple[int, int, Document]]) -> Tuple[int, Document]:
+        """
+        Merge consecutive chunks into one passage, removing the text they share.
+
+        Returns:
+            Tuple[int, Document]: The best rank of the chunks and the passage
+        """
+        if len(run) == 1:
+            return run[0][0], run[0][2]
+        text = run[0][2].page_content
+        for _, _, document in run[1:]:
+            overlap = text_overlap(text, document.page_content)
+            text += document.page_content[overlap:] if overlap else self.separator + document.page_content
+        metadata = dict(run[0][2].metadata)
+        metadata["score"] = max(document.metadata.get("score", 0.0) for _, _, document in run)
+        metadata["chunk_ids"] = [document.metadata["chunk_id"] for _, _, document in run]
+        return min(rank for rank, _, _ in run), Document(page_content=text, metadata=metadata)
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Cut a text at a word boundary so it fits the token budget.
+        """
+        words = text.split(" ")
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self._length_function(" ".join(words[:middle])) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return " ".join(words[:low])
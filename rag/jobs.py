@@ -0,0 +1,291 @@
+"""
+RAG Ingestion Jobs
+
+This module provides `IngestionJobQueue`, which builds vector stores in the background so a
+`rag_create_store` request returns right away instead of blocking until the whole corpus is
+indexed. Builds run on a thread pool (parsing already runs in worker processes, and embedding
+waits on the embedding API), and every job is recorded in a SQLite job table
+(`persist_dir/.jobs.sqlite3` by default) with its status and progress:
+
+    - "queued": submitted, waiting for a worker
+    - "running": building, with the files done and chunks indexed at the last checkpoint
+    - "complete" / "failed": finished, with the chunk count or the error
+    - "interrupted": still queued or running when the process that ran it stopped
+    - "resumed": interrupted and submitted again as a new job by `resume_interrupted`
+
+Builds are checkpointed (see `rag.build_manifest`), so `resume_interrupted` continues the
+interrupted jobs where they stopped. Use one job queue per `persist_dir`.
+
+Example:
+    ```python
+    from rag.jobs import IngestionJobQueue
+
+    job_queue = IngestionJobQueue(rag_service)
+    job_id = job_queue.submit("my_store", ["doc1.pdf", "doc2.pdf"], on_update=print)
+    print(job_queue.get_job(job_id))
+    # {"job_id": "...", "store_id": "my_store", "status": "running", "files_done": 1, ...}
+    job_queue.wait(job_id)
+    ```
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    from rag.rag_api import RAGService
+
+# Statuses of jobs that are not finished
+ACTIVE_STATUSES = ("queued", "running")
+
+_COLUMNS = ("job_id", "store_id", "status", "files_done", "files_total", "document_count", "message", "created_at", "updated_at")
+
+class IngestionJobQueue:
+    """
+    Builds vector stores in the background and keeps a persistent table of the build jobs.
+
+    Attributes:
+        rag_service (RAGService): The service that builds the stores
+        db_path (str): Path of the SQLite job table
+        max_workers (int): Number of stores built at the same time
+        progress_interval (float): Minimum number of seconds between two progress updates
+            of a job sent to its `on_update` callback
+    """
+
+    JOBS_FILE = ".jobs.sqlite3"
+
+    def __init__(
+        self,
+        rag_service: RAGService,
+        db_path: Optional[str] = None,
+        max_workers: int = 1,
+        progress_interval: float = 2.0
+    ):
+        """
+        Initialize the job queue, marking the jobs that an earlier process left unfinished
+        as interrupted.
+
+        Args:
+            rag_service (RAGService): The service that builds the stores
+            db_path (Optional[str]): Path of the SQLite job table, defaults to
+                `.jobs.sqlite3` in the persist directory of the service
+            max_workers (int): Number of stores built at the same time
+            progress_interval (float): Minimum number of seconds between two progress updates
+        """
+        self.rag_service = rag_service
+        self.db_path = db_path or os.path.join(rag_service.persist_dir, self.JOBS_FILE)
+        self.max_workers = max_workers
+        self.progress_interval = progress_interval
+        self._executor = None
+        self._futures = {}  # Futures of the jobs submitted by this queue by job ID
+        self._lock = Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, store_id TEXT, files TEXT, options TEXT, status TEXT, "
+                "files_done INTEGER, files_total INTEGER, document_count INTEGER, message TEXT, "
+                "created_at REAL, updated_at REAL)"
+            )
+            connection.execute(
+                "UPDATE jobs SET status = 'interrupted', updated_at = ? WHERE status IN (?, ?)",
+                (time.time(), *ACTIVE_STATUSES)
+            )
+
+    def submit(
+        self,
+        store_id: str,
+        files: List[str],
+        on_update: Optional[Callable[[Dict[str, Any]], None]] = None,
+        **build_options: Any
+    ) -> str:
+        """
+        Queue the build of a vector store.
+
+        Args:
+            store_id (str): Unique identifier for the vector store
+            files (List[str]): List of file paths to process
+            on_update (Optional[Callable[[Dict[str, Any]], None]]): Called from the worker thread
+                with the job (see `get_job`) when it starts, on progress (at most every
+                `progress_interval` seconds) and when it finishes
+            **build_options (Any): Further arguments of `RAGService.create_vectorstore`, e.g.
+                `vector_backend` or `chunking_options`
+
+        Returns:
+            str: The job ID
+
+        Raises:
+            ValueError: If a build of the store is already queued or running
+        """
+        with self._lock:
+            if any(job["store_id"] == store_id for job in self.list_jobs(ACTIVE_STATUSES)):
+                raise ValueError(f"A build of vector store {store_id} is already queued or running")
+
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT INTO jobs VALUES (?, ?, ?, ?, 'queued', 0, ?, 0, '', ?, ?)",
+                    (job_id, store_id, json.dumps(files), json.dumps(build_options), len(files), now, now)
+                )
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="rag-ingest")
+            self._futures[job_id] = self._executor.submit(self._run, job_id, store_id, files, build_options, on_update)
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the status and progress of a job.
+
+        Args:
+            job_id (str): The job ID
+
+        Returns:
+            Optional[Dict[str, Any]]: The job ID, store ID, status, files done, number of files,
+            chunks indexed, message (the error of a failed job), and creation and update times,
+            or None if there is no such job
+        """
+        with self._connect() as connection:
+            row = connection.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(zip(_COLUMNS, row)) if row is not None else None
+
+    def list_jobs(self, statuses: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """
+        List jobs, oldest first.
+
+        Args:
+            statuses (Optional[tuple]): Only list jobs with these statuses
+
+        Returns:
+            List[Dict[str, Any]]: The jobs, as returned by `get_job`
+        """
+        query = f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+        parameters = ()
+        if statuses:
+            query += f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+            parameters = tuple(statuses)
+        with self._connect() as connection:
+            rows = connection.execute(query + " ORDER BY created_at", parameters).fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Wait for a job submitted by this queue to finish.
+
+        Args:
+            job_id (str): The job ID
+            timeout (Optional[float]): Maximum number of seconds to wait
+
+        Returns:
+            Optional[Dict[str, Any]]: The job, as returned by `get_job`
+
+        Raises:
+            TimeoutError: If the job is not finished within the timeout
+        """
+        future = self._futures.get(job_id)
+        if future is not None:
+            future.result(timeout=timeout)
+        return self.get_job(job_id)
+
+    def resume_interrupted(self, on_update: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[str]:
+        """
+        Submit the jobs that were interrupted again. Their builds continue from the last checkpoint.
+
+        Args:
+            on_update (Optional[Callable[[Dict[str, Any]], None]]): Called with every update of the
+                resubmitted jobs
+
+        Returns:
+            List[str]: The IDs of the new jobs
+        """
+        with self._connect() as connection:
+            rows = connection.execute("SELECT job_id, store_id, files, options FROM jobs WHERE status = 'interrupted' ORDER BY created_at").fetchall()
+        job_ids = []
+        for old_job_id, store_id, files, options in rows:
+            job_ids.append(self.submit(store_id, json.loads(files), on_update, **json.loads(options)))
+            self._update(old_job_id, status="resumed", message=f"Resumed as job {job_ids[-1]}")
+        return job_ids
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the workers. Queued jobs that have not started are cancelled and marked as interrupted.
+
+        Args:
+            wait (bool): Whether to wait for the running jobs to finish
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+        for job_id, future in list(self._futures.items()):
+            if future.cancelled():
+                self._update(job_id, status="interrupted")
+
+    def _run(
+        self,
+        job_id: str,
+        store_id: str,
+        files: List[str],
+        build_options: Dict[str, Any],
+        on_update: Optional[Callable[[Dict[str, Any]], None]]
+    ) -> None:
+        """
+        Build a store in a worker thread, recording its progress in the job table.
+        """
+        last_update = 0.0
+
+        def notify(job: Dict[str, Any]) -> None:
+            if on_update is not None:
+                on_update(job)
+
+        def report_progress(progress: Dict[str, Any]) -> None:
+            nonlocal last_update
+            job = self._update(job_id, files_done=progress["files_done"], document_count=progress["document_count"])
+            if time.monotonic() - last_update >= self.progress_interval:
+                last_update = time.monotonic()
+                notify(job)
+
+        notify(self._update(job_id, status="running"))
+        last_update = time.monotonic()
+        try:
+            result = self.rag_service.create_vectorstore(files, store_id, progress_callback=report_progress, **build_options)
+        except Exception as error:
+            notify(self._update(job_id, status="failed", message=str(error)))
+            return
+        message = ""
+        if result["resumed_from"]:
+            message = f"Resumed after {result['resumed_from']} chunks indexed by an earlier attempt"
+        notify(self._update(job_id, status="complete", files_done=len(files), document_count=result["document_count"], message=message))
+
+    def _update(self, job_id: str, **fields: Any) -> Dict[str, Any]:
+        """
+        Update columns of a job and return the job.
+        """
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._connect() as connection:
+            connection.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE job_id = ?",
+                (*fields.values(), time.time(), job_id)
+            )
+        return self.get_job(job_id)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Open a connection to the job table. Every operation uses its own connection, so the
+        table can be used from any thread; changes are committed when the block exits.
+        """
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
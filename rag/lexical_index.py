@@ -0,0 +1,318 @@
+"""
+Lexical (BM25) Index
+
+This module provides a small inverted index with BM25 scoring. It is built at ingestion
+time next to a vector store so exact-term matches (names, IDs, codes) that embedding
+search tends to miss can be retrieved, and fused with the vector results by
+`rag.retrievers.HybridRetriever`.
+
+Only the postings and the document lengths are kept in memory. The documents (chunk texts and
+metadata) are written to a SQLite table as they are added and read back by row for the results
+of a search, so building or loading the index of a corpus larger than RAM is possible. The index
+is persisted inside the store directory as a JSON file with the postings (`bm25_index.json`) and
+the SQLite database of the documents (`bm25_documents.sqlite3`). Searches take the same metadata
+`filter` expressions as the vector stores (see `rag.metadata_index`).
+
+Example:
+    ```python
+    from rag.lexical_index import BM25Index
+
+    index = BM25Index(directory="./chroma_db/my_store")
+    index.add_documents(chunks)
+    index.save("./chroma_db/my_store")
+
+    index = BM25Index.load("./chroma_db/my_store")
+    results = index.search("JFK-1963", k=5)
+    # Returns: [(Document(...), 7.31), ...]
+    ```
+"""
+
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+
+from rag.metadata_index import MetadataIndex
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Number of rows read at once when the metadata index is built from the documents table
+METADATA_BATCH_SIZE = 10000
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split a text into lower-case word tokens.
+
+    Args:
+        text (str): The text to tokenize
+
+    Returns:
+        List[str]: The tokens
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """
+    An inverted index over document chunks scored with Okapi BM25.
+
+    Attributes:
+        k1 (float): Term frequency saturation parameter
+        b (float): Document length normalization parameter
+        postings (Dict[str, Dict[int, int]]): Term frequencies by term and document number
+        document_lengths (List[int]): Token count of every document
+    """
+
+    INDEX_FILE = "bm25_index.json"
+    DOCUMENTS_FILE = "bm25_documents.sqlite3"
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, directory: Optional[str] = None):
+        """
+        Initialize an empty index.
+
+        Args:
+            k1 (float): Term frequency saturation parameter
+            b (float): Document length normalization parameter
+            directory (Optional[str]): The store directory the index will be saved to. Added documents
+                are written to a temporary table in it, which `save` moves into place; without a
+                directory they are written to a temporary file that `save` copies.
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.document_lengths = []
+        self._total_length = 0
+        self._metadata_index = None  # Built on the first filtered search
+        self._directory = directory
+        self._documents_path = None  # The documents table, created when the first documents are added
+
+    def __len__(self) -> int:
+        """
+        Return the number of indexed documents.
+        """
+        return len(self.document_lengths)
+
+    def add_documents(self, documents: List[Document]) -> None:
+        """
+        Add documents to the index.
+
+        Args:
+            documents (List[Document]): The documents to add
+        """
+        if self._documents_path is None:
+            self._create_documents_table()
+        rows = []
+        for document in documents:
+            document_number = len(self.document_lengths)
+            term_counts = Counter(tokenize(document.page_content))
+            for term, count in term_counts.items():
+                self.postings.setdefault(term, {})[document_number] = count
+
+            length = sum(term_counts.values())
+            rows.append((document_number, document.page_content, json.dumps(document.metadata)))
+            self.document_lengths.append(length)
+            self._total_length += length
+        with self._connect(writable=True) as connection:
+            connection.executemany("INSERT INTO documents (row, page_content, metadata) VALUES (?, ?, ?)", rows)
+        if self._metadata_index is not None:
+            self._metadata_index.add([document.metadata for document in documents])
+
+    def search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """
+        Return the documents with the highest BM25 score for a query.
+
+        Args:
+            query (str): The query text
+            k (int): Number of documents to return
+            filter (Optional[Dict[str, Any]]): Only score documents whose metadata matches this
+                filter expression
+
+        Returns:
+            List[Tuple[Document, float]]: The best matching documents and their scores, best first
+        """
+        if not self.document_lengths:
+            return []
+
+        allowed = None
+        if filter:
+            if self._metadata_index is None:
+                self._metadata_index = self._build_metadata_index()
+            allowed = np.zeros(len(self.document_lengths), dtype=bool)
+            allowed[self._metadata_index.match(filter)] = True
+
+        document_count = len(self.document_lengths)
+        average_length = self._total_length / document_count
+        scores = {}
+        for term in set(tokenize(query)):
+            term_postings = self.postings.get(term)
+            if not term_postings:
+                continue
+
+            idf = math.log(1.0 + (document_count - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+            for document_number, frequency in term_postings.items():
+                if allowed is not None and not allowed[document_number]:
+                    continue
+                length_norm = 1.0 - self.b + self.b * self.document_lengths[document_number] / average_length
+                term_score = idf * frequency * (self.k1 + 1.0) / (frequency + self.k1 * length_norm)
+                scores[document_number] = scores.get(document_number, 0.0) + term_score
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        documents = self._read_documents([document_number for document_number, _ in best])
+        return [(documents[document_number], score) for document_number, score in best]
+
+    def save(self, directory: str) -> None:
+        """
+        Persist the index to a directory.
+
+        Args:
+            directory (str): The store directory
+        """
+        os.makedirs(directory, exist_ok=True)
+        if self._documents_path is None:
+            self._create_documents_table()
+        documents_path = os.path.join(directory, self.DOCUMENTS_FILE)
+        if self._documents_path == documents_path + ".tmp":
+            os.replace(self._documents_path, documents_path)
+        elif self._documents_path != documents_path:
+            # Copy the table with the backup API, page by page
+            source = sqlite3.connect(self._documents_path)
+            target = sqlite3.connect(documents_path + ".tmp")
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            os.replace(documents_path + ".tmp", documents_path)
+            if self._directory is None:
+                os.remove(self._documents_path)
+        self._documents_path = documents_path
+        self._directory = directory
+
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "document_lengths": self.document_lengths,
+            "postings": self.postings,
+        }
+        temp_path = os.path.join(directory, self.INDEX_FILE + ".tmp")
+        with open(temp_path, "w") as index_file:
+            json.dump(data, index_file)
+        os.replace(temp_path, os.path.join(directory, self.INDEX_FILE))
+
+    @classmethod
+    def load(cls, directory: str) -> "BM25Index":
+        """
+        Load an index persisted by `save`. Indexes saved with their documents in the JSON file
+        (before the documents table was added) are converted on first load.
+
+        Args:
+            directory (str): The store directory
+
+        Returns:
+            BM25Index: The loaded index
+        """
+        with open(os.path.join(directory, cls.INDEX_FILE)) as index_file:
+            data = json.load(index_file)
+
+        if "documents" in data:
+            index = cls(k1=data["k1"], b=data["b"], directory=directory)
+            index.add_documents([Document(**document) for document in data["documents"]])
+            index.save(directory)
+            return index
+
+        index = cls(k1=data["k1"], b=data["b"], directory=directory)
+        index.postings = {
+            term: {int(document_number): count for document_number, count in term_postings.items()}
+            for term, term_postings in data["postings"].items()
+        }
+        index.document_lengths = data["document_lengths"]
+        index._total_length = sum(index.document_lengths)
+        index._documents_path = os.path.join(directory, cls.DOCUMENTS_FILE)
+
+        return index
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        """
+        Check whether an index has been persisted to a directory.
+
+        Args:
+            directory (str): The store directory
+
+        Returns:
+            bool: True if the directory contains an index
+        """
+        return os.path.exists(os.path.join(directory, cls.INDEX_FILE))
+
+    def _create_documents_table(self) -> None:
+        """
+        Create the table the added documents are written to: a temporary table in the store
+        directory, or a temporary file if the index has no directory yet.
+        """
+        if self._directory is not None:
+            os.makedirs(self._directory, exist_ok=True)
+            self._documents_path = os.path.join(self._directory, self.DOCUMENTS_FILE + ".tmp")
+            if os.path.exists(self._documents_path):
+                os.remove(self._documents_path)
+        else:
+            handle, self._documents_path = tempfile.mkstemp(suffix=".sqlite3")
+            os.close(handle)
+        with self._connect(writable=True) as connection:
+            connection.execute("CREATE TABLE documents (row INTEGER PRIMARY KEY, page_content TEXT, metadata TEXT)")
+
+    def _read_documents(self, document_numbers: List[int]) -> Dict[int, Document]:
+        """
+        Read documents from the documents table by document number.
+        """
+        documents = {}
+        if not document_numbers:
+            return documents
+        with self._connect() as connection:
+            placeholders = ", ".join("?" * len(document_numbers))
+            for row, page_content, metadata in connection.execute(
+                f"SELECT row, page_content, metadata FROM documents WHERE row IN ({placeholders})", document_numbers
+            ):
+                documents[row] = Document(page_content=page_content, metadata=json.loads(metadata))
+        return documents
+
+    def _build_metadata_index(self) -> MetadataIndex:
+        """
+        Build the metadata index of the documents, reading their metadata in batches.
+        """
+        metadata_index = MetadataIndex()
+        with self._connect() as connection:
+            cursor = connection.execute("SELECT metadata FROM documents ORDER BY row")
+            while True:
+                rows = cursor.fetchmany(METADATA_BATCH_SIZE)
+                if not rows:
+                    break
+                metadata_index.add([json.loads(metadata) for (metadata,) in rows])
+        return metadata_index
+
+    @contextmanager
+    def _connect(self, writable: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Open a connection to the documents table. Every operation uses its own connection, so
+        the index can be searched from any thread; changes are committed when the block exits.
+        Temporary tables that are still being built are only written by this index and have no journal.
+        """
+        if writable:
+            connection = sqlite3.connect(self._documents_path, timeout=30)
+            if os.path.basename(self._documents_path) != self.DOCUMENTS_FILE:
+                connection.execute("PRAGMA journal_mode = OFF")
+                connection.execute("PRAGMA synchronous = OFF")
+        else:
+            connection = sqlite3.connect(f"file:{self._documents_path}?mode=ro", uri=True, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
@@ -0,0 +1,295 @@
+"""
+RAG Metadata Index
+
+This module provides metadata filtering for retrieval. Every chunk carries metadata recorded at
+ingestion (source file, file name, page, section heading, modification time), and queries can
+carry a filter expression over it, so only the matching chunks are searched.
+
+Filter expressions use the syntax of Chroma's `where` filters:
+    - {"source": "docs/report.pdf"}: equality, several fields in one dictionary must all match
+    - {"page": {"$gte": 3, "$lte": 5}}: comparison with "$eq", "$ne", "$gt", "$gte", "$lt", "$lte"
+    - {"file_name": {"$in": ["a.pdf", "b.pdf"]}}: membership with "$in" and "$nin"
+    - {"$and": [...]}, {"$or": [...]}: combinations of expressions
+
+Chroma evaluates filters with its own metadata index. For the NumPy store, `MetadataIndex` keeps
+an inverted index (value to rows) of every scalar metadata field and sorted columns for range
+queries, so a filter is resolved to its candidate rows before any vector is scored.
+
+Example:
+    ```python
+    from rag.metadata_index import MetadataIndex
+
+    index = MetadataIndex()
+    index.add([{"source": "a.pdf", "page": 1}, {"source": "b.pdf", "page": 7}])
+    rows = index.match({"$or": [{"source": "a.pdf"}, {"page": {"$gt": 5}}]})  # array([0, 1])
+    ```
+"""
+
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+COMPARISON_OPERATORS = ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin")
+LOGICAL_OPERATORS = ("$and", "$or")
+
+# Unique per chunk or only informative, so they are not indexed
+UNINDEXED_FIELDS = ("chunk_id", "id", "chunk_length", "score")
+
+# Metadata values that can be indexed and compared in a filter
+SCALAR_TYPES = (str, int, float, bool)
+
+def validate_filter(filter: Dict[str, Any]) -> None:
+    """
+    Check that a filter expression is well formed.
+
+    Args:
+        filter (Dict[str, Any]): The filter expression
+
+    Raises:
+        ValueError: If the expression is not valid
+    """
+    if not isinstance(filter, dict) or not filter:
+        raise ValueError(f"A filter must be a non-empty dictionary, not {filter!r}")
+    for key, value in filter.items():
+        if key in LOGICAL_OPERATORS:
+            if not isinstance(value, list) or not value:
+                raise ValueError(f"{key} takes a non-empty list of filters")
+            for expression in value:
+                validate_filter(expression)
+        elif key.startswith("$"):
+            raise ValueError(f"Unknown filter operator {key}")
+        elif isinstance(value, dict):
+            for operator, operand in value.items():
+                if operator not in COMPARISON_OPERATORS:
+                    raise ValueError(f"Unknown filter operator {operator}")
+                if operator in ("$in", "$nin"):
+                    if not isinstance(operand, list):
+                        raise ValueError(f"{operator} takes a list of values")
+                    for item in operand:
+                        _validate_operand(key, item)
+                else:
+                    _validate_operand(key, operand)
+        else:
+            _validate_operand(key, value)
+
+def _validate_operand(field: str, operand: Any) -> None:
+    """
+    Check that a value compared with a metadata field is a scalar.
+    """
+    if not isinstance(operand, SCALAR_TYPES):
+        raise ValueError(f"The filter on {field} compares with {operand!r}, only strings, numbers and booleans can be compared")
+
+def normalize_filter(filter: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rewrite a filter with several fields in one dictionary into an "$and" of single
+    field filters, as required by Chroma.
+
+    Args:
+        filter (Dict[str, Any]): The filter expression
+
+    Returns:
+        Dict[str, Any]: The equivalent filter with one key per dictionary
+    """
+    expressions = []
+    for key, value in filter.items():
+        if key in LOGICAL_OPERATORS:
+            expressions.append({key: [normalize_filter(expression) for expression in value]})
+        elif isinstance(value, dict) and len(value) > 1:
+            expressions.extend({key: {operator: operand}} for operator, operand in value.items())
+        else:
+            expressions.append({key: value})
+    return expressions[0] if len(expressions) == 1 else {"$and": expressions}
+
+def matches_filter(metadata: Dict[str, Any], filter: Dict[str, Any]) -> bool:
+    """
+    Check if the metadata of a single document matches a filter expression.
+
+    Args:
+        metadata (Dict[str, Any]): The metadata
+        filter (Dict[str, Any]): The filter expression
+
+    Returns:
+        bool: True if the metadata matches
+    """
+    for key, value in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, expression) for expression in value):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, expression) for expression in value):
+                return False
+        else:
+            conditions = value if isinstance(value, dict) else {"$eq": value}
+            if key not in metadata:
+                return False
+            if not all(_compare(metadata[key], operator, operand) for operator, operand in conditions.items()):
+                return False
+    return True
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    """
+    Apply a comparison operator; values of different types are never equal (True is not 1),
+    and values of incomparable types never match a range.
+    """
+    if operator == "$eq":
+        return _value_key(value) == _value_key(operand)
+    if operator == "$ne":
+        return _value_key(value) != _value_key(operand)
+    if operator == "$in":
+        return _value_key(value) in [_value_key(item) for item in operand]
+    if operator == "$nin":
+        return _value_key(value) not in [_value_key(item) for item in operand]
+    try:
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        return value <= operand
+    except TypeError:
+        return False
+
+def _value_key(value: Any) -> Tuple[type, Any]:
+    """
+    Return the key a metadata value is indexed and compared by, so that equal values
+    of different types (True and 1, 1 and 1.0) are kept apart.
+    """
+    return (type(value), value)
+
+def indexed_fields(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return the fields of a metadata dictionary that are indexed: scalar values of all
+    fields except `UNINDEXED_FIELDS`.
+
+    Args:
+        metadata (Dict[str, Any]): The metadata
+
+    Returns:
+        Dict[str, Any]: The indexed fields
+    """
+    return {
+        field: value for field, value in metadata.items()
+        if field not in UNINDEXED_FIELDS and isinstance(value, SCALAR_TYPES)
+    }
+
+class MetadataIndex:
+    """
+    An index of the scalar metadata fields of the rows of a vector store.
+
+    Attributes:
+        count (int): Number of indexed rows
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index.
+        """
+        self.count = 0
+        self._postings = {}  # Rows by value key (see _value_key) by field, in increasing row order
+        self._sorted = {}  # (sorted values, their rows) by field and value kind, built on first range query
+
+    def add(self, metadatas: List[Dict[str, Any]]) -> None:
+        """
+        Append rows to the index.
+
+        Args:
+            metadatas (List[Dict[str, Any]]): The metadata of every new row
+        """
+        for metadata in metadatas:
+            for field, value in indexed_fields(metadata).items():
+                self._postings.setdefault(field, {}).setdefault(_value_key(value), []).append(self.count)
+                self._sorted.pop((field, "number"), None)
+                self._sorted.pop((field, "string"), None)
+            self.count += 1
+
+    def match(self, filter: Dict[str, Any]) -> np.ndarray:
+        """
+        Find the rows matching a filter expression.
+
+        Args:
+            filter (Dict[str, Any]): The filter expression
+
+        Returns:
+            np.ndarray: The matching row numbers, in increasing order
+        """
+        rows = None
+        for key, value in filter.items():
+            if key == "$and":
+                key_rows = self.match(value[0])
+                for expression in value[1:]:
+                    key_rows = np.intersect1d(key_rows, self.match(expression), assume_unique=True)
+            elif key == "$or":
+                key_rows = np.unique(np.concatenate([self.match(expression) for expression in value]))
+            else:
+                conditions = value if isinstance(value, dict) else {"$eq": value}
+                key_rows = None
+                for operator, operand in conditions.items():
+                    operator_rows = self._match_field(key, operator, operand)
+                    key_rows = operator_rows if key_rows is None else np.intersect1d(key_rows, operator_rows, assume_unique=True)
+            rows = key_rows if rows is None else np.intersect1d(rows, key_rows, assume_unique=True)
+        return rows if rows is not None else np.arange(self.count, dtype=np.int64)
+
+    def _match_field(self, field: str, operator: str, operand: Any) -> np.ndarray:
+        """
+        Find the rows whose field matches one comparison.
+        """
+        postings = self._postings.get(field, {})
+        if operator == "$eq":
+            return self._rows(postings.get(_value_key(operand), []))
+        if operator == "$in":
+            return self._union(postings.get(_value_key(value), []) for value in operand)
+        if operator in ("$ne", "$nin"):
+            excluded = set(_value_key(value) for value in ([operand] if operator == "$ne" else operand))
+            return self._union(rows for value_key, rows in postings.items() if value_key not in excluded)
+
+        if isinstance(operand, str):
+            values, rows = self._sorted_column(field, "string")
+        elif isinstance(operand, (int, float)) and not isinstance(operand, bool):
+            values, rows = self._sorted_column(field, "number")
+        else:
+            return np.empty(0, dtype=np.int64)
+        if operator == "$gt":
+            selected = rows[np.searchsorted(values, operand, side="right"):]
+        elif operator == "$gte":
+            selected = rows[np.searchsorted(values, operand, side="left"):]
+        elif operator == "$lt":
+            selected = rows[:np.searchsorted(values, operand, side="left")]
+        else:
+            selected = rows[:np.searchsorted(values, operand, side="right")]
+        return np.sort(selected)
+
+    def _sorted_column(self, field: str, kind: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the numeric ("number") or string ("string") values of a field sorted, with their
+        rows. Range queries only compare values of the same kind.
+        """
+        if (field, kind) not in self._sorted:
+            values, rows = [], []
+            for (_, value), value_rows in self._postings.get(field, {}).items():
+                is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                if (kind == "number" and is_number) or (kind == "string" and isinstance(value, str)):
+                    values.extend([value] * len(value_rows))
+                    rows.extend(value_rows)
+            values = np.asarray(values, dtype=np.float64 if kind == "number" else str)
+            rows = np.asarray(rows, dtype=np.int64)
+            order = np.argsort(values, kind="stable")
+            self._sorted[(field, kind)] = (values[order], rows[order])
+        return self._sorted[(field, kind)]
+
+    @staticmethod
+    def _rows(rows: List[int]) -> np.ndarray:
+        """
+        Return a posting list as an array of rows.
+        """
+        return np.asarray(rows, dtype=np.int64)
+
+    @staticmethod
+    def _union(row_lists: Iterable[List[int]]) -> np.ndarray:
+        """
+        Return the union of posting lists as a sorted array of rows.
+        """
+        arrays = [np.asarray(rows, dtype=np.int64) for rows in row_lists]
+        if not arrays:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(arrays))
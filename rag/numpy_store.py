@@ -0,0 +1,762 @@
+"""
+NumPy Vector Store
+
+This module provides a lightweight local vector store that can be used instead of Chroma.
+Embeddings are normalized and appended to a raw binary file that is memory-mapped as an
+(N, D) NumPy matrix, so opening a store is a constant-time operation and only the rows
+touched by a search are paged in. Small stores are searched exactly with batched
+dot products; large stores can additionally use an HNSW index (requires `hnswlib`).
+
+Embeddings can be stored with scalar quantization to cut memory and disk usage:
+    - "float32": full precision (4 bytes per dimension)
+    - "float16": half precision (2 bytes per dimension)
+    - "int8": one byte per dimension plus a float32 scale per vector
+
+With `full_precision_rerank=True` a float32 copy is kept on disk as well. Searches
+then score a larger candidate pool on the quantized matrix and re-rank it with the
+float32 rows, which are only paged in for the candidates.
+
+Searches take a `filter` expression over the chunk metadata (see `rag.metadata_index`). It is
+resolved to the matching rows with a `MetadataIndex`, loaded on first use, and only those rows
+are scored (exactly, without the HNSW index).
+
+On disk a store is a directory containing:
+    - manifest.json: dimension, row count, dtype and index information
+    - embeddings.f32 / embeddings.f16 / embeddings.i8: the normalized embedding matrix (row major)
+    - scales.f32: the per-vector scales of an int8 matrix
+    - full.f32: the float32 copy used for re-ranking
+    - documents.jsonl: one JSON document (id, page_content, metadata) per line
+    - offsets.i64: byte offset of every line of documents.jsonl
+    - metadata.jsonl: the indexed metadata fields of every row, one JSON object per line
+    - index.hnsw: the optional HNSW index
+
+`get_storage_stats` reports the bytes of the live rows and the dead bytes (rows left behind by an
+interrupted append, an unused HNSW file), and `compact` reclaims them along with temporary files and brings a stale HNSW index up
+to date, so a long-lived store opens and searches as fast as a freshly built one.
+
+Example:
+    ```python
+    from rag.numpy_store import NumpyVectorStore
+
+    vectorstore = NumpyVectorStore.from_documents(
+        documents=chunks,
+        embedding=embeddings,
+        persist_directory="./chroma_db/my_store"
+    )
+    vectorstore.persist()
+
+    # Reopen the persisted store
+    vectorstore = NumpyVectorStore(embedding=embeddings, persist_directory="./chroma_db/my_store")
+    docs = vectorstore.similarity_search("What is the main topic?", k=4)
+
+    # Only search the chunks of one file
+    docs = vectorstore.similarity_search("What is the main topic?", k=4, filter={"source": "docs/report.pdf"})
+
+    # An int8 store with full-precision re-ranking of the top candidates
+    vectorstore = NumpyVectorStore.from_documents(
+        documents=chunks,
+        embedding=embeddings,
+        persist_directory="./chroma_db/my_int8_store",
+        dtype="int8",
+        full_precision_rerank=True
+    )
+    ```
+"""
+
+import json
+import os
+import tempfile
+import uuid
+from threading import RLock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+from langchain.vectorstores.base import VectorStore
+
+from rag.metadata_index import MetadataIndex, indexed_fields
+
+try:
+    import hnswlib
+except ImportError:  # HNSW indexing is optional
+    hnswlib = None
+
+class NumpyVectorStore(VectorStore):
+    """
+    A vector store backed by a memory-mapped float32 NumPy matrix.
+
+    Attributes:
+        persist_directory (str): Directory the store is kept in
+        dtype (str): Storage type of the embedding matrix ("float32", "float16" or "int8")
+        full_precision_rerank (bool): Whether candidates are re-ranked with float32 embeddings
+        rerank_pool_factor (int): Candidate pool size for re-ranking, as a multiple of k
+        hnsw_threshold (int): Row count from which an HNSW index is built on persist
+        search_batch_size (int): Number of rows scored per dot-product batch
+    """
+
+    MANIFEST_FILE = "manifest.json"
+    EMBEDDINGS_FILES = {
+        "float32": "embeddings.f32",
+        "float16": "embeddings.f16",
+        "int8": "embeddings.i8",
+    }
+    SCALES_FILE = "scales.f32"
+    FULL_PRECISION_FILE = "full.f32"
+    DOCUMENTS_FILE = "documents.jsonl"
+    OFFSETS_FILE = "offsets.i64"
+    METADATA_FILE = "metadata.jsonl"
+    HNSW_FILE = "index.hnsw"
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        persist_directory: Optional[str] = None,
+        dtype: str = "float32",
+        full_precision_rerank: bool = False,
+        rerank_pool_factor: int = 4,
+        hnsw_threshold: int = 100_000,
+        search_batch_size: int = 65_536
+    ):
+        """
+        Initialize the store, opening the persisted data if there is any.
+
+        The storage options of a persisted store are read from its manifest and
+        take precedence over the arguments.
+
+        Args:
+            embedding (Embeddings): Embeddings used for documents and queries
+            persist_directory (Optional[str]): Directory the store is kept in. A
+                temporary directory is used when not given.
+            dtype (str): Storage type of the embedding matrix ("float32", "float16" or "int8")
+            full_precision_rerank (bool): Keep float32 embeddings on disk and re-rank candidates with them
+            rerank_pool_factor (int): Candidate pool size for re-ranking, as a multiple of k
+            hnsw_threshold (int): Row count from which an HNSW index is built on persist
+            search_batch_size (int): Number of rows scored per dot-product batch
+
+        Raises:
+            ValueError: If the dtype is not supported
+        """
+        if dtype not in self.EMBEDDINGS_FILES:
+            raise ValueError(f"Unsupported embedding dtype {dtype}")
+
+        self._embedding = embedding
+        self.persist_directory = persist_directory or tempfile.mkdtemp(prefix="numpy_store_")
+        self.dtype = dtype
+        self.full_precision_rerank = full_precision_rerank
+        self.rerank_pool_factor = rerank_pool_factor
+        self.hnsw_threshold = hnsw_threshold
+        self.search_batch_size = search_batch_size
+
+        self._lock = RLock()
+        self._dimension = None
+        self._count = 0
+        self._matrix = None  # Memory map, reopened lazily after writes
+        self._scales = None  # Memory map, reopened lazily after writes
+        self._full_matrix = None  # Memory map, reopened lazily after writes
+        self._offsets = None  # Memory map, reopened lazily after writes
+        self._hnsw_index = None
+        self._hnsw_count = 0
+        self._metadata_index = None  # Loaded on the first filtered search
+        self._metadata_size = 0  # Bytes of the metadata file covering the rows, None if it must be rebuilt
+
+        os.makedirs(self.persist_directory, exist_ok=True)
+        self._load_manifest()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """
+        The embeddings used by the store.
+        """
+        return self._embedding
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        """
+        Embed texts and append them to the store.
+
+        Args:
+            texts (Iterable[str]): Texts to add
+            metadatas (Optional[List[dict]]): Metadata for every text
+            ids (Optional[List[str]]): IDs for every text, generated when not given
+
+        Returns:
+            List[str]: The IDs of the added texts
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+
+        embeddings = self._embedding.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas=metadatas, ids=ids)
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        Append already embedded texts to the store.
+
+        Args:
+            texts (List[str]): Texts to add
+            embeddings (List[List[float]]): The embedding of every text
+            metadatas (Optional[List[dict]]): Metadata for every text
+            ids (Optional[List[str]]): IDs for every text, generated when not given
+
+        Returns:
+            List[str]: The IDs of the added texts
+
+        Raises:
+            ValueError: If the embedding dimension doesn't match the store
+        """
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+
+        with self._lock:
+            if self._dimension is None:
+                self._dimension = int(vectors.shape[1])
+            elif vectors.shape[1] != self._dimension:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self._dimension}")
+
+            self._ensure_metadata_file()
+            with open(self._path(self.METADATA_FILE), "ab") as metadata_file:
+                for metadata in metadatas:
+                    metadata_file.write(json.dumps(indexed_fields(metadata)).encode("utf-8") + b"\n")
+                self._metadata_size = metadata_file.tell()
+            if self._metadata_index is not None:
+                self._metadata_index.add(metadatas)
+
+            offsets = []
+            with open(self._path(self.DOCUMENTS_FILE), "ab") as documents_file:
+                for doc_id, text, metadata in zip(ids, texts, metadatas):
+                    offsets.append(documents_file.tell())
+                    line = json.dumps({"id": doc_id, "page_content": text, "metadata": metadata})
+                    documents_file.write(line.encode("utf-8") + b"\n")
+            with open(self._path(self.OFFSETS_FILE), "ab") as offsets_file:
+                offsets_file.write(np.asarray(offsets, dtype=np.int64).tobytes())
+            stored_vectors, scales = self._quantize(vectors)
+            with open(self._path(self.EMBEDDINGS_FILES[self.dtype]), "ab") as embeddings_file:
+                embeddings_file.write(stored_vectors.tobytes())
+            if scales is not None:
+                with open(self._path(self.SCALES_FILE), "ab") as scales_file:
+                    scales_file.write(scales.tobytes())
+            if self.full_precision_rerank and self.dtype != "float32":
+                with open(self._path(self.FULL_PRECISION_FILE), "ab") as full_file:
+                    full_file.write(vectors.tobytes())
+
+            self._count += len(texts)
+            self._matrix = None
+            self._scales = None
+            self._full_matrix = None
+            self._offsets = None
+            self._write_manifest()
+
+        return ids
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        """
+        Return the documents most similar to a query.
+
+        Args:
+            query (str): The query text
+            k (int): Number of documents to return
+
+        Returns:
+            List[Document]: The most similar documents
+        """
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Return the documents most similar to a query with their cosine similarity.
+
+        Args:
+            query (str): The query text
+            k (int): Number of documents to return
+
+        Returns:
+            List[Tuple[Document, float]]: The most similar documents and their scores
+        """
+        query_vector = self._embedding.embed_query(query)
+        return self.similarity_search_by_vector_with_score(query_vector, k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        """
+        Return the documents most similar to an embedding.
+
+        Args:
+            embedding (List[float]): The query embedding
+            k (int): Number of documents to return
+
+        Returns:
+            List[Document]: The most similar documents
+        """
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """
+        Return the documents most similar to an embedding with their cosine similarity.
+
+        Args:
+            embedding (List[float]): The query embedding
+            k (int): Number of documents to return
+            filter (Optional[Dict[str, Any]]): Only search documents whose metadata matches this
+                filter expression (see `rag.metadata_index`)
+
+        Returns:
+            List[Tuple[Document, float]]: The most similar documents and their scores
+        """
+        candidate_rows = self._get_metadata_index().match(filter) if filter else None
+        rows, scores = self._search(np.asarray(embedding, dtype=np.float32), k, candidate_rows)
+        return [(self._get_document(row), float(score)) for row, score in zip(rows, scores)]
+
+    def persist(self) -> None:
+        """
+        Flush the manifest and (re)build the HNSW index if the store is large enough.
+        """
+        with self._lock:
+            if hnswlib is not None and self._count >= self.hnsw_threshold and self._hnsw_count != self._count:
+                self._build_hnsw_index()
+            self._write_manifest()
+
+    def count(self) -> int:
+        """
+        Return the number of documents in the store.
+
+        Returns:
+            int: The number of documents
+        """
+        return self._count
+
+    def get_storage_stats(self) -> Dict[str, int]:
+        """
+        Return the disk usage of the store.
+
+        Returns:
+            Dict[str, int]: The number of rows ("chunk_count"), the bytes of the live embeddings
+            including scales and the float32 copy ("embedding_bytes"), of the HNSW index, offsets
+            and metadata file ("index_bytes") and of the documents ("document_bytes"), the bytes
+            of the data files ("total_bytes") and the bytes of rows left behind by an
+            interrupted append and of stale files ("free_bytes")
+        """
+        with self._lock:
+            row_sizes = self._row_sizes()
+            embedding_bytes = sum(
+                self._count * row_sizes[filename] for filename in (self.EMBEDDINGS_FILES[self.dtype], self.SCALES_FILE, self.FULL_PRECISION_FILE)
+                if os.path.exists(self._path(filename))
+            )
+            index_bytes = self._count * row_sizes[self.OFFSETS_FILE] + (self._metadata_size or 0)
+            if self._hnsw_count and os.path.exists(self._path(self.HNSW_FILE)):
+                index_bytes += os.path.getsize(self._path(self.HNSW_FILE))
+            document_bytes = self._documents_size()
+            total_bytes = sum(os.path.getsize(self._path(filename)) for filename in self._data_files() if os.path.exists(self._path(filename)))
+            live_bytes = embedding_bytes + index_bytes + document_bytes
+            if os.path.exists(self._path(self.MANIFEST_FILE)):
+                live_bytes += os.path.getsize(self._path(self.MANIFEST_FILE))
+        return {
+            "chunk_count": self._count,
+            "embedding_bytes": embedding_bytes,
+            "index_bytes": index_bytes,
+            "document_bytes": document_bytes,
+            "total_bytes": total_bytes,
+            "free_bytes": max(total_bytes - live_bytes, 0),
+        }
+
+    def compact(self) -> int:
+        """
+        Reclaim the dead bytes of the store and bring its indexes up to date: data files are
+        cut back to the live rows, temporary files of interrupted writes and an unused HNSW file
+        are removed, a missing metadata file is rebuilt and a stale HNSW index is rebuilt over
+        all rows.
+
+        Returns:
+            int: The number of bytes reclaimed (negative if rebuilt indexes take more space)
+        """
+        with self._lock:
+            before = self.get_storage_stats()["total_bytes"] + self._temp_files_size()
+            self._truncate_files()
+            for filename in self._data_files():
+                if os.path.exists(self._path(filename + ".tmp")):
+                    os.remove(self._path(filename + ".tmp"))
+            if self._count:
+                self._ensure_metadata_file()
+            if hnswlib is not None and self._count >= self.hnsw_threshold and self._hnsw_count != self._count:
+                self._build_hnsw_index()
+            elif not self._hnsw_count and os.path.exists(self._path(self.HNSW_FILE)):
+                os.remove(self._path(self.HNSW_FILE))
+            self._write_manifest()
+            return before - self.get_storage_stats()["total_bytes"]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        persist_directory: Optional[str] = None,
+        **kwargs: Any
+    ) -> "NumpyVectorStore":
+        """
+        Create a store from a list of texts.
+
+        Args:
+            texts (List[str]): Texts to add
+            embedding (Embeddings): Embeddings used for documents and queries
+            metadatas (Optional[List[dict]]): Metadata for every text
+            persist_directory (Optional[str]): Directory the store is kept in
+            **kwargs: Further arguments for the store constructor
+
+        Returns:
+            NumpyVectorStore: The created store
+        """
+        ids = kwargs.pop("ids", None)
+        vectorstore = cls(embedding=embedding, persist_directory=persist_directory, **kwargs)
+        vectorstore.add_texts(texts, metadatas=metadatas, ids=ids)
+        return vectorstore
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        """
+        Map cosine similarity in [-1, 1] to a relevance score in [0, 1].
+        """
+        return lambda score: (score + 1.0) / 2.0
+
+    def _search(self, query_vector: np.ndarray, k: int, candidate_rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the rows most similar to a query vector.
+
+        Rows covered by the HNSW index are searched approximately, all remaining
+        rows are scored exactly in batches of `search_batch_size`. Candidate rows of a
+        filter are all scored exactly. With `full_precision_rerank`,
+        `rerank_pool_factor * k` candidates are scored on the stored matrix and
+        re-ranked with their float32 embeddings.
+
+        Args:
+            query_vector (np.ndarray): The (unnormalized) query vector
+            k (int): Number of rows to return
+            candidate_rows (Optional[np.ndarray]): Only search these rows (in increasing order)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Row numbers and scores, best first
+        """
+        with self._lock:
+            matrix = self._get_matrix()
+            scales = self._scales
+            hnsw_index, hnsw_count = self._hnsw_index, self._hnsw_count
+
+        if matrix is None or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        final_k = k
+        rerank = self.full_precision_rerank and self.dtype != "float32"
+        if rerank:
+            k = k * self.rerank_pool_factor
+
+        query_vector = self._normalize(query_vector.reshape(1, -1))[0]
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+
+        if candidate_rows is not None:
+            # Pre-filtered: score only the candidates, gathering their rows batch by batch
+            candidate_rows = candidate_rows[candidate_rows < matrix.shape[0]]
+            for start in range(0, len(candidate_rows), self.search_batch_size):
+                rows = candidate_rows[start:start + self.search_batch_size]
+                vectors = np.asarray(matrix[rows], dtype=np.float32)
+                if scales is not None:
+                    vectors *= np.asarray(scales[rows]).reshape(-1, 1)
+                best_rows = np.concatenate([best_rows, rows])
+                best_scores = np.concatenate([best_scores, vectors @ query_vector])
+                if len(best_scores) > k:
+                    keep = np.argpartition(-best_scores, k - 1)[:k]
+                    best_rows, best_scores = best_rows[keep], best_scores[keep]
+            exact_start = matrix.shape[0]
+        elif hnsw_index is not None:
+            hnsw_index.set_ef(max(2 * k, 64))
+            labels, distances = hnsw_index.knn_query(query_vector, k=min(k, hnsw_count))
+            best_rows = labels[0].astype(np.int64)
+            best_scores = (1.0 - distances[0]).astype(np.float32)
+            exact_start = hnsw_count
+        else:
+            exact_start = 0
+
+        for start in range(exact_start, matrix.shape[0], self.search_batch_size):
+            scores = self._dequantize(matrix, scales, start, start + self.search_batch_size) @ query_vector
+            best_rows = np.concatenate([best_rows, np.arange(start, start + len(scores), dtype=np.int64)])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > k:
+                keep = np.argpartition(-best_scores, k - 1)[:k]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+
+        if rerank:
+            with self._lock:
+                full_matrix = self._get_full_matrix()
+            order = np.argsort(best_rows)  # Sorted reads page in fewer blocks
+            best_rows = best_rows[order]
+            best_scores = np.asarray(full_matrix[best_rows]) @ query_vector
+            if len(best_scores) > final_k:
+                keep = np.argpartition(-best_scores, final_k - 1)[:final_k]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+
+        order = np.argsort(-best_scores)
+        return best_rows[order], best_scores[order]
+
+    def _get_matrix(self) -> Optional[np.ndarray]:
+        """
+        Return the memory-mapped (possibly quantized) embedding matrix, reopening it after writes.
+        """
+        if self._count == 0:
+            return None
+        if self._matrix is None:
+            self._matrix = np.memmap(self._path(self.EMBEDDINGS_FILES[self.dtype]), dtype=np.dtype(self.dtype), mode="r", shape=(self._count, self._dimension))
+        if self.dtype == "int8" and self._scales is None:
+            self._scales = np.memmap(self._path(self.SCALES_FILE), dtype=np.float32, mode="r", shape=(self._count,))
+        return self._matrix
+
+    def _get_full_matrix(self) -> Optional[np.ndarray]:
+        """
+        Return the memory-mapped float32 embedding matrix used for re-ranking.
+        """
+        if self.dtype == "float32":
+            return self._get_matrix()
+        if self._count == 0:
+            return None
+        if self._full_matrix is None:
+            self._full_matrix = np.memmap(self._path(self.FULL_PRECISION_FILE), dtype=np.float32, mode="r", shape=(self._count, self._dimension))
+        return self._full_matrix
+
+    @staticmethod
+    def _dequantize(matrix: np.ndarray, scales: Optional[np.ndarray], start: int, end: int) -> np.ndarray:
+        """
+        Return rows of the embedding matrix as float32.
+
+        Args:
+            matrix (np.ndarray): The stored embedding matrix
+            scales (Optional[np.ndarray]): The per-vector scales of an int8 matrix
+            start (int): First row
+            end (int): Row after the last row
+
+        Returns:
+            np.ndarray: The (approximate) float32 embeddings of the rows
+        """
+        rows = np.asarray(matrix[start:end], dtype=np.float32)
+        if scales is not None:
+            rows *= np.asarray(scales[start:end]).reshape(-1, 1)
+        return rows
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Convert normalized float32 vectors to the storage type of the store.
+
+        int8 vectors are scaled per vector so that their largest component maps to 127.
+
+        Args:
+            vectors (np.ndarray): The normalized vectors
+
+        Returns:
+            Tuple[np.ndarray, Optional[np.ndarray]]: The stored vectors and, for int8, their scales
+        """
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), None
+        if self.dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            quantized = np.clip(np.rint(vectors / scales.reshape(-1, 1)), -127, 127).astype(np.int8)
+            return quantized, scales.astype(np.float32)
+        return vectors, None
+
+    def _get_document(self, row: int) -> Document:
+        """
+        Read a single document from the documents file.
+
+        Args:
+            row (int): Row number of the document
+
+        Returns:
+            Document: The document, with its ID stored in the metadata under "id"
+        """
+        with self._lock:
+            if self._offsets is None:
+                self._offsets = np.memmap(self._path(self.OFFSETS_FILE), dtype=np.int64, mode="r", shape=(self._count,))
+            offset = int(self._offsets[row])
+
+        with open(self._path(self.DOCUMENTS_FILE), "rb") as documents_file:
+            documents_file.seek(offset)
+            record = json.loads(documents_file.readline())
+
+        metadata = dict(record["metadata"])
+        metadata["id"] = record["id"]
+        return Document(page_content=record["page_content"], metadata=metadata)
+
+    def _build_hnsw_index(self) -> None:
+        """
+        Build the HNSW index over all rows and save it next to the matrix.
+        """
+        matrix = self._get_matrix()
+        index = hnswlib.Index(space="ip", dim=self._dimension)
+        index.init_index(max_elements=self._count, ef_construction=200, M=16)
+        for start in range(0, self._count, self.search_batch_size):
+            rows = self._dequantize(matrix, self._scales, start, start + self.search_batch_size)
+            index.add_items(rows, np.arange(start, start + len(rows)))
+        index.save_index(self._path(self.HNSW_FILE))
+
+        self._hnsw_index = index
+        self._hnsw_count = self._count
+
+    def _load_manifest(self) -> None:
+        """
+        Open the persisted store described by the manifest, if there is one.
+        """
+        manifest_path = self._path(self.MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return
+
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+
+        self._dimension = manifest["dimension"]
+        self._count = manifest["count"]
+        self.dtype = manifest.get("dtype", "float32")
+        self.full_precision_rerank = manifest.get("full_precision_rerank", False)
+        self._hnsw_count = manifest.get("hnsw_count", 0)
+        self._metadata_size = manifest.get("metadata_size")
+        self._truncate_files()
+
+        if hnswlib is not None and self._hnsw_count and os.path.exists(self._path(self.HNSW_FILE)):
+            index = hnswlib.Index(space="ip", dim=self._dimension)
+            index.load_index(self._path(self.HNSW_FILE), max_elements=self._hnsw_count)
+            self._hnsw_index = index
+        else:
+            self._hnsw_count = 0
+
+    def _get_metadata_index(self) -> MetadataIndex:
+        """
+        Return the metadata index of the rows, loading it from the metadata file on first use.
+        """
+        with self._lock:
+            if self._metadata_index is None:
+                self._ensure_metadata_file()
+                metadata_index = MetadataIndex()
+                if self._count:
+                    with open(self._path(self.METADATA_FILE), "rb") as metadata_file:
+                        metadata_index.add([json.loads(line) for line in metadata_file])
+                self._metadata_index = metadata_index
+            return self._metadata_index
+
+    def _ensure_metadata_file(self) -> None:
+        """
+        Rebuild the metadata file from the documents file when it is missing, as in stores
+        persisted before metadata was indexed.
+        """
+        metadata_path = self._path(self.METADATA_FILE)
+        if self._metadata_size is not None and (os.path.exists(metadata_path) or self._count == 0):
+            return
+        temp_path = metadata_path + ".tmp"
+        with open(temp_path, "wb") as metadata_file:
+            if self._count:
+                with open(self._path(self.DOCUMENTS_FILE), "rb") as documents_file:
+                    for _, line in zip(range(self._count), documents_file):
+                        metadata_file.write(json.dumps(indexed_fields(json.loads(line)["metadata"])).encode("utf-8") + b"\n")
+            self._metadata_size = metadata_file.tell()
+        os.replace(temp_path, metadata_path)
+        self._write_manifest()
+
+    def _truncate_files(self) -> None:
+        """
+        Cut the data files back to the rows of the manifest. A process killed while appending
+        leaves rows behind that the manifest doesn't count, which would misalign the next append.
+        """
+        for filename, row_size in self._row_sizes().items():
+            path = self._path(filename)
+            if os.path.exists(path) and os.path.getsize(path) > self._count * row_size:
+                os.truncate(path, self._count * row_size)
+        metadata_path = self._path(self.METADATA_FILE)
+        if self._metadata_size is not None and os.path.exists(metadata_path) and os.path.getsize(metadata_path) > self._metadata_size:
+            os.truncate(metadata_path, self._metadata_size)
+
+        documents_path = self._path(self.DOCUMENTS_FILE)
+        if os.path.exists(documents_path) and os.path.getsize(documents_path) > self._documents_size():
+            os.truncate(documents_path, self._documents_size())
+
+    def _data_files(self) -> List[str]:
+        """
+        Return the names of all files a store can have (other files in its directory, e.g. of
+        the service, are not part of it).
+        """
+        return [*self.EMBEDDINGS_FILES.values(), self.SCALES_FILE, self.FULL_PRECISION_FILE, self.DOCUMENTS_FILE,
+                self.OFFSETS_FILE, self.METADATA_FILE, self.HNSW_FILE, self.MANIFEST_FILE]
+
+    def _temp_files_size(self) -> int:
+        """
+        Return the bytes of the temporary files that interrupted writes left behind.
+        """
+        return sum(os.path.getsize(self._path(filename + ".tmp")) for filename in self._data_files() if os.path.exists(self._path(filename + ".tmp")))
+
+    def _row_sizes(self) -> Dict[str, int]:
+        """
+        Return the bytes per row of every fixed-size data file.
+        """
+        return {
+            self.EMBEDDINGS_FILES[self.dtype]: self._dimension * np.dtype(self.dtype).itemsize if self._dimension else 0,
+            self.SCALES_FILE: np.dtype(np.float32).itemsize,
+            self.FULL_PRECISION_FILE: self._dimension * np.dtype(np.float32).itemsize if self._dimension else 0,
+            self.OFFSETS_FILE: np.dtype(np.int64).itemsize,
+        }
+
+    def _documents_size(self) -> int:
+        """
+        Return the bytes of the documents file that hold the counted rows; the file ends with
+        the line of the last counted row.
+        """
+        if not self._count:
+            return 0
+        last_offset = np.fromfile(self._path(self.OFFSETS_FILE), dtype=np.int64, count=1, offset=(self._count - 1) * 8)[0]
+        with open(self._path(self.DOCUMENTS_FILE), "rb") as documents_file:
+            documents_file.seek(int(last_offset))
+            documents_file.readline()
+            return documents_file.tell()
+
+    def _write_manifest(self) -> None:
+        """
+        Atomically write the manifest describing the persisted data.
+        """
+        manifest = {
+            "dimension": self._dimension,
+            "count": self._count,
+            "dtype": self.dtype,
+            "full_precision_rerank": self.full_precision_rerank,
+            "hnsw_count": self._hnsw_count,
+            "metadata_size": self._metadata_size
+        }
+        temp_path = self._path(self.MANIFEST_FILE + ".tmp")
+        with open(temp_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temp_path, self._path(self.MANIFEST_FILE))
+
+    def _path(self, filename: str) -> str:
+        """
+        Return the path of a file inside the store directory.
+        """
+        return os.path.join(self.persist_directory, filename)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """
+        Scale every row to unit length so dot products are cosine similarities.
+        """
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
@@ -0,0 +1,244 @@
+"""
+RAG Document Parsing
+
+This module provides the parsing stage of `RAGService.create_vectorstore`: `DocumentParser`
+turns files into LangChain documents with `UnstructuredFileLoader`, which is CPU-heavy
+(especially for PDFs), so
+
+    - files are parsed in parallel by a pool of worker processes and yielded in order, file
+      by file, with a bounded number of files in flight (see `iter_parse`), and
+    - the parsed documents are cached on disk keyed by the SHA-256 of the file content and the
+      parser version, so re-ingesting unchanged files (even under another path) skips parsing.
+
+The parser version combines `PARSER_VERSION`, the parse function and the installed version of
+`unstructured`, so upgrading the parser invalidates the cache.
+
+Example:
+    ```python
+    from rag.parsing import DocumentParser
+
+    parser = DocumentParser(cache_dir="./chroma_db/.parse_cache", max_workers=8)
+    documents = parser.parse(["doc1.pdf", "doc2.pdf"])
+    print(parser.last_stats)  # {"files": 2, "cached": 0, "parsed": 2}
+    ```
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from importlib import metadata
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+
+# Bump when the output of the parsing stage changes, to invalidate cached results
+PARSER_VERSION = "1"
+
+def parse_file(path: str) -> List[Dict[str, Any]]:
+    """
+    Parse one file with `UnstructuredFileLoader`. Runs in the worker processes.
+
+    Args:
+        path (str): The file to parse
+
+    Returns:
+        List[Dict[str, Any]]: The documents as {"page_content", "metadata"} dictionaries
+    """
+    from langchain.document_loaders import UnstructuredFileLoader
+
+    return [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in UnstructuredFileLoader(path).load()]
+
+def available_cpus() -> int:
+    """
+    Return the number of CPUs this process may run on (which can be less than the
+    CPU count of the machine in containers).
+
+    Returns:
+        int: The number of CPUs
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def file_hash(path: str) -> str:
+    """
+    Return the SHA-256 hex digest of a file's content.
+
+    Args:
+        path (str): The file
+
+    Returns:
+        str: The digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as hashed_file:
+        for block in iter(lambda: hashed_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class DocumentParser:
+    """
+    Parses files into documents across a process pool, with an on-disk cache of the results.
+
+    Attributes:
+        cache_dir (Optional[str]): Directory of the parse cache, or None to disable caching
+        max_workers (Optional[int]): Number of worker processes, defaults to the available CPUs;
+            1 parses in the calling process
+        parse_function (Callable[[str], List[Dict[str, Any]]]): Parses one file; must be a
+            module level function so it can be sent to the workers
+        start_method (str): Multiprocessing start method of the pool; "spawn" is safe in
+            multi-threaded servers like Streamlit
+        parser_version (str): Version of the parser, part of every cache key
+        last_stats (Dict[str, int]): Number of files, cache hits and parsed files of the last
+            `parse` or `iter_parse`, updated as the files are yielded
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        parse_function: Callable[[str], List[Dict[str, Any]]] = parse_file,
+        start_method: str = "spawn",
+        parser_version: Optional[str] = None
+    ):
+        """
+        Initialize the parser.
+
+        Args:
+            cache_dir (Optional[str]): Directory of the parse cache, or None to disable caching
+            max_workers (Optional[int]): Number of worker processes, defaults to the available CPUs
+            parse_function (Callable[[str], List[Dict[str, Any]]]): Parses one file
+            start_method (str): Multiprocessing start method of the pool
+            parser_version (Optional[str]): Version of the parser, derived from the parse
+                function and the installed `unstructured` by default
+        """
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers or available_cpus()
+        self.parse_function = parse_function
+        self.start_method = start_method
+        self.parser_version = parser_version or self._default_parser_version()
+        self.last_stats = {"files": 0, "cached": 0, "parsed": 0}
+
+    def parse(self, files: List[str]) -> List[Document]:
+        """
+        Parse files into documents, in the order of the files.
+
+        Args:
+            files (List[str]): List of file paths to parse
+
+        Returns:
+            List[Document]: The documents of all files
+        """
+        return [document for _, documents in self.iter_parse(files) for document in documents]
+
+    def iter_parse(self, files: Iterable[str]) -> Iterator[Tuple[str, List[Document]]]:
+        """
+        Parse files into documents and yield them file by file, in the order of the files.
+
+        Cache misses are parsed by one process pool for all files, with at most two files
+        per worker in flight, so only a bounded number of parsed files is held in memory.
+
+        Args:
+            files (Iterable[str]): File paths to parse
+
+        Yields:
+            Tuple[str, List[Document]]: The path and the documents of every file
+        """
+        self.last_stats = {"files": 0, "cached": 0, "parsed": 0}
+        executor = None
+        pending = deque()  # (path, cache key, result or future, is cached) in file order
+        try:
+            for path in files:
+                cache_key = self._cache_key(path) if self.cache_dir is not None else None
+                cached = self._read_cache(cache_key) if cache_key is not None else None
+                if cached is not None:
+                    pending.append((path, cache_key, cached, True))
+                elif self.max_workers <= 1:
+                    pending.append((path, cache_key, self.parse_function(path), False))
+                else:
+                    if executor is None:
+                        context = multiprocessing.get_context(self.start_method)
+                        executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+                    pending.append((path, cache_key, executor.submit(self.parse_function, path), False))
+
+                # Yield finished files in order, and wait for the oldest one when too many are in flight
+                while pending and (not isinstance(pending[0][2], Future) or pending[0][2].done() or len(pending) > 2 * self.max_workers):
+                    yield self._finish(*pending.popleft())
+            while pending:
+                yield self._finish(*pending.popleft())
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    def _finish(self, path: str, cache_key: Optional[str], result: Any, is_cached: bool) -> Tuple[str, List[Document]]:
+        """
+        Wait for the parse result of a file, cache it and turn it into documents.
+
+        Args:
+            path (str): The file
+            cache_key (Optional[str]): The cache key of the file, None without cache
+            result (Any): The cached or parsed result, or the future of the parse
+            is_cached (bool): Whether the result was read from the cache
+
+        Returns:
+            Tuple[str, List[Document]]: The path and the documents of the file
+        """
+        if isinstance(result, Future):
+            result = result.result()
+        self.last_stats["files"] += 1
+        if is_cached:
+            self.last_stats["cached"] += 1
+        else:
+            self.last_stats["parsed"] += 1
+            if cache_key is not None:
+                self._write_cache(cache_key, result)
+
+        documents = []
+        for parsed_document in result:
+            # Cached results may come from the same content under another path
+            document_metadata = dict(parsed_document["metadata"])
+            if "source" in document_metadata:
+                document_metadata["source"] = path
+            documents.append(Document(page_content=parsed_document["page_content"], metadata=document_metadata))
+        return path, documents
+
+    def _default_parser_version(self) -> str:
+        """
+        Derive the parser version from `PARSER_VERSION`, the parse function and `unstructured`.
+        """
+        try:
+            unstructured_version = metadata.version("unstructured")
+        except metadata.PackageNotFoundError:
+            unstructured_version = "none"
+        function_name = f"{self.parse_function.__module__}.{self.parse_function.__qualname__}"
+        return f"{PARSER_VERSION}:{function_name}:{unstructured_version}"
+
+    def _cache_key(self, path: str) -> str:
+        """
+        Return the cache key of a file: its content hash combined with the parser version.
+        """
+        return hashlib.sha256(f"{file_hash(path)}:{self.parser_version}".encode()).hexdigest()
+
+    def _read_cache(self, cache_key: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Read cached parse results, or None on a cache miss.
+        """
+        cache_path = os.path.join(self.cache_dir, cache_key + ".json")
+        if not os.path.exists(cache_path):
+            return None
+        with open(cache_path) as cache_file:
+            return json.load(cache_file)
+
+    def _write_cache(self, cache_key: str, parsed: List[Dict[str, Any]]) -> None:
+        """
+        Write parse results to the cache.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_path = os.path.join(self.cache_dir, cache_key + ".json")
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as cache_file:
+            json.dump(parsed, cache_file)
+        os.replace(temp_path, cache_path)
@@ -0,0 +1,104 @@
+"""
+RAG Pipeline Helpers
+
+This module provides the building blocks of the streaming ingestion of `RAGService.create_vectorstore`,
+which runs load → split → embed → upsert as a chain of generators so the corpus is never held
+in memory as a whole:
+    - run_in_thread: runs a generator in a background thread behind a bounded queue, so a
+      stage works ahead of the next one by at most `maxsize` items
+    - batched: groups the items of a generator into lists
+
+Example:
+    ```python
+    from rag.pipeline import batched, run_in_thread
+
+    documents = run_in_thread(parse(files), maxsize=8)
+    chunks = run_in_thread((chunk for document in documents for chunk in split(document)), maxsize=1024)
+    for batch in batched(chunks, 256):
+        vectorstore.add_documents(batch)
+    ```
+"""
+
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from typing import Any, Iterable, Iterator, List
+
+_DONE = object()
+
+def run_in_thread(iterable: Iterable[Any], maxsize: int) -> Iterator[Any]:
+    """
+    Iterate over an iterable in a background thread, handing its items over through a
+    bounded queue. Exceptions of the iterable are raised by the returned iterator.
+
+    Args:
+        iterable (Iterable[Any]): The items, e.g. a generator of the previous stage
+        maxsize (int): Maximum number of items produced ahead of the consumer
+
+    Yields:
+        Any: The items of the iterable
+    """
+    items = Queue(maxsize=maxsize)
+    stopped = Event()
+
+    def put(item: Any) -> bool:
+        # Give up when the consumer stopped, instead of blocking on a full queue forever
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as error:
+            put((_DONE, error))
+            return
+        finally:
+            # Let a generator clean up (e.g. shut down its process pool) when it is abandoned
+            if hasattr(iterable, "close"):
+                iterable.close()
+        put((_DONE, None))
+
+    producer = Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = items.get()
+            if isinstance(item, tuple) and len(item) == 2 and item[0] is _DONE:
+                if item[1] is not None:
+                    raise item[1]
+                return
+            yield item
+    finally:
+        stopped.set()
+        # Unblock the producer if it is waiting on a full queue
+        try:
+            while True:
+                items.get_nowait()
+        except Empty:
+            pass
+
+def batched(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Group the items of an iterable into lists of `size` items (the last one may be shorter).
+
+    Args:
+        iterable (Iterable[Any]): The items
+        size (int): Items per batch
+
+    Yields:
+        List[Any]: The batches
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
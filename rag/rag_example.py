@@ -59,6 +59,9 @@ def main():
         if response_type == "store_created":
             print(f"Store created: {response.get_message_value_by_attribute('store_id')}")
             print(f"Document count: {response.get_message_value_by_attribute('document_count')}")
+        elif response_type == "store_partial":
+            # The build failed partway; sending the same message again resumes it
+            print(f"Partially built: {response.get_message_value_by_attribute('message')}")
         elif response_type == "error":
             print(f"Error: {response.get_message_value_by_attribute('message')}")
     
@@ -70,7 +73,8 @@ def main():
         message_type="rag_query",
         message_value={
             "store_id": "example_store",
-            "query": "What is the main topic of the documents?"
+            "query": "What is the main topic of the documents?",
+            "filter": {}
         }
     )
     
@@ -32,13 +32,35 @@ Example:
     response = rag_handler.process_message(chat)
     if response:
         chat.append_message(response)
+    
+    # Stream the answer to a query into the chat
+    query_message = SinglePartMessage.create_message(
+        author="human",
+        author_type="human",
+        message_type="rag_query",
+        message_value={
+            "store_id": "my_store",
+            "query": "What is the main topic?",
+            "filter": {}
+        }
+    )
+    chat.append_message(query_message)
+    rag_handler.stream_message(chat)
     ```
 """
 
-from typing import Optional
-from message import SinglePartMessage
+from __future__ import annotations
+
+from queue import Empty, Queue
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union, List
+import message_types
+from message import SinglePartMessage, MultiPartMessage
 from chat import Chat
-from rag.rag_api import RAGService
+
+# Only needed for type hints: the handler is created with a service, so it never imports rag.rag_api itself
+if TYPE_CHECKING:
+    from rag.jobs import IngestionJobQueue
+    from rag.rag_api import RAGService
 
 class RAGHandler:
     """
@@ -48,18 +70,33 @@ class RAGHandler:
     appropriate responses. It acts as a bridge between the chat system and
     the RAG service.
     
+    Besides building and querying stores, the handler reports the disk usage of a store
+    (`rag_store_stats`), compacts it (`rag_compact_store`) and deletes it (`rag_delete_store`).
+    
+    For a tenant of a `MultiTenantRAGService`, create the handler with the tenant's service and
+    job queue (see `rag.tenancy`); builds over the tenant's quota are answered with an error.
+    
+    With a job queue, stores are built in the background: a `rag_create_store` message is
+    answered right away with a `job_queued` response carrying the job ID, and the progress
+    of the build is added to the chat as `rag_job_status` messages by `append_job_updates`.
+    
     Attributes:
         rag_service (RAGService): The RAG service instance to use for operations
+        job_queue (Optional[IngestionJobQueue]): The queue that builds stores in the
+            background, or None to build them while the message is processed
     """
     
-    def __init__(self, rag_service: RAGService):
+    def __init__(self, rag_service: RAGService, job_queue: Optional[IngestionJobQueue] = None):
         """
         Initialize the RAG handler.
         
         Args:
             rag_service (RAGService): The RAG service instance to use
+            job_queue (Optional[IngestionJobQueue]): The queue to build stores in the background with
         """
         self.rag_service = rag_service
+        self.job_queue = job_queue
+        self._job_updates = {}  # (chat, queue of job updates) of the running jobs by job ID
 
     def process_message(self, chat: Chat) -> Optional[SinglePartMessage]:
         """
@@ -97,48 +134,380 @@ class RAGHandler:
             store_id = last_message.get_message_value_by_attribute("store_id")
             files = last_message.get_message_value_by_attribute("files")
             
-            result = self.rag_service.create_vectorstore(files, store_id)
+            if self.job_queue is not None:
+                return self._submit_job(chat, store_id, files)
             
-            return SinglePartMessage.create_message(
-                author="genai",
-                author_type="genai",
-                message_type="rag_response",
-                message_value={
-                    "type": "store_created",
-                    "store_id": result["store_id"],
-                    "document_count": result["document_count"]
-                }
+            from rag.tenancy import QuotaExceededError
+            try:
+                result = self.rag_service.create_vectorstore(files, store_id)
+            except QuotaExceededError as error:
+                # Building again only helps once the tenant has room for the store
+                return self._create_response(
+                    type="error",
+                    store_id=store_id,
+                    message=str(error)
+                )
+            except Exception as error:
+                try:
+                    build_progress = self.rag_service.get_build_progress(store_id)
+                except ValueError as invalid_error:
+                    # The store ID is invalid, nothing was built
+                    return self._create_response(
+                        type="error",
+                        message=str(invalid_error)
+                    )
+                if build_progress is None:
+                    raise
+                # The build is checkpointed, so report how far it got; the same request resumes it
+                return self._create_response(
+                    type="store_partial",
+                    store_id=store_id,
+                    document_count=build_progress["document_count"],
+                    message=(
+                        f"Building {store_id} stopped after {build_progress['files_done']} of "
+                        f"{build_progress['files_total']} files ({build_progress['document_count']} chunks): "
+                        f"{error}. Create the store again to resume."
+                    )
+                )
+            
+            message = ""
+            if result["resumed_from"]:
+                message = f"Resumed after {result['resumed_from']} chunks indexed by an earlier attempt"
+            return self._create_response(
+                type="store_created",
+                store_id=result["store_id"],
+                document_count=result["document_count"],
+                message=message
+            )
+            
+        elif last_message.get_message_type() == "rag_job_status" and last_message.get_author_type() == "human":
+            # Report the status of a background build
+            job_id = last_message.get_message_value_by_attribute("job_id")
+            job = self.job_queue.get_job(job_id) if self.job_queue is not None else None
+            if job is None:
+                return self._create_response(
+                    type="error",
+                    message=f"Job {job_id} not found"
+                )
+            return self._create_job_status(job)
+            
+        elif last_message.get_message_type() == "rag_store_stats" and last_message.get_author_type() == "human":
+            # Report the disk usage of a store
+            store_id = last_message.get_message_value_by_attribute("store_id")
+            try:
+                stats = self.rag_service.stats(store_id)
+            except ValueError as error:
+                return self._create_response(
+                    type="error",
+                    message=str(error)
+                )
+            if stats is None:
+                return self._create_response(
+                    type="error",
+                    message=f"Vector store {store_id} not found"
+                )
+            return self._create_store_stats(stats)
+            
+        elif last_message.get_message_type() in ("rag_compact_store", "rag_delete_store") and last_message.get_author_type() == "human":
+            # Compact or delete a store, unless a background job is building it; only people may
+            # ask for it, never a model or tool message
+            store_id = last_message.get_message_value_by_attribute("store_id")
+            error_response = self._check_not_building(store_id)
+            if error_response:
+                return error_response
+            
+            try:
+                if last_message.get_message_type() == "rag_compact_store":
+                    result = self.rag_service.compact(store_id)
+                    response_type = "store_compacted"
+                    message = f"Reclaimed {result['reclaimed_bytes']} bytes, {store_id} now takes {result['total_bytes']} bytes"
+                else:
+                    result = self.rag_service.delete_store(store_id)
+                    response_type = "store_deleted"
+                    message = f"Reclaimed {result['reclaimed_bytes']} bytes"
+            except ValueError as error:
+                return self._create_response(
+                    type="error",
+                    store_id=store_id,
+                    message=str(error)
+                )
+            return self._create_response(
+                type=response_type,
+                store_id=store_id,
+                message=message
             )
             
         elif last_message.get_message_type() == "rag_query":
-            # Handle vector store query
+            # Handle vector store query (over one or several stores)
             store_id = last_message.get_message_value_by_attribute("store_id")
             query = last_message.get_message_value_by_attribute("query")
+            query_filter = last_message.get_message_value_by_attribute("filter") or None
             
-            # Check if store exists
-            store_info = self.rag_service.get_store_info(store_id)
-            if not store_info:
-                return SinglePartMessage.create_message(
-                    author="genai",
-                    author_type="genai",
-                    message_type="rag_response",
-                    message_value={
-                        "type": "error",
-                        "message": f"Vector store {store_id} not found"
-                    }
-                )
+            # Check if the stores exist and the filter is valid
+            error_response = self._check_stores(store_id) or self._check_filter(query_filter)
+            if error_response:
+                return error_response
+            
+            result = self.rag_service.query(store_id, query, filter=query_filter)
             
-            result = self.rag_service.query(store_id, query)
+            return self._create_response(
+                type="query_result",
+                store_id=result["store_id"],
+                answer=result["answer"]
+            )
             
-            return SinglePartMessage.create_message(
+        return None
+
+    def stream_message(self, chat: Chat) -> Optional[Union[SinglePartMessage, MultiPartMessage]]:
+        """
+        Process the last message in the chat, streaming query answers into the chat.
+        
+        For a `rag_query` message, an empty `query_result` response is appended
+        to the chat first and every answer token is then added to its `answer`
+        attribute with `Chat.append_message_chunk_by_attribute` as soon as it is
+        generated. All other messages are handled by `process_message` and the
+        response (if any) is appended to the chat.
+        
+        Args:
+            chat (Chat): The chat containing the message to process
+            
+        Returns:
+            Optional[Union[SinglePartMessage, MultiPartMessage]]: The last message of
+            the chat after processing, or None if no response was needed
+            
+        Example:
+            ```python
+            # Stream the answer to a query message
+            rag_handler.stream_message(chat)
+            print(chat.get_messages()[-1].get_message_value_by_attribute("answer"))
+            ```
+        """
+        last_message = chat.get_messages()[-1]
+        
+        if last_message.get_message_type() != "rag_query":
+            response = self.process_message(chat)
+            if response is None:
+                return None
+            chat.append_message(response)
+            return chat.get_messages()[-1]
+        
+        store_id = last_message.get_message_value_by_attribute("store_id")
+        query = last_message.get_message_value_by_attribute("query")
+        query_filter = last_message.get_message_value_by_attribute("filter") or None
+        
+        # Check if the stores exist and the filter is valid
+        error_response = self._check_stores(store_id) or self._check_filter(query_filter)
+        if error_response:
+            chat.append_message(error_response)
+            return chat.get_messages()[-1]
+        
+        chat.append_message(self._create_response(
+            type="query_result",
+            store_id=store_id
+        ))
+        for token in self.rag_service.query_stream(store_id, query, filter=query_filter):
+            chat.append_message_chunk_by_attribute(
                 author="genai",
                 author_type="genai",
                 message_type="rag_response",
-                message_value={
-                    "type": "query_result",
-                    "store_id": result["store_id"],
-                    "answer": result["answer"]
-                }
+                message_chunk_by_attribute=token,
+                key="answer"
             )
             
-        return None 
\ No newline at end of file
+        return chat.get_messages()[-1]
+
+    def append_job_updates(self, chat: Chat) -> int:
+        """
+        Add the updates of the background builds started from a chat to it, as `rag_job_status`
+        messages. The builds run in worker threads, so their updates are queued and only
+        added to the chat here, on the thread that serves the chat (e.g. on every rerun of
+        the app).
+        
+        Args:
+            chat (Chat): The chat the builds were started from
+            
+        Returns:
+            int: The number of messages added
+            
+        Example:
+            ```python
+            rag_handler.append_job_updates(chat)
+            status = chat.get_messages()[-1]
+            print(status.get_message_value_by_attribute("status"))  # "running"
+            ```
+        """
+        added = 0
+        for job_id, (job_chat, updates) in list(self._job_updates.items()):
+            if job_chat is not chat:
+                continue
+            while True:
+                try:
+                    job = updates.get_nowait()
+                except Empty:
+                    break
+                chat.append_message(self._create_job_status(job))
+                added += 1
+                if job["status"] not in ("queued", "running"):
+                    del self._job_updates[job_id]
+        return added
+
+    def _submit_job(self, chat: Chat, store_id: str, files: List[str]) -> SinglePartMessage:
+        """
+        Queue the build of a vector store on the job queue.
+        
+        Args:
+            chat (Chat): The chat the build is started from, which gets its updates
+            store_id (str): ID of the vector store
+            files (List[str]): List of file paths to process
+            
+        Returns:
+            SinglePartMessage: A `job_queued` response with the job ID, or an error response
+            if the store is already being built
+        """
+        updates = Queue()
+        try:
+            job_id = self.job_queue.submit(store_id, files, on_update=updates.put)
+        except ValueError as error:
+            return self._create_response(
+                type="error",
+                store_id=store_id,
+                message=str(error)
+            )
+        self._job_updates[job_id] = (chat, updates)
+        return self._create_response(
+            type="job_queued",
+            store_id=store_id,
+            job_id=job_id,
+            message=f"Building {store_id} from {len(files)} files in the background"
+        )
+
+    def _create_job_status(self, job: Dict[str, Any]) -> SinglePartMessage:
+        """
+        Create a `rag_job_status` message from a job of the job queue.
+        
+        Args:
+            job (Dict[str, Any]): The job, as returned by `IngestionJobQueue.get_job`
+            
+        Returns:
+            SinglePartMessage: The status message
+        """
+        status_value = dict(message_types.message_types["rag_job_status"]["empty_message_value"])
+        status_value.update({key: job[key] for key in status_value})
+        
+        return SinglePartMessage.create_message(
+            author="genai",
+            author_type="genai",
+            message_type="rag_job_status",
+            message_value=status_value
+        )
+
+    def _create_store_stats(self, stats: Dict[str, Any]) -> SinglePartMessage:
+        """
+        Create a `rag_store_stats` message from the storage statistics of a store.
+        
+        Args:
+            stats (Dict[str, Any]): The statistics, as returned by `RAGService.stats`
+            
+        Returns:
+            SinglePartMessage: The statistics message
+        """
+        stats_value = dict(message_types.message_types["rag_store_stats"]["empty_message_value"])
+        stats_value.update({key: stats[key] for key in stats_value})
+        stats_value["fragmentation"] = float(stats_value["fragmentation"])
+        
+        return SinglePartMessage.create_message(
+            author="genai",
+            author_type="genai",
+            message_type="rag_store_stats",
+            message_value=stats_value
+        )
+
+    def _check_not_building(self, store_id: str) -> Optional[SinglePartMessage]:
+        """
+        Check that no background job is building a store.
+        
+        Args:
+            store_id (str): ID of the vector store
+            
+        Returns:
+            Optional[SinglePartMessage]: An error response if a build of the store is queued or
+            running, or None
+        """
+        if self.job_queue is None:
+            return None
+        from rag.jobs import ACTIVE_STATUSES
+        if not any(job["store_id"] == store_id for job in self.job_queue.list_jobs(ACTIVE_STATUSES)):
+            return None
+        return self._create_response(
+            type="error",
+            store_id=store_id,
+            message=f"Vector store {store_id} is being built"
+        )
+
+    def _check_stores(self, store_id: Union[str, List[str]]) -> Optional[SinglePartMessage]:
+        """
+        Check that all queried vector stores exist.
+        
+        Args:
+            store_id (Union[str, List[str]]): ID or IDs of the queried vector stores
+            
+        Returns:
+            Optional[SinglePartMessage]: An error response naming the missing stores, or None if all exist
+        """
+        store_ids = [store_id] if isinstance(store_id, str) else store_id
+        if not store_ids:
+            return self._create_response(
+                type="error",
+                message="No vector store given"
+            )
+            
+        missing_store_ids = [single_store_id for single_store_id in store_ids if not self.rag_service.get_store_info(single_store_id)]
+        if not missing_store_ids:
+            return None
+            
+        return self._create_response(
+            type="error",
+            message=f"Vector store {', '.join(missing_store_ids)} not found"
+        )
+
+    def _check_filter(self, query_filter: Optional[Dict[str, Any]]) -> Optional[SinglePartMessage]:
+        """
+        Check that the metadata filter of a query is well formed.
+        
+        Args:
+            query_filter (Optional[Dict[str, Any]]): The filter expression, or None
+            
+        Returns:
+            Optional[SinglePartMessage]: An error response describing the problem, or None if the filter is valid
+        """
+        if query_filter is None:
+            return None
+        from rag.metadata_index import validate_filter
+        try:
+            validate_filter(query_filter)
+        except ValueError as error:
+            return self._create_response(
+                type="error",
+                message=f"Invalid filter: {error}"
+            )
+        return None
+
+    def _create_response(self, **message_value) -> SinglePartMessage:
+        """
+        Create a `rag_response` message, filling unset attributes with their empty values.
+        
+        Args:
+            **message_value: The `rag_response` attributes to set
+            
+        Returns:
+            SinglePartMessage: The response message
+        """
+        response_value = dict(message_types.message_types["rag_response"]["empty_message_value"])
+        response_value.update(message_value)
+        
+        return SinglePartMessage.create_message(
+            author="genai",
+            author_type="genai",
+            message_type="rag_response",
+            message_value=response_value
+        ) 
\ No newline at end of file
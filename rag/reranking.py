@@ -0,0 +1,231 @@
+"""
+RAG Re-ranking
+
+This module provides the re-rankers of the optional re-ranking stage of `RAGService`. With
+re-ranking, a store's retriever fetches a larger pool of candidates cheaply, a re-ranker scores
+every candidate against the query, and only the best few chunks are passed to the LLM, so prompts
+stay short without losing the relevant chunks.
+
+Re-rankers by name (see `RERANKERS`):
+    - "lexical": `LexicalOverlapReranker`, IDF-weighted query term overlap blended with the
+      retrieval score; works offline and needs no model
+    - "cross_encoder": `CrossEncoderReranker`, a local cross-encoder model (requires
+      `sentence-transformers`)
+
+Other re-rankers subclass `Reranker` and implement its abstract `score(query, documents)` method,
+which returns one relevance score in [0, 1] per document. Re-ranked results are kept in a `RerankCache`.
+
+Example:
+    ```python
+    from rag.reranking import LexicalOverlapReranker
+
+    reranker = LexicalOverlapReranker()
+    scores = reranker.score("Who signed bill HR-1234?", documents)
+    # Returns: [0.84, 0.12, ...]
+    ```
+"""
+
+import math
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from threading import Lock
+from typing import Any, List, Optional
+
+from langchain.docstore.document import Document
+
+from rag.lexical_index import tokenize
+
+class Reranker(ABC):
+    """
+    Base class of re-rankers. Subclasses score candidate documents against a query; a subclass
+    without a `score` method can't be instantiated.
+    """
+
+    @abstractmethod
+    def score(self, query: str, documents: List[Document]) -> List[float]:
+        """
+        Score candidate documents against a query.
+
+        Args:
+            query (str): The query text
+            documents (List[Document]): The candidates, best retrieved first
+
+        Returns:
+            List[float]: The relevance score in [0, 1] of every document
+        """
+
+class LexicalOverlapReranker(Reranker):
+    """
+    Scores documents by the share of the query terms they contain, each term weighted by its
+    inverse document frequency within the candidates, blended with the retrieval score.
+
+    Attributes:
+        retrieval_weight (float): Weight of the retrieval score ("score" metadata) in the
+            blended score; the term overlap has weight `1 - retrieval_weight`
+    """
+
+    def __init__(self, retrieval_weight: float = 0.3):
+        """
+        Initialize the re-ranker.
+
+        Args:
+            retrieval_weight (float): Weight of the retrieval score in [0, 1]
+        """
+        self.retrieval_weight = retrieval_weight
+
+    def score(self, query: str, documents: List[Document]) -> List[float]:
+        """
+        Score candidate documents against a query.
+
+        Args:
+            query (str): The query text
+            documents (List[Document]): The candidates, best retrieved first
+
+        Returns:
+            List[float]: The relevance score in [0, 1] of every document
+        """
+        query_terms = set(tokenize(query))
+        document_terms = [set(tokenize(document.page_content)) for document in documents]
+        document_frequencies = Counter(term for terms in document_terms for term in terms & query_terms)
+        weights = {term: math.log(1 + (len(documents) + 1) / (document_frequencies[term] + 1)) for term in query_terms}
+        total_weight = sum(weights.values())
+
+        scores = []
+        for document, terms in zip(documents, document_terms):
+            overlap = sum(weights[term] for term in terms & query_terms) / total_weight if total_weight else 0.0
+            retrieval_score = document.metadata.get("score", 0.0)
+            scores.append((1 - self.retrieval_weight) * overlap + self.retrieval_weight * retrieval_score)
+        return scores
+
+class CrossEncoderReranker(Reranker):
+    """
+    Scores query and document pairs with a local cross-encoder model of `sentence-transformers`.
+    The model is loaded on the first call.
+
+    Attributes:
+        model_name (str): Name or path of the cross-encoder model
+        batch_size (int): Number of pairs scored at once
+        max_length (int): Maximum number of tokens of a pair
+    """
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size: int = 32, max_length: int = 512):
+        """
+        Initialize the re-ranker.
+
+        Args:
+            model_name (str): Name or path of the cross-encoder model
+            batch_size (int): Number of pairs scored at once
+            max_length (int): Maximum number of tokens of a pair
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self._model = None
+        self._lock = Lock()
+
+    def score(self, query: str, documents: List[Document]) -> List[float]:
+        """
+        Score candidate documents against a query.
+
+        Args:
+            query (str): The query text
+            documents (List[Document]): The candidates, best retrieved first
+
+        Returns:
+            List[float]: The relevance score in [0, 1] of every document (the sigmoid of the
+            model's logit)
+
+        Raises:
+            ImportError: If `sentence-transformers` is not installed
+        """
+        if not documents:
+            return []
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name, max_length=self.max_length)
+        logits = self._model.predict([(query, document.page_content) for document in documents], batch_size=self.batch_size)
+        return [1 / (1 + math.exp(-float(logit))) for logit in logits]
+
+# Available re-rankers by name
+RERANKERS = {
+    "lexical": LexicalOverlapReranker,
+    "cross_encoder": CrossEncoderReranker,
+}
+
+def create_reranker(name: str) -> Reranker:
+    """
+    Create a re-ranker by name with its default options.
+
+    Args:
+        name (str): Name of the re-ranker in `RERANKERS`
+
+    Returns:
+        Reranker: The re-ranker
+
+    Raises:
+        ValueError: If the re-ranker is unknown
+    """
+    if name not in RERANKERS:
+        raise ValueError(f"Unknown reranker {name}")
+    return RERANKERS[name]()
+
+class RerankCache:
+    """
+    A thread-safe least recently used cache of re-ranked results.
+
+    Keys identify the store and its version, so results of a store that changed are never
+    returned; they age out of the cache instead.
+
+    Attributes:
+        max_size (int): Maximum number of cached results
+    """
+
+    def __init__(self, max_size: int = 256):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_size (int): Maximum number of cached results
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Any) -> Optional[List[Document]]:
+        """
+        Get cached results.
+
+        Args:
+            key (Any): The cache key
+
+        Returns:
+            Optional[List[Document]]: Copies of the cached documents, or None on a miss
+        """
+        with self._lock:
+            documents = self._entries.get(key)
+            if documents is None:
+                return None
+            self._entries.move_to_end(key)
+        return [Document(page_content=document.page_content, metadata=dict(document.metadata)) for document in documents]
+
+    def put(self, key: Any, documents: List[Document]) -> None:
+        """
+        Cache results, evicting the least recently used results if the cache is full.
+
+        Args:
+            key (Any): The cache key
+            documents (List[Document]): The results
+        """
+        with self._lock:
+            self._entries[key] = [Document(page_content=document.page_content, metadata=dict(document.metadata)) for document in documents]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Remove all cached results.
+        """
+        with self._lock:
+            self._entries.clear()
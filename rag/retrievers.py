@@ -0,0 +1,324 @@
+"""
+RAG Retrievers
+
+This module provides the LangChain retrievers used by `RAGService`:
+    - ScoredVectorRetriever: vector search that keeps the relevance score of every result
+    - HybridRetriever: fuses vector search and BM25 keyword search with reciprocal rank fusion
+    - FederatedRetriever: searches several stores in parallel and fuses the results by rank
+    - RerankingRetriever: re-ranks a larger candidate pool of another retriever (see `rag.reranking`)
+    - ContextPackingRetriever: packs the results of another retriever into a token budget
+      (see `rag.context`)
+
+Every retriever stores a relevance score in [0, 1] in the metadata of the returned
+documents under "score". Scores of stores with different retrieval modes or re-rankers are
+on different scales, so results of different stores are fused by rank, not by score.
+
+A metadata filter expression (see `rag.metadata_index`) can be passed with every call in the
+LangChain run metadata under `FILTER_METADATA_KEY`; only matching chunks are then searched. It
+reaches the retriever through a chain as well, e.g.
+`chain({"question": query}, metadata={FILTER_METADATA_KEY: {"source": "a.pdf"}})`.
+
+Example:
+    ```python
+    from rag.lexical_index import BM25Index
+    from rag.retrievers import FederatedRetriever, HybridRetriever
+
+    retriever = HybridRetriever(
+        vectorstore=vectorstore,
+        lexical_index=BM25Index.load("./chroma_db/my_store"),
+        k=4
+    )
+    docs = retriever.get_relevant_documents("Who signed bill HR-1234?")
+    docs = retriever.get_relevant_documents("Who signed bill HR-1234?", metadata={FILTER_METADATA_KEY: {"page": {"$lte": 10}}})
+
+    retriever = FederatedRetriever(retrievers=[retriever_a, retriever_b], k=4)
+    docs = retriever.get_relevant_documents("What is the main topic?")
+
+    retriever = RerankingRetriever(
+        base_retriever=ScoredVectorRetriever(vectorstore=vectorstore, k=20),
+        reranker=LexicalOverlapReranker(),
+        k=4
+    )
+    docs = retriever.get_relevant_documents("What is the main topic?")
+    ```
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain.docstore.document import Document
+from langchain.schema import BaseRetriever
+from langchain.vectorstores.base import VectorStore
+
+import instrumentation
+from rag.context import ContextPacker
+from rag.lexical_index import BM25Index
+from rag.metadata_index import normalize_filter
+from rag.reranking import Reranker, RerankCache
+
+# Key of the metadata filter expression in the LangChain run metadata
+FILTER_METADATA_KEY = "rag_filter"
+
+def get_filter(run_manager: CallbackManagerForRetrieverRun) -> Optional[Dict[str, Any]]:
+    """
+    Return the metadata filter expression passed with a retriever run, if any.
+
+    Args:
+        run_manager (CallbackManagerForRetrieverRun): LangChain callback manager of the run
+
+    Returns:
+        Optional[Dict[str, Any]]: The filter, with one key per dictionary as Chroma requires
+    """
+    filter = (run_manager.metadata or {}).get(FILTER_METADATA_KEY)
+    return normalize_filter(filter) if filter else None
+
+def document_key(document: Document) -> str:
+    """
+    Return a key identifying the chunk a document was retrieved from.
+
+    Chunks get a "chunk_id" at ingestion; the page content is used for
+    documents without one.
+
+    Args:
+        document (Document): The retrieved document
+
+    Returns:
+        str: The key of the document
+    """
+    return str(document.metadata.get("chunk_id", document.page_content))
+
+class ScoredVectorRetriever(BaseRetriever):
+    """
+    A vector store retriever that stores the relevance score of every result under "score".
+
+    Attributes:
+        vectorstore (VectorStore): The vector store to search
+        k (int): Number of documents to return
+    """
+
+    vectorstore: VectorStore
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        """
+        Retrieve the documents most similar to a query.
+
+        Args:
+            query (str): The query text
+            run_manager (CallbackManagerForRetrieverRun): LangChain callback manager
+
+        Returns:
+            List[Document]: The `k` most similar documents, best first
+        """
+        filter = get_filter(run_manager)
+        search_kwargs = {"filter": filter} if filter else {}
+        results = self.vectorstore.similarity_search_with_relevance_scores(query, k=self.k, **search_kwargs)
+        return [
+            Document(page_content=document.page_content, metadata={**document.metadata, "score": score})
+            for document, score in results
+        ]
+
+class HybridRetriever(BaseRetriever):
+    """
+    A retriever that combines vector search and BM25 keyword search.
+
+    Both searches return `candidate_k` results, which are fused with weighted
+    reciprocal rank fusion (RRF): every document scores
+    `weight / (rrf_k + rank)` for each result list it appears in. The fused
+    score, divided by the best possible fused score, is stored in the metadata
+    of the returned documents under "score".
+
+    Attributes:
+        vectorstore (VectorStore): The vector store to search
+        lexical_index (BM25Index): The BM25 index built over the same chunks
+        k (int): Number of documents to return
+        candidate_k (int): Number of candidates taken from each search
+        rrf_k (int): RRF rank offset; larger values flatten the rank weights
+        vector_weight (float): Weight of the vector search ranks
+        lexical_weight (float): Weight of the BM25 ranks
+    """
+
+    vectorstore: VectorStore
+    lexical_index: BM25Index
+    k: int = 4
+    candidate_k: int = 20
+    rrf_k: int = 60
+    vector_weight: float = 1.0
+    lexical_weight: float = 1.0
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        """
+        Retrieve the best documents for a query by fusing both searches.
+
+        Args:
+            query (str): The query text
+            run_manager (CallbackManagerForRetrieverRun): LangChain callback manager
+
+        Returns:
+            List[Document]: The `k` best documents, best first
+        """
+        filter = get_filter(run_manager)
+        search_kwargs = {"filter": filter} if filter else {}
+        vector_results = self.vectorstore.similarity_search(query, k=self.candidate_k, **search_kwargs)
+        lexical_results = [doc for doc, _ in self.lexical_index.search(query, k=self.candidate_k, filter=filter)]
+
+        fused_scores: Dict[str, float] = {}
+        documents: Dict[str, Document] = {}
+        for results, weight in ((vector_results, self.vector_weight), (lexical_results, self.lexical_weight)):
+            for rank, document in enumerate(results, start=1):
+                key = document_key(document)
+                documents.setdefault(key, document)
+                fused_scores[key] = fused_scores.get(key, 0.0) + weight / (self.rrf_k + rank)
+
+        best_keys = sorted(fused_scores, key=fused_scores.get, reverse=True)[:self.k]
+        max_score = (self.vector_weight + self.lexical_weight) / (self.rrf_k + 1)
+        return [
+            Document(page_content=documents[key].page_content, metadata={**documents[key].metadata, "score": fused_scores[key] / max_score})
+            for key in best_keys
+        ]
+
+class FederatedRetriever(BaseRetriever):
+    """
+    A retriever that searches several stores in parallel and fuses their results.
+
+    Every retriever runs in its own thread, so the retrieval latency is about
+    that of the slowest store instead of the sum over all stores. The stores
+    may score on different scales (vector relevance, fused hybrid scores,
+    re-ranking scores), so the results are fused by rank with reciprocal rank
+    fusion: a document at rank r of a store scores `1 / (rrf_k + r)`, divided
+    by the score at rank 1. A document found in several stores keeps its best
+    score. The score of the store is kept under "store_score".
+
+    Attributes:
+        retrievers (List[BaseRetriever]): The retrievers of the stores to search
+        k (int): Number of documents to return
+        rrf_k (int): RRF rank offset; larger values flatten the rank weights
+    """
+
+    retrievers: List[BaseRetriever]
+    k: int = 4
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        """
+        Retrieve the best documents for a query across all stores.
+
+        Args:
+            query (str): The query text
+            run_manager (CallbackManagerForRetrieverRun): LangChain callback manager
+
+        Returns:
+            List[Document]: The `k` best documents over all stores, best first
+        """
+        # The child callbacks carry the run metadata, including a filter, to every store
+        callbacks = run_manager.get_child()
+        with ThreadPoolExecutor(max_workers=max(len(self.retrievers), 1)) as executor:
+            result_lists = list(executor.map(lambda retriever: retriever.get_relevant_documents(query, callbacks=callbacks), self.retrievers))
+
+        fused_scores: Dict[str, float] = {}
+        documents: Dict[str, Document] = {}
+        for results in result_lists:
+            for rank, document in enumerate(results, start=1):
+                key = document_key(document)
+                score = (self.rrf_k + 1) / (self.rrf_k + rank)
+                if score > fused_scores.get(key, 0.0):
+                    fused_scores[key] = score
+                    documents[key] = document
+
+        # Stable sort, so documents of equal rank keep the order of the stores
+        best_keys = sorted(fused_scores, key=fused_scores.get, reverse=True)[:self.k]
+        return [
+            Document(
+                page_content=documents[key].page_content,
+                metadata={**documents[key].metadata, "score": fused_scores[key], "store_score": documents[key].metadata.get("score", 0.0)}
+            )
+            for key in best_keys
+        ]
+
+class RerankingRetriever(BaseRetriever):
+    """
+    A retriever that re-ranks the candidates of another retriever and returns the best few.
+
+    The base retriever fetches a larger candidate pool cheaply, the re-ranker scores every
+    candidate against the query, and the `k` best are returned with their re-ranking score
+    under "score" (the retrieval score is kept under "retrieval_score"). With a cache, the
+    results are cached by `cache_key` (the store and its version), query and filter.
+
+    Attributes:
+        base_retriever (BaseRetriever): The retriever of the candidates
+        reranker (Reranker): Scores the candidates against the query
+        k (int): Number of documents to return
+        cache (Optional[RerankCache]): Cache of the re-ranked results
+        cache_key (Any): Identifies the searched store and its version in the cache
+    """
+
+    base_retriever: BaseRetriever
+    reranker: Reranker
+    k: int = 4
+    cache: Optional[RerankCache] = None
+    cache_key: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        """
+        Retrieve the candidates for a query and return the best after re-ranking.
+
+        Args:
+            query (str): The query text
+            run_manager (CallbackManagerForRetrieverRun): LangChain callback manager
+
+        Returns:
+            List[Document]: The `k` best documents, best first
+        """
+        filter = get_filter(run_manager)
+        key = (self.cache_key, query, json.dumps(filter, sort_keys=True))
+        if self.cache is not None:
+            documents = self.cache.get(key)
+            if documents is not None:
+                return documents
+
+        # The child callbacks carry the run metadata, including a filter, to the base retriever
+        candidates = self.base_retriever.get_relevant_documents(query, callbacks=run_manager.get_child())
+        with instrumentation.timer("rag.rerank"):
+            scores = self.reranker.score(query, candidates)
+        ranked = sorted(zip(candidates, scores), key=lambda candidate: candidate[1], reverse=True)[:self.k]
+        documents = [
+            Document(
+                page_content=document.page_content,
+                metadata={**document.metadata, "score": score, "retrieval_score": document.metadata.get("score", 0.0)}
+            )
+            for document, score in ranked
+        ]
+
+        if self.cache is not None:
+            self.cache.put(key, documents)
+        return documents
+
+class ContextPackingRetriever(BaseRetriever):
+    """
+    A retriever that packs the results of another retriever into the context of a chain:
+    duplicates are dropped, chunks are selected best first within a token budget and
+    neighbouring chunks of a file are merged without their overlap (see `ContextPacker`).
+
+    Attributes:
+        base_retriever (BaseRetriever): The retriever of the chunks
+        packer (ContextPacker): Packs the chunks into passages
+    """
+
+    base_retriever: BaseRetriever
+    packer: ContextPacker
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        """
+        Retrieve the chunks for a query and pack them into passages.
+
+        Args:
+            query (str): The query text
+            run_manager (CallbackManagerForRetrieverRun): LangChain callback manager
+
+        Returns:
+            List[Document]: The passages, best first
+        """
+        documents = self.base_retriever.get_relevant_documents(query, callbacks=run_manager.get_child())
+        return self.packer.pack(documents)
@@ -0,0 +1,141 @@
+"""
+RAG Storage
+
+This module provides the storage statistics and compaction of Chroma stores used by
+`RAGService.stats` and `RAGService.compact` (NumPy stores report and compact their own files, see
+`NumpyVectorStore.get_storage_stats`). A persisted Chroma store is a directory containing:
+
+    - chroma.sqlite3: collections, segments, documents, metadata and the write-ahead log of
+      embeddings; deleted and replaced rows leave free pages behind, which only `VACUUM` returns
+    - one directory per HNSW vector segment, named by its segment ID: the vectors
+      (data_level0.bin) and the graph (link_lists.bin, header.bin, length.bin and
+      index_metadata.pickle); directories of segments that no longer exist are never removed
+
+The files are read with `sqlite3` directly, so `chromadb` is not needed.
+
+Example:
+    ```python
+    from rag.storage import chroma_storage_stats, compact_chroma
+
+    print(chroma_storage_stats("./chroma_db/my_store"))
+    # {"chunk_count": 1200, "embedding_bytes": 7372800, "index_bytes": 166400, ...}
+    compact_chroma("./chroma_db/my_store")
+    ```
+"""
+
+import os
+import shutil
+import sqlite3
+import uuid
+from typing import Dict, List
+
+CHROMA_DATABASE_FILE = "chroma.sqlite3"
+CHROMA_VECTORS_FILE = "data_level0.bin"
+
+def directory_size(path: str) -> int:
+    """
+    Return the bytes of all files below a directory.
+
+    Args:
+        path (str): The directory
+
+    Returns:
+        int: The total size of its files
+    """
+    total = 0
+    for directory, _, filenames in os.walk(path):
+        for filename in filenames:
+            file_path = os.path.join(directory, filename)
+            if not os.path.islink(file_path):
+                total += os.path.getsize(file_path)
+    return total
+
+def chroma_storage_stats(directory: str) -> Dict[str, int]:
+    """
+    Return the disk usage of a persisted Chroma store.
+
+    Args:
+        directory (str): The store directory
+
+    Returns:
+        Dict[str, int]: The number of chunks ("chunk_count"), the bytes of the HNSW vectors
+        ("embedding_bytes"), of the HNSW graphs ("index_bytes") and of the database in use
+        ("document_bytes"), the bytes of all files of the store ("total_bytes") and the bytes
+        that hold no live data, i.e. free database pages and the directories of segments that
+        no longer exist ("free_bytes")
+    """
+    stats = {"chunk_count": 0, "embedding_bytes": 0, "index_bytes": 0, "document_bytes": 0, "free_bytes": 0}
+    database_path = os.path.join(directory, CHROMA_DATABASE_FILE)
+    segment_ids = None
+    if os.path.exists(database_path):
+        connection = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True, timeout=30)
+        try:
+            page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+            page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = connection.execute("PRAGMA freelist_count").fetchone()[0]
+            stats["document_bytes"] = (page_count - free_pages) * page_size
+            stats["free_bytes"] = free_pages * page_size
+            stats["chunk_count"] = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            segment_ids = set(_segment_ids(connection))
+        except sqlite3.DatabaseError:
+            pass  # Not a Chroma database (yet), its pages still count as used
+        finally:
+            connection.close()
+
+    for segment_directory in _segment_directories(directory):
+        size = directory_size(os.path.join(directory, segment_directory))
+        if segment_ids is not None and segment_directory not in segment_ids:
+            stats["free_bytes"] += size
+            continue
+        vectors_path = os.path.join(directory, segment_directory, CHROMA_VECTORS_FILE)
+        vectors_size = os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0
+        stats["embedding_bytes"] += vectors_size
+        stats["index_bytes"] += size - vectors_size
+
+    stats["total_bytes"] = directory_size(directory)
+    return stats
+
+def compact_chroma(directory: str) -> None:
+    """
+    Compact a persisted Chroma store: remove the directories of segments that no longer
+    exist and rewrite the database without its free pages (`VACUUM`).
+
+    Args:
+        directory (str): The store directory
+    """
+    database_path = os.path.join(directory, CHROMA_DATABASE_FILE)
+    if not os.path.exists(database_path):
+        return
+    connection = sqlite3.connect(database_path, timeout=30, isolation_level=None)
+    try:
+        try:
+            segment_ids = set(_segment_ids(connection))
+        except sqlite3.DatabaseError:
+            return  # Without the segment table, no directory is known to be unused
+        for segment_directory in _segment_directories(directory):
+            if segment_directory not in segment_ids:
+                shutil.rmtree(os.path.join(directory, segment_directory))
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+
+def _segment_ids(connection: sqlite3.Connection) -> List[str]:
+    """
+    Return the IDs of the segments in a Chroma database.
+    """
+    return [row[0] for row in connection.execute("SELECT id FROM segments")]
+
+def _segment_directories(directory: str) -> List[str]:
+    """
+    Return the names of the segment directories of a Chroma store; they are named by UUID.
+    """
+    names = []
+    for entry in os.scandir(directory):
+        if not entry.is_dir():
+            continue
+        try:
+            uuid.UUID(entry.name)
+        except ValueError:
+            continue
+        names.append(entry.name)
+    return names
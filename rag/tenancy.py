@@ -0,0 +1,719 @@
+"""
+RAG Tenancy
+
+This module provides `MultiTenantRAGService`, which serves the stores of several tenants from one
+process without letting one tenant's work degrade the others:
+
+    - namespaces: every tenant has its own `TenantRAGService` with its own stores, chains and
+      caches, persisted in its own directory (`persist_dir/<tenant_id>`); the embeddings, the
+      LLM factory, the document parser and the re-rankers are shared
+    - quotas (see `DEFAULT_TENANT_QUOTA`): the number of stores, the number of chunks in all
+      stores, the resident memory of the loaded stores and the number of queries running at the
+      same time. Builds and imports over a quota fail with `QuotaExceededError`; when the loaded
+      stores need more memory than the quota, the least recently queried stores are unloaded and
+      loaded again by their next query; queries over the limit wait for the tenant's earlier queries
+    - fair scheduling (see `FairScheduler`): ingestion batches and queries of all tenants share a
+      fixed number of slots each, and a free slot goes to the waiting tenant with the fewest slots
+      in use. A large build embeds one batch at a time between the batches of other tenants'
+      builds, and queries never wait for ingestion
+
+Example:
+    ```python
+    from rag.tenancy import MultiTenantRAGService
+
+    tenants = MultiTenantRAGService(
+        persist_dir="./chroma_db",
+        default_quota={"max_stores": 10, "max_chunks": 200_000},
+        quotas={"acme": {"max_chunks": 1_000_000}},
+        vector_backend="numpy"
+    )
+    acme = tenants.get_service("acme")
+    acme.create_vectorstore(files=["doc1.pdf"], store_id="manuals")
+    print(acme.query("manuals", "What is the main topic?"))
+    print(tenants.get_usage("acme"))
+    # {"tenant_id": "acme", "stores": 1, "chunks": 420, "loaded_stores": 1, "resident_bytes": 1290240, ...}
+    ```
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from threading import Condition, Lock, RLock
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Union
+
+import instrumentation
+from rag.rag_api import RAGService, get_openai_api_key
+
+if TYPE_CHECKING:
+    from langchain.chains import ConversationalRetrievalChain
+    from langchain.docstore.document import Document
+    from langchain.embeddings.base import Embeddings
+    from langchain.vectorstores.base import VectorStore
+    from rag.jobs import IngestionJobQueue
+    from rag.lexical_index import BM25Index
+    from rag.parsing import DocumentParser
+    from rag.reranking import Reranker
+
+# Default quota of every tenant; None means no limit
+DEFAULT_TENANT_QUOTA = {
+    "max_stores": 20,
+    "max_chunks": 500_000,
+    "max_resident_bytes": 1 << 30,
+    "max_inflight_queries": 4,
+}
+
+# Tenant IDs and the store IDs of tenants
+_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]+")
+
+class QuotaExceededError(ValueError):
+    """
+    Raised when a tenant's build, import or store would exceed the tenant's quota.
+    """
+
+class FairScheduler:
+    """
+    Grants a fixed number of slots to the work of several tenants.
+
+    A free slot goes to the waiting tenant with the fewest slots in use, ties are broken round
+    robin, so a tenant with a lot of work uses all slots while no one else waits, but gets no
+    more than its share as soon as other tenants have work too.
+
+    Attributes:
+        slots (int): Number of slots
+        name (str): Name of the work; the time spent waiting for a slot is observed as
+            "rag.<name>_wait" with a "tenant" label
+    """
+
+    def __init__(self, slots: int, name: str):
+        """
+        Initialize the scheduler.
+
+        Args:
+            slots (int): Number of slots
+            name (str): Name of the work
+
+        Raises:
+            ValueError: If the number of slots is not positive
+        """
+        if slots < 1:
+            raise ValueError("slots must be positive")
+        self.slots = slots
+        self.name = name
+        self._condition = Condition()
+        self._active = Counter()  # Slots in use by tenant
+        self._waiting = OrderedDict()  # Waiting tickets by tenant, in round robin order
+        self._used = 0
+
+    def acquire(self, tenant_id: str, limit: Optional[int] = None) -> None:
+        """
+        Wait for a slot.
+
+        Args:
+            tenant_id (str): The tenant the work is done for
+            limit (Optional[int]): Maximum number of slots the tenant may use at the same time
+        """
+        ticket = {"limit": limit, "granted": False}
+        start_time = time.perf_counter()
+        with self._condition:
+            self._waiting.setdefault(tenant_id, deque()).append(ticket)
+            self._grant()
+            while not ticket["granted"]:
+                self._condition.wait()
+        instrumentation.observe(f"rag.{self.name}_wait", time.perf_counter() - start_time, tenant=tenant_id)
+
+    def release(self, tenant_id: str) -> None:
+        """
+        Give back a slot, granting it to the next waiting tenant.
+
+        Args:
+            tenant_id (str): The tenant the slot was acquired for
+        """
+        with self._condition:
+            self._active[tenant_id] -= 1
+            if self._active[tenant_id] <= 0:
+                del self._active[tenant_id]
+            self._used -= 1
+            self._grant()
+
+    @contextmanager
+    def slot(self, tenant_id: str, limit: Optional[int] = None) -> Iterator[None]:
+        """
+        Hold a slot while the block runs.
+
+        Args:
+            tenant_id (str): The tenant the work is done for
+            limit (Optional[int]): Maximum number of slots the tenant may use at the same time
+        """
+        self.acquire(tenant_id, limit)
+        try:
+            yield
+        finally:
+            self.release(tenant_id)
+
+    def get_usage(self, tenant_id: str) -> Dict[str, int]:
+        """
+        Get the number of slots a tenant uses and waits for.
+
+        Args:
+            tenant_id (str): The tenant
+
+        Returns:
+            Dict[str, int]: The slots in use ("active") and the waiting requests ("waiting")
+        """
+        with self._condition:
+            return {"active": self._active[tenant_id], "waiting": len(self._waiting.get(tenant_id, ()))}
+
+    def _grant(self) -> None:
+        """
+        Grant free slots to waiting tenants; called with the condition held.
+        """
+        granted = False
+        while self._used < self.slots:
+            eligible = [
+                tenant_id for tenant_id, tickets in self._waiting.items()
+                if tickets[0]["limit"] is None or self._active[tenant_id] < tickets[0]["limit"]
+            ]
+            if not eligible:
+                break
+            # min keeps the first of equal tenants, i.e. the one that waited longest for its turn
+            tenant_id = min(eligible, key=lambda eligible_id: self._active[eligible_id])
+            tickets = self._waiting.pop(tenant_id)
+            tickets.popleft()["granted"] = True
+            if tickets:
+                self._waiting[tenant_id] = tickets  # Back to the end of the round
+            self._active[tenant_id] += 1
+            self._used += 1
+            granted = True
+        if granted:
+            self._condition.notify_all()
+
+class TenantRAGService(RAGService):
+    """
+    The `RAGService` of one tenant of a `MultiTenantRAGService`, which enforces the tenant's quota
+    and schedules its ingestion batches and queries on the shared schedulers.
+
+    Attributes:
+        tenant_id (str): ID of the tenant
+        tenants (MultiTenantRAGService): The multi-tenant service the tenant belongs to
+        resident_sizes (OrderedDict[str, int]): Estimated resident bytes (embeddings and indexes)
+            of the loaded stores by ID, least recently queried first
+    """
+
+    def __init__(self, tenant_id: str, tenants: MultiTenantRAGService, persist_dir: str, **service_options: Any):
+        """
+        Initialize the tenant's service.
+
+        Args:
+            tenant_id (str): ID of the tenant
+            tenants (MultiTenantRAGService): The multi-tenant service the tenant belongs to
+            persist_dir (str): Directory of the tenant's stores
+            **service_options (Any): Further arguments of `RAGService`
+        """
+        super().__init__(persist_dir=persist_dir, **service_options)
+        self.tenant_id = tenant_id
+        self.tenants = tenants
+        self.resident_sizes = OrderedDict()
+        self._evicted = set()  # Stores unloaded to stay within the memory quota
+        self._pinned = set()  # Stores of the query being prepared, never unloaded
+        self._chunk_counts = None  # Chunks of the persisted stores and the running builds by ID
+        self._lock = RLock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """
+        The embeddings shared by all tenants.
+        """
+        return self.tenants.embeddings
+
+    @property
+    def document_parser(self) -> DocumentParser:
+        """
+        The document parser shared by all tenants.
+        """
+        return self.tenants.document_parser
+
+    def _get_reranker(self, name: str) -> Reranker:
+        """
+        Get a re-ranker by name from the re-rankers shared by all tenants, so models are loaded once.
+        """
+        return self.tenants.get_reranker(name)
+
+    def create_vectorstore(
+        self,
+        files: List[str],
+        store_id: str,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        **build_options: Any
+    ) -> Dict[str, Any]:
+        """
+        Create a vector store from a list of files, see `RAGService.create_vectorstore`.
+
+        The chunk quota is checked after every checkpoint of the build. A build that exceeds it
+        stops there and can be resumed once the quota is raised or other stores are deleted.
+
+        Raises:
+            ValueError: If the store ID is invalid
+            QuotaExceededError: If the store is new and the tenant has as many stores as its quota
+                allows, or the tenant's stores would hold more chunks than its quota allows
+        """
+        self._store_dir(store_id)
+        quota = self.tenants.get_quota(self.tenant_id)
+        with self._lock:
+            chunk_counts = self._get_chunk_counts()
+            self._check_store_quota(store_id, quota)
+            other_chunks = sum(count for other_store_id, count in chunk_counts.items() if other_store_id != store_id)
+            if quota["max_chunks"] is not None and other_chunks >= quota["max_chunks"]:
+                raise QuotaExceededError(f"Tenant {self.tenant_id} has reached its quota of {quota['max_chunks']} chunks")
+            chunk_counts.setdefault(store_id, 0)
+
+        def check_progress(progress: Dict[str, Any]) -> None:
+            # The counts include the running builds of other stores
+            with self._lock:
+                chunk_counts[store_id] = progress["document_count"]
+                if quota["max_chunks"] is not None and sum(chunk_counts.values()) > quota["max_chunks"]:
+                    raise QuotaExceededError(
+                        f"Tenant {self.tenant_id} exceeds its quota of {quota['max_chunks']} chunks, "
+                        f"building {store_id} stopped after {progress['document_count']} chunks"
+                    )
+            if progress_callback is not None:
+                progress_callback(progress)
+
+        try:
+            return super().create_vectorstore(files, store_id, progress_callback=check_progress, **build_options)
+        finally:
+            self._recount(store_id)
+
+    def import_store(self, archive_path: str, store_id: Optional[str] = None, overwrite: bool = False) -> Dict[str, Any]:
+        """
+        Import a vector store from an archive, see `RAGService.import_store`.
+
+        Raises:
+            ValueError: If the store ID is invalid
+            QuotaExceededError: If the store is new and the tenant has as many stores as its quota
+                allows, or the tenant's stores would hold more chunks than its quota allows
+        """
+        from rag.archive import read_archive_manifest
+
+        archive_manifest = read_archive_manifest(archive_path)
+        target_store_id = store_id or archive_manifest["store_id"]
+        self._store_dir(target_store_id)
+        quota = self.tenants.get_quota(self.tenant_id)
+        with self._lock:
+            chunk_counts = self._get_chunk_counts()
+            self._check_store_quota(target_store_id, quota)
+            other_chunks = sum(count for other_store_id, count in chunk_counts.items() if other_store_id != target_store_id)
+            if quota["max_chunks"] is not None and other_chunks + archive_manifest["chunk_count"] > quota["max_chunks"]:
+                raise QuotaExceededError(
+                    f"Tenant {self.tenant_id} would exceed its quota of {quota['max_chunks']} chunks "
+                    f"with the {archive_manifest['chunk_count']} chunks of {target_store_id}"
+                )
+
+        try:
+            return super().import_store(archive_path, store_id=store_id, overwrite=overwrite)
+        finally:
+            self._recount(target_store_id)
+
+    def delete_store(self, store_id: str) -> Dict[str, Any]:
+        """
+        Delete a vector store with all its files, see `RAGService.delete_store`.
+        """
+        self._store_dir(store_id)
+        with self._lock:
+            try:
+                return super().delete_store(store_id)
+            finally:
+                self._recount(store_id)
+
+    def get_store_info(self, store_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get information about a vector store, see `RAGService.get_store_info`. Stores unloaded
+        to stay within the memory quota exist, their next query loads them again.
+        """
+        with self._lock:
+            if store_id in self._evicted:
+                return {
+                    "store_id": store_id,
+                    "exists": True,
+                    "has_chain": False
+                }
+            return super().get_store_info(store_id)
+
+    def query(self, store_id: Union[str, List[str]], query: str, filter: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Query a vector store, see `RAGService.query`. The query waits for a query slot of the
+        shared scheduler while the tenant has its quota of queries running.
+        """
+        with self.tenants.query_scheduler.slot(self.tenant_id, self.tenants.get_quota(self.tenant_id)["max_inflight_queries"]):
+            return super().query(store_id, query, filter=filter)
+
+    def query_stream(self, store_id: Union[str, List[str]], query: str, filter: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        Query a vector store and yield the answer tokens, see `RAGService.query_stream`. The
+        query slot is held until the answer is complete.
+        """
+        with self.tenants.query_scheduler.slot(self.tenant_id, self.tenants.get_quota(self.tenant_id)["max_inflight_queries"]):
+            yield from super().query_stream(store_id, query, filter=filter)
+
+    def get_usage(self) -> Dict[str, Any]:
+        """
+        Get the resources the tenant uses.
+
+        Returns:
+            Dict[str, Any]: The number of stores, of chunks in all stores and running builds, of
+            loaded stores, their estimated resident bytes, and the number of queries running and
+            waiting for a slot
+        """
+        with self._lock:
+            chunk_counts = self._get_chunk_counts()
+            usage = {
+                "tenant_id": self.tenant_id,
+                "stores": len(chunk_counts),
+                "chunks": sum(chunk_counts.values()),
+                "loaded_stores": len(self.resident_sizes),
+                "resident_bytes": sum(self.resident_sizes.values())
+            }
+        query_usage = self.tenants.query_scheduler.get_usage(self.tenant_id)
+        usage["running_queries"] = query_usage["active"]
+        usage["waiting_queries"] = query_usage["waiting"]
+        return usage
+
+    def _add_batch(self, vectorstore: VectorStore, lexical_index: Optional[BM25Index], batch: List[Document]) -> None:
+        """
+        Embed and add a batch of chunks while holding an ingestion slot of the shared scheduler,
+        so the builds of all tenants take turns batch by batch.
+        """
+        with self.tenants.ingest_scheduler.slot(self.tenant_id):
+            super()._add_batch(vectorstore, lexical_index, batch)
+
+    def _create_chain(self, store_id: str) -> None:
+        """
+        Create the chain of a store that was loaded or built, and unload the least recently
+        queried stores if the loaded stores need more memory than the quota allows.
+
+        Raises:
+            QuotaExceededError: If the store alone needs more memory than the quota allows; it is
+                unloaded again
+        """
+        with self._lock:
+            super()._create_chain(store_id)
+            self._evicted.discard(store_id)
+            stats = self.stats(store_id)
+            self.resident_sizes[store_id] = stats["embedding_bytes"] + stats["index_bytes"] if stats is not None else 0
+            self.resident_sizes.move_to_end(store_id)
+
+            max_resident_bytes = self.tenants.get_quota(self.tenant_id)["max_resident_bytes"]
+            if max_resident_bytes is None:
+                return
+            for evicted_store_id in list(self.resident_sizes):
+                if sum(self.resident_sizes.values()) <= max_resident_bytes:
+                    return
+                if evicted_store_id == store_id or evicted_store_id in self._pinned:
+                    continue
+                self._forget_store(evicted_store_id)
+                self._evicted.add(evicted_store_id)
+                instrumentation.increment("rag.store_evictions", tenant=self.tenant_id)
+            if sum(self.resident_sizes.values()) > max_resident_bytes:
+                size = self.resident_sizes[store_id]
+                self._forget_store(store_id)
+                raise QuotaExceededError(
+                    f"Vectorstore {store_id} needs {size} bytes of memory, tenant {self.tenant_id} "
+                    f"has a quota of {max_resident_bytes} bytes"
+                )
+
+    def _get_chain(self, store_id: Union[str, List[str]]) -> ConversationalRetrievalChain:
+        """
+        Get the chain for one or several stores, see `RAGService._get_chain`, loading stores that
+        were unloaded to stay within the memory quota again.
+        """
+        store_ids = [store_id] if isinstance(store_id, str) else list(dict.fromkeys(store_id))
+        with self._lock:
+            self._pinned = set(store_ids)
+            try:
+                for single_store_id in store_ids:
+                    if single_store_id in self._evicted:
+                        self.load_vectorstore(single_store_id)
+                    if single_store_id in self.resident_sizes:
+                        self.resident_sizes.move_to_end(single_store_id)
+                return super()._get_chain(store_id)
+            finally:
+                self._pinned = set()
+
+    def _forget_store(self, store_id: str) -> None:
+        """
+        Remove a vector store and the chains that use it from the caches of the service.
+        """
+        with self._lock:
+            super()._forget_store(store_id)
+            self.resident_sizes.pop(store_id, None)
+            self._evicted.discard(store_id)
+
+    def _store_dir(self, store_id: str) -> str:
+        """
+        Return the directory of a store in the tenant's directory, see `RAGService._store_dir`.
+        Store IDs of tenants are restricted like tenant IDs (letters, digits, "_" and "-"), so no
+        store ID can name a path into another tenant's directory.
+
+        Raises:
+            ValueError: If the store ID is invalid
+        """
+        if not isinstance(store_id, str) or not _ID_PATTERN.fullmatch(store_id):
+            raise ValueError(f"Invalid store ID {store_id!r}")
+        return super()._store_dir(store_id)
+
+    def _check_store_quota(self, store_id: str, quota: Dict[str, Any]) -> None:
+        """
+        Check that the tenant may have a store with this ID; called with the lock held.
+
+        Raises:
+            QuotaExceededError: If the store is new and the tenant has as many stores as its quota allows
+        """
+        chunk_counts = self._get_chunk_counts()
+        if store_id not in chunk_counts and quota["max_stores"] is not None and len(chunk_counts) >= quota["max_stores"]:
+            raise QuotaExceededError(f"Tenant {self.tenant_id} has reached its quota of {quota['max_stores']} stores")
+
+    def _get_chunk_counts(self) -> Dict[str, int]:
+        """
+        Return the number of chunks of every persisted store and running build, counting the
+        persisted stores on first use; called with the lock held.
+        """
+        if self._chunk_counts is None:
+            self._chunk_counts = {}
+            if os.path.isdir(self.persist_dir):
+                for entry in os.scandir(self.persist_dir):
+                    # Other directories (e.g. hidden imports being extracted) are not stores
+                    stats = self.stats(entry.name) if entry.is_dir() and _ID_PATTERN.fullmatch(entry.name) else None
+                    if stats is not None:
+                        self._chunk_counts[entry.name] = stats["chunk_count"]
+        return self._chunk_counts
+
+    def _recount(self, store_id: str) -> None:
+        """
+        Count the chunks of a persisted store again after it was built, imported or deleted.
+        """
+        with self._lock:
+            chunk_counts = self._get_chunk_counts()
+            stats = self.stats(store_id)
+            if stats is None:
+                chunk_counts.pop(store_id, None)
+            else:
+                chunk_counts[store_id] = stats["chunk_count"]
+
+class MultiTenantRAGService:
+    """
+    Serves the vector stores of several tenants, each in its own namespace and within its own quota.
+
+    Attributes:
+        persist_dir (str): Directory of the tenants' directories
+        default_quota (Dict[str, Optional[int]]): Quota of tenants without their own quota
+        quotas (Dict[str, Dict[str, Optional[int]]]): Quotas of individual tenants by tenant ID
+        query_scheduler (FairScheduler): Schedules the queries of all tenants
+        ingest_scheduler (FairScheduler): Schedules the ingestion batches of all tenants
+        service_options (Dict[str, Any]): Arguments of the `TenantRAGService` of every tenant
+        services (Dict[str, TenantRAGService]): Services of the tenants by tenant ID, created on first use
+        job_queues (Dict[str, IngestionJobQueue]): Job queues of the tenants by tenant ID,
+            created on first use
+        rerankers (Dict[str, Reranker]): Re-rankers of all tenants by name, created from
+            `rag.reranking.RERANKERS` on first use unless registered at initialization
+    """
+
+    def __init__(
+        self,
+        persist_dir: str = "./chroma_db",
+        default_quota: Optional[Dict[str, Optional[int]]] = None,
+        quotas: Optional[Dict[str, Dict[str, Optional[int]]]] = None,
+        query_slots: int = 8,
+        ingest_slots: int = 2,
+        embeddings: Optional[Embeddings] = None,
+        document_parser: Optional[DocumentParser] = None,
+        rerankers: Optional[Dict[str, Reranker]] = None,
+        **service_options: Any
+    ):
+        """
+        Initialize the multi-tenant service.
+
+        Args:
+            persist_dir (str): Directory of the tenants' directories
+            default_quota (Optional[Dict[str, Optional[int]]]): Quota of tenants without their own
+                quota, overriding `DEFAULT_TENANT_QUOTA`
+            quotas (Optional[Dict[str, Dict[str, Optional[int]]]]): Quotas of individual tenants,
+                overriding the default quota, e.g. {"acme": {"max_chunks": 1_000_000}}
+            query_slots (int): Number of queries of all tenants that run at the same time
+            ingest_slots (int): Number of ingestion batches of all tenants embedded at the same time
+            embeddings (Optional[Embeddings]): Embeddings of all tenants instead of OpenAI embeddings
+            document_parser (Optional[DocumentParser]): Parser of all tenants instead of the default one
+            rerankers (Optional[Dict[str, Reranker]]): Re-rankers of all tenants to register by name
+            **service_options (Any): Further arguments of `RAGService` for every tenant, e.g.
+                `vector_backend` or `llm_factory`
+
+        Raises:
+            ValueError: If a quota has unknown keys
+        """
+        self.persist_dir = persist_dir
+        self.default_quota = self._validate_quota({**DEFAULT_TENANT_QUOTA, **(default_quota or {})})
+        self.quotas = {}
+        for tenant_id, quota in (quotas or {}).items():
+            self.set_quota(tenant_id, quota)
+        self.query_scheduler = FairScheduler(query_slots, "query")
+        self.ingest_scheduler = FairScheduler(ingest_slots, "ingest")
+        self.service_options = service_options
+        self.services = {}
+        self.job_queues = {}
+        self._embeddings = embeddings
+        self._document_parser = document_parser
+        self.rerankers = dict(rerankers or {})
+        self._lock = Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """
+        The embeddings of all tenants; OpenAI embeddings are created on first use.
+        """
+        with self._lock:
+            if self._embeddings is None:
+                from langchain.embeddings import OpenAIEmbeddings
+                self._embeddings = OpenAIEmbeddings(openai_api_key=get_openai_api_key())
+        return self._embeddings
+
+    @property
+    def document_parser(self) -> DocumentParser:
+        """
+        The document parser of all tenants; the default one is created on first use, with a
+        parse cache in `persist_dir/.parse_cache`.
+        """
+        with self._lock:
+            if self._document_parser is None:
+                from rag.parsing import DocumentParser
+                self._document_parser = DocumentParser(cache_dir=os.path.join(self.persist_dir, ".parse_cache"))
+        return self._document_parser
+
+    def get_reranker(self, name: str) -> Reranker:
+        """
+        Get a re-ranker by name, creating it from `rag.reranking.RERANKERS` on first use.
+
+        Args:
+            name (str): Name of a registered re-ranker or of a re-ranker in `RERANKERS`
+
+        Returns:
+            Reranker: The re-ranker
+
+        Raises:
+            ValueError: If the re-ranker is unknown
+        """
+        with self._lock:
+            if name not in self.rerankers:
+                from rag.reranking import create_reranker
+                self.rerankers[name] = create_reranker(name)
+            return self.rerankers[name]
+
+    def get_service(self, tenant_id: str) -> TenantRAGService:
+        """
+        Get the service of a tenant, creating it on first use.
+
+        Args:
+            tenant_id (str): ID of the tenant; letters, digits, "_" and "-"
+
+        Returns:
+            TenantRAGService: The tenant's service
+
+        Raises:
+            ValueError: If the tenant ID is invalid
+        """
+        if not _ID_PATTERN.fullmatch(tenant_id):
+            raise ValueError(f"Invalid tenant ID {tenant_id}")
+        with self._lock:
+            if tenant_id not in self.services:
+                self.services[tenant_id] = TenantRAGService(
+                    tenant_id,
+                    self,
+                    os.path.join(self.persist_dir, tenant_id),
+                    **self.service_options
+                )
+            return self.services[tenant_id]
+
+    def get_job_queue(self, tenant_id: str, **options: Any) -> IngestionJobQueue:
+        """
+        Get the job queue that builds the stores of a tenant in the background, creating it on
+        first use. Its jobs are recorded in the tenant's directory.
+
+        Args:
+            tenant_id (str): ID of the tenant
+            **options (Any): Further arguments of `IngestionJobQueue` when it is created
+
+        Returns:
+            IngestionJobQueue: The tenant's job queue
+        """
+        service = self.get_service(tenant_id)
+        with self._lock:
+            if tenant_id not in self.job_queues:
+                from rag.jobs import IngestionJobQueue
+                self.job_queues[tenant_id] = IngestionJobQueue(service, **options)
+            return self.job_queues[tenant_id]
+
+    def list_tenants(self) -> List[str]:
+        """
+        List the tenants that have a service or a directory in the persist directory.
+
+        Returns:
+            List[str]: The tenant IDs, sorted
+        """
+        tenant_ids = set(self.services)
+        if os.path.isdir(self.persist_dir):
+            tenant_ids.update(
+                entry.name for entry in os.scandir(self.persist_dir)
+                if entry.is_dir() and _ID_PATTERN.fullmatch(entry.name)
+            )
+        return sorted(tenant_ids)
+
+    def get_quota(self, tenant_id: str) -> Dict[str, Optional[int]]:
+        """
+        Get the quota of a tenant.
+
+        Args:
+            tenant_id (str): ID of the tenant
+
+        Returns:
+            Dict[str, Optional[int]]: The maximum number of stores ("max_stores"), of chunks in
+            all stores ("max_chunks"), of resident bytes of the loaded stores
+            ("max_resident_bytes") and of queries running at the same time
+            ("max_inflight_queries"); None means no limit
+        """
+        return self.quotas.get(tenant_id, self.default_quota)
+
+    def set_quota(self, tenant_id: str, quota: Dict[str, Optional[int]]) -> None:
+        """
+        Set the quota of a tenant. It applies to the tenant's next build, import, store load and query.
+
+        Args:
+            tenant_id (str): ID of the tenant
+            quota (Dict[str, Optional[int]]): The limits to change, overriding the default quota
+
+        Raises:
+            ValueError: If the quota has unknown keys
+        """
+        self.quotas[tenant_id] = self._validate_quota({**self.default_quota, **quota})
+
+    def get_usage(self, tenant_id: str) -> Dict[str, Any]:
+        """
+        Get the resources a tenant uses, see `TenantRAGService.get_usage`.
+
+        Args:
+            tenant_id (str): ID of the tenant
+
+        Returns:
+            Dict[str, Any]: The tenant's usage
+        """
+        return self.get_service(tenant_id).get_usage()
+
+    @staticmethod
+    def _validate_quota(quota: Dict[str, Optional[int]]) -> Dict[str, Optional[int]]:
+        """
+        Check that a quota only has known keys and return it.
+        """
+        unknown_keys = set(quota) - set(DEFAULT_TENANT_QUOTA)
+        if unknown_keys:
+            raise ValueError(f"Unknown quota keys {sorted(unknown_keys)}")
+        return quota
@@ -0,0 +1,65 @@
+"""
+Tests that the chat size accounting and the memory budget stay correct and cheap while a chat grows.
+"""
+
+from chat import Chat
+from memory_budget import MemoryBudgetPolicy
+from message import SinglePartMessage
+
+def _image_message(author, author_type, size):
+    return SinglePartMessage.create_message(
+        author=author,
+        author_type=author_type,
+        message_type="image_base64",
+        message_value={"filename": "image.png", "image_base64": b"x" * size, "mime_type": "image/png"}
+    )
+
+def _text_message(author, author_type, text):
+    return SinglePartMessage.create_message(author=author, author_type=author_type, message_type="text", message_value={"text": text})
+
+def test_size_is_recomputed_when_messages_are_reassigned():
+    chat = Chat()
+    chat.append_message(_image_message("human", "human", 1000))
+    chat.append_message(_text_message("assistant", "genai", "first"))
+    chat.append_message(_text_message("human", "human", "second"))
+    assert chat.get_size() >= 1000
+
+    chat.messages = [_text_message("human", "human", "a"), _text_message("assistant", "genai", "b")]
+
+    assert chat.get_size() == sum(message.get_size() for message in chat.messages)
+    assert "image_base64" not in chat.get_size_by_type()
+
+def test_budget_is_not_enforced_again_until_a_message_is_appended(monkeypatch):
+    chat = Chat()
+    policy = MemoryBudgetPolicy(max_bytes=500, action="evict", keep_recent=2)
+    chat.set_memory_budget(policy)
+    chat.append_message(_image_message("human", "human", 1000))
+    chat.append_message(_image_message("assistant", "genai", 1000))
+    assert chat.get_size() > policy.max_bytes
+
+    calls = []
+    enforce = policy.enforce
+    monkeypatch.setattr(policy, "enforce", lambda chat: calls.append(chat) or enforce(chat))
+    for _ in range(10):
+        chat.append_message_chunk_by_attribute("assistant", "genai", "text", "chunk", "text")
+    assert calls == []
+
+    chat.append_message(_text_message("human", "human", "next"))
+    assert len(calls) == 1
+    assert chat.get_messages()[0].get_message_value_by_attribute("image_base64") == b""
+
+def test_chunk_bytes_counter_matches_the_chat_size():
+    import instrumentation
+
+    chat = Chat()
+    chat.append_message(_text_message("human", "human", "question"))
+    size_before = chat.get_size()
+    registry = instrumentation.enable()
+    try:
+        for chunk in ("An ", "answer ", "with ", "ünïcödé"):
+            chat.append_message_chunk_by_attribute("assistant", "genai", "text", chunk, "text")
+    finally:
+        instrumentation.disable()
+
+    chunk_bytes = sum(value for (name, _), value in registry.counters.items() if name == "chat.chunk_bytes")
+    assert chunk_bytes == chat.get_size() - size_before == len("An answer with ünïcödé")
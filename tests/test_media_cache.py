@@ -0,0 +1,42 @@
+"""
+Tests that image thumbnails are only computed once per image and width.
+"""
+
+import io
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import media_cache
+from media_cache import MediaCache
+
+def _png(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def test_small_image_is_not_decoded_again(tmp_path, monkeypatch):
+    cache = MediaCache(cache_dir=str(tmp_path))
+    data = _png(100, 50)
+
+    assert cache.get_image_thumbnail(data, width=640) == data
+
+    def fail_open(*args, **kwargs):
+        raise AssertionError("image was decoded again")
+
+    monkeypatch.setattr(media_cache.Image, "open", fail_open)
+    assert cache.get_image_thumbnail(data, width=640) == data
+
+def test_large_image_thumbnail_is_cached(tmp_path, monkeypatch):
+    cache = MediaCache(cache_dir=str(tmp_path))
+    data = _png(1000, 500)
+
+    thumbnail = cache.get_image_thumbnail(data, width=640)
+    assert Image.open(io.BytesIO(thumbnail)).size == (640, 320)
+
+    def fail_open(*args, **kwargs):
+        raise AssertionError("image was decoded again")
+
+    monkeypatch.setattr(media_cache.Image, "open", fail_open)
+    assert cache.get_image_thumbnail(data, width=640) == thumbnail
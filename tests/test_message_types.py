@@ -0,0 +1,51 @@
+"""
+Tests that messages created before a message type got an optional attribute still load.
+"""
+
+from chat import Chat
+from message import SinglePartMessage
+
+def test_old_rag_query_message_is_created_with_an_empty_filter():
+    message = SinglePartMessage.create_message(
+        author="human",
+        author_type="human",
+        message_type="rag_query",
+        message_value={"store_id": "my_store", "query": "What is the main topic?"}
+    )
+
+    assert message.get_message_value() == {"store_id": "my_store", "query": "What is the main topic?", "filter": {}}
+
+def test_old_serialized_rag_query_message_loads():
+    old_message = {
+        "author": "human",
+        "author_type": "human",
+        "message_type": "rag_query",
+        "metadata": {},
+        "created_at": 1700000000.0,
+        "updated_at": 1700000000.0,
+        "message_value": {"store_id": "my_store", "query": "What is the main topic?"},
+        "message_value_keys": {"store_id", "query"},
+        "message_value_attribute_types": {"store_id": str, "query": str},
+    }
+
+    message = SinglePartMessage.from_dict(old_message)
+
+    assert message.get_message_value_by_attribute("filter") == {}
+    assert message.get_message_value_keys() == {"store_id", "query", "filter"}
+    assert old_message["message_value"] == {"store_id": "my_store", "query": "What is the main topic?"}
+
+    chat = Chat()
+    chat.append_message(message)
+    assert chat.get_messages()[-1].get_message_value_by_attribute("query") == "What is the main topic?"
+
+def test_rag_response_without_job_id_is_created_with_an_empty_job_id():
+    message_value = {"type": "answer", "store_id": "my_store", "answer": "The main topic.", "document_count": 0, "message": ""}
+    message = SinglePartMessage.create_message(
+        author="rag",
+        author_type="genai",
+        message_type="rag_response",
+        message_value=message_value
+    )
+
+    assert message.get_message_value() == {**message_value, "job_id": ""}
+    assert "job_id" in message.get_message_value_keys()
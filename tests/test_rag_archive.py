@@ -0,0 +1,106 @@
+"""
+Tests that store archives are only extracted when every file matches the archive manifest.
+"""
+
+import hashlib
+import io
+import json
+import os
+import tarfile
+
+import pytest
+
+from rag.archive import ARCHIVE_FORMAT_VERSION, ARCHIVE_MANIFEST, STORE_PREFIX, extract_archive, write_archive
+
+FILES = {"store_config.json": b'{"vector_backend": "numpy"}', "data/embeddings.bin": b"0123456789" * 100}
+
+def write_tar(archive_path, manifest_files, members):
+    """
+    Write an archive with a manifest listing manifest_files and the given members by archive path.
+    """
+    manifest = {
+        "format_version": ARCHIVE_FORMAT_VERSION,
+        "store_id": "manuals",
+        "vector_backend": "numpy",
+        "chunk_count": 1,
+        "created_at": 0,
+        "files": manifest_files,
+    }
+    with tarfile.open(archive_path, "w") as archive:
+        for name, data in list(members.items()) + [(ARCHIVE_MANIFEST, json.dumps(manifest).encode("utf-8"))]:
+            tar_info = tarfile.TarInfo(name)
+            tar_info.size = len(data)
+            archive.addfile(tar_info, io.BytesIO(data))
+
+def manifest_entry(path, data):
+    return {"path": path, "size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+
+def assert_nothing_extracted(tmp_path, destination):
+    assert not os.path.exists(destination)
+    if os.path.isdir(tmp_path):
+        assert [name for name in os.listdir(tmp_path) if name.startswith(".import-")] == []
+
+def test_archive_written_from_a_store_is_extracted(tmp_path):
+    store_dir = tmp_path / "store"
+    for path, data in FILES.items():
+        os.makedirs(os.path.dirname(store_dir / path), exist_ok=True)
+        (store_dir / path).write_bytes(data)
+    archive_path = str(tmp_path / "manuals.tar")
+    write_archive(str(store_dir), archive_path, {"store_id": "manuals", "vector_backend": "numpy", "chunk_count": 1})
+
+    extract_archive(archive_path, str(tmp_path / "copy"))
+
+    for path, data in FILES.items():
+        assert (tmp_path / "copy" / path).read_bytes() == data
+
+def test_tampered_member_is_rejected(tmp_path):
+    members = {STORE_PREFIX + path: data for path, data in FILES.items()}
+    members[STORE_PREFIX + "data/embeddings.bin"] = b"9123456789" * 100
+    archive_path = str(tmp_path / "tampered.tar")
+    write_tar(archive_path, [manifest_entry(path, data) for path, data in FILES.items()], members)
+
+    with pytest.raises(ValueError, match="Checksum mismatch for data/embeddings.bin"):
+        extract_archive(archive_path, str(tmp_path / "copy"))
+    assert_nothing_extracted(tmp_path, tmp_path / "copy")
+
+def test_member_missing_from_the_manifest_is_rejected(tmp_path):
+    members = {STORE_PREFIX + path: data for path, data in FILES.items()}
+    members[STORE_PREFIX + "extra.bin"] = b"extra"
+    archive_path = str(tmp_path / "extra.tar")
+    write_tar(archive_path, [manifest_entry(path, data) for path, data in FILES.items()], members)
+
+    with pytest.raises(ValueError, match="Unexpected archive member store/extra.bin"):
+        extract_archive(archive_path, str(tmp_path / "copy"))
+    assert_nothing_extracted(tmp_path, tmp_path / "copy")
+
+def test_file_missing_from_the_archive_is_rejected(tmp_path):
+    members = {STORE_PREFIX + "store_config.json": FILES["store_config.json"]}
+    archive_path = str(tmp_path / "missing.tar")
+    write_tar(archive_path, [manifest_entry(path, data) for path, data in FILES.items()], members)
+
+    with pytest.raises(ValueError, match="missing \\['data/embeddings.bin'\\]"):
+        extract_archive(archive_path, str(tmp_path / "copy"))
+    assert_nothing_extracted(tmp_path, tmp_path / "copy")
+
+@pytest.mark.parametrize("path", ["../evil.txt", "data/../../evil.txt", "/tmp/evil.txt"])
+def test_path_outside_the_store_is_rejected(tmp_path, path):
+    data = b"evil"
+    archive_path = str(tmp_path / "escape.tar")
+    write_tar(archive_path, [manifest_entry(path, data)], {STORE_PREFIX + path: data})
+
+    with pytest.raises(ValueError, match="outside the store"):
+        extract_archive(archive_path, str(tmp_path / "stores" / "copy"))
+    assert not os.path.exists(tmp_path / "stores" / "evil.txt")
+    assert not os.path.exists(tmp_path / "evil.txt")
+    assert_nothing_extracted(tmp_path / "stores", tmp_path / "stores" / "copy")
+
+def test_member_outside_the_store_prefix_is_rejected(tmp_path):
+    members = {STORE_PREFIX + path: data for path, data in FILES.items()}
+    members["../evil.txt"] = b"evil"
+    archive_path = str(tmp_path / "escape.tar")
+    write_tar(archive_path, [manifest_entry(path, data) for path, data in FILES.items()], members)
+
+    with pytest.raises(ValueError, match="Unexpected archive member ../evil.txt"):
+        extract_archive(archive_path, str(tmp_path / "stores" / "copy"))
+    assert not os.path.exists(tmp_path / "evil.txt")
+    assert_nothing_extracted(tmp_path / "stores", tmp_path / "stores" / "copy")
@@ -0,0 +1,32 @@
+"""
+Tests of the RAGHandler store maintenance messages.
+"""
+
+import json
+import os
+
+import pytest
+
+from chat import Chat
+from message import SinglePartMessage
+from rag.rag_api import RAGService
+from rag.rag_handler import RAGHandler
+
+@pytest.mark.parametrize("author_type", ["genai", "developer"])
+def test_delete_store_requires_a_human_author(tmp_path, author_type):
+    store_dir = tmp_path / "store"
+    os.makedirs(store_dir)
+    with open(store_dir / RAGService.STORE_CONFIG_FILE, "w") as config_file:
+        json.dump({"vector_backend": "numpy"}, config_file)
+    rag_handler = RAGHandler(RAGService(persist_dir=str(tmp_path)))
+
+    for message_type in ("rag_compact_store", "rag_delete_store"):
+        chat = Chat()
+        chat.append_message(SinglePartMessage.create_message(
+            author=author_type,
+            author_type=author_type,
+            message_type=message_type,
+            message_value={"store_id": "store"}
+        ))
+        assert rag_handler.process_message(chat) is None
+    assert os.path.isdir(store_dir)
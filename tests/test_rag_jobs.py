@@ -0,0 +1,123 @@
+"""
+Tests of the background build jobs: their progress, their interruption by a restart and the
+delivery of their updates to the chat that started them.
+"""
+
+import threading
+
+import pytest
+
+from chat import Chat
+from message import SinglePartMessage
+from rag.jobs import IngestionJobQueue
+from rag.rag_handler import RAGHandler
+
+class StubRAGService:
+    """
+    Builds nothing, but reports progress for every file like `RAGService.create_vectorstore`.
+    """
+
+    def __init__(self, persist_dir, release=None, error=None):
+        self.persist_dir = persist_dir
+        self.release = release
+        self.error = error
+        self.started = threading.Event()
+        self.builds = []
+
+    def create_vectorstore(self, files, store_id, progress_callback=None, **build_options):
+        self.builds.append((store_id, files, build_options))
+        progress_callback({"files_done": 1, "files_total": len(files), "document_count": 10})
+        self.started.set()
+        if self.release is not None:
+            self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return {"store_id": store_id, "document_count": 10 * len(files), "resumed_from": 0}
+
+def flatten(messages):
+    flat = []
+    for message in messages:
+        flat.extend(message.get_message_list() if message.get_message_type() == "multipart" else [message])
+    return flat
+
+def test_job_reports_progress_and_completes(tmp_path):
+    release = threading.Event()
+    rag_service = StubRAGService(str(tmp_path), release=release)
+    job_queue = IngestionJobQueue(rag_service, progress_interval=0)
+    updates = []
+
+    job_id = job_queue.submit("manuals", ["a.txt", "b.txt"], on_update=updates.append, vector_backend="numpy")
+    rag_service.started.wait(5)
+    job = job_queue.get_job(job_id)
+    assert (job["status"], job["files_done"], job["files_total"], job["document_count"]) == ("running", 1, 2, 10)
+    with pytest.raises(ValueError, match="already queued or running"):
+        job_queue.submit("manuals", ["a.txt"])
+
+    release.set()
+    job = job_queue.wait(job_id, timeout=5)
+    assert (job["status"], job["files_done"], job["document_count"]) == ("complete", 2, 20)
+    assert [update["status"] for update in updates] == ["running", "running", "complete"]
+    assert rag_service.builds == [("manuals", ["a.txt", "b.txt"], {"vector_backend": "numpy"})]
+    job_queue.shutdown()
+
+def test_failed_job_records_the_error(tmp_path):
+    job_queue = IngestionJobQueue(StubRAGService(str(tmp_path), error=RuntimeError("embedding timeout")))
+
+    job = job_queue.wait(job_queue.submit("manuals", ["a.txt"]), timeout=5)
+
+    assert (job["status"], job["message"]) == ("failed", "embedding timeout")
+    job_queue.shutdown()
+
+def test_jobs_of_a_stopped_process_are_interrupted_and_resumed(tmp_path):
+    release = threading.Event()
+    stopped_service = StubRAGService(str(tmp_path), release=release)
+    stopped_queue = IngestionJobQueue(stopped_service)
+    old_job_id = stopped_queue.submit("manuals", ["a.txt", "b.txt"], chunking_options={"chunk_size": 256})
+    stopped_service.started.wait(5)
+
+    # A new process opens the same job table while the build still counts as running
+    rag_service = StubRAGService(str(tmp_path))
+    job_queue = IngestionJobQueue(rag_service)
+    assert job_queue.get_job(old_job_id)["status"] == "interrupted"
+
+    job_ids = job_queue.resume_interrupted()
+    assert len(job_ids) == 1
+    assert job_queue.wait(job_ids[0], timeout=5)["status"] == "complete"
+    assert rag_service.builds == [("manuals", ["a.txt", "b.txt"], {"chunking_options": {"chunk_size": 256}})]
+    old_job = job_queue.get_job(old_job_id)
+    assert (old_job["status"], old_job["message"]) == ("resumed", f"Resumed as job {job_ids[0]}")
+    assert job_queue.resume_interrupted() == []
+
+    release.set()
+    stopped_queue.shutdown()
+    job_queue.shutdown()
+
+def test_job_updates_are_added_to_the_chat_that_started_the_build(tmp_path):
+    rag_service = StubRAGService(str(tmp_path))
+    job_queue = IngestionJobQueue(rag_service, progress_interval=0)
+    rag_handler = RAGHandler(rag_service, job_queue=job_queue)
+    chat = Chat()
+    other_chat = Chat()
+    chat.append_message(SinglePartMessage.create_message(
+        author="human",
+        author_type="human",
+        message_type="rag_create_store",
+        message_value={"store_id": "manuals", "files": ["a.txt", "b.txt"]}
+    ))
+
+    response = rag_handler.process_message(chat)
+    assert response.get_message_value_by_attribute("type") == "job_queued"
+    job_id = response.get_message_value_by_attribute("job_id")
+    chat.append_message(response)
+    job_queue.wait(job_id, timeout=5)
+
+    assert rag_handler.append_job_updates(other_chat) == 0
+    assert other_chat.get_messages() == []
+    assert rag_handler.append_job_updates(chat) == 3
+    statuses = [message for message in flatten(chat.get_messages()) if message.get_message_type() == "rag_job_status"]
+    assert [status.get_message_value_by_attribute("job_id") for status in statuses] == [job_id] * 3
+    assert statuses[-1].get_message_value_by_attribute("status") == "complete"
+    assert statuses[-1].get_message_value_by_attribute("document_count") == 20
+    # Finished jobs send no more updates
+    assert rag_handler.append_job_updates(chat) == 0
+    job_queue.shutdown()
@@ -0,0 +1,56 @@
+"""
+Tests that the BM25 index keeps its documents on disk and finds them after a reload.
+"""
+
+import json
+import os
+
+from langchain.docstore.document import Document
+
+from rag.lexical_index import BM25Index
+
+def _documents():
+    return [
+        Document(page_content="Bill HR-1234 was signed by the president.", metadata={"chunk_id": "s-0", "page": 1}),
+        Document(page_content="The moon speech was given in Houston.", metadata={"chunk_id": "s-1", "page": 2}),
+        Document(page_content="The president visited Houston.", metadata={"chunk_id": "s-2", "page": 3}),
+    ]
+
+def test_documents_are_kept_on_disk_and_found_after_loading(tmp_path):
+    index = BM25Index(directory=str(tmp_path))
+    index.add_documents(_documents())
+    index.save(str(tmp_path))
+
+    with open(tmp_path / BM25Index.INDEX_FILE) as index_file:
+        assert "documents" not in json.load(index_file)
+    assert os.path.exists(tmp_path / BM25Index.DOCUMENTS_FILE)
+    assert not os.path.exists(tmp_path / (BM25Index.DOCUMENTS_FILE + ".tmp"))
+
+    index = BM25Index.load(str(tmp_path))
+    assert len(index) == 3
+    document, _ = index.search("HR-1234", k=1)[0]
+    assert document.page_content == "Bill HR-1234 was signed by the president."
+    assert document.metadata == {"chunk_id": "s-0", "page": 1}
+    assert [document.metadata["chunk_id"] for document, _ in index.search("Houston", k=5, filter={"page": {"$gte": 3}})] == ["s-2"]
+
+def test_index_without_a_directory_is_copied_on_save(tmp_path):
+    index = BM25Index()
+    index.add_documents(_documents())
+    index.save(str(tmp_path))
+
+    assert [document.metadata["chunk_id"] for document, _ in BM25Index.load(str(tmp_path)).search("moon", k=1)] == ["s-1"]
+
+def test_index_with_documents_in_the_json_file_is_converted(tmp_path):
+    documents = _documents()
+    postings = {}
+    for number, document in enumerate(documents):
+        for term in document.page_content.lower().replace(".", "").replace("-", " ").split():
+            postings.setdefault(term, {})[str(number)] = postings.get(term, {}).get(str(number), 0) + 1
+    with open(tmp_path / BM25Index.INDEX_FILE, "w") as index_file:
+        json.dump({"k1": 1.5, "b": 0.75, "documents": [{"page_content": d.page_content, "metadata": d.metadata} for d in documents], "postings": postings}, index_file)
+
+    index = BM25Index.load(str(tmp_path))
+
+    assert [document.metadata["chunk_id"] for document, _ in index.search("moon speech", k=1)] == ["s-1"]
+    with open(tmp_path / BM25Index.INDEX_FILE) as index_file:
+        assert "documents" not in json.load(index_file)
@@ -0,0 +1,34 @@
+"""
+Tests that metadata filters only compare scalar values and keep values of different types apart.
+"""
+
+import numpy as np
+import pytest
+
+from rag.metadata_index import MetadataIndex, matches_filter, validate_filter
+
+@pytest.mark.parametrize("filter", [
+    {"source": ["a.pdf"]},
+    {"source": {"$eq": {"name": "a.pdf"}}},
+    {"source": {"$in": [["a.pdf"]]}},
+    {"source": {"$nin": [{"name": "a.pdf"}]}},
+    {"page": {"$gt": None}},
+    {"$or": [{"source": "a.pdf"}, {"page": [1]}]},
+])
+def test_non_scalar_operands_are_rejected(filter):
+    with pytest.raises(ValueError):
+        validate_filter(filter)
+
+def test_bool_and_int_values_do_not_match_each_other():
+    metadatas = [{"page": 1}, {"page": True}, {"page": 1.0}, {"page": 0}]
+    index = MetadataIndex()
+    index.add(metadatas)
+
+    assert index.match({"page": True}).tolist() == [1]
+    assert index.match({"page": 1}).tolist() == [0]
+    assert index.match({"page": {"$in": [True, 0]}}).tolist() == [1, 3]
+    assert index.match({"page": {"$ne": 1}}).tolist() == [1, 2, 3]
+    assert index.match({"page": {"$gte": 1}}).tolist() == [0, 2]
+    for filter in ({"page": True}, {"page": 1}, {"page": {"$nin": [1, False]}}):
+        expected = [row for row, metadata in enumerate(metadatas) if matches_filter(metadata, filter)]
+        assert index.match(filter).tolist() == expected
@@ -0,0 +1,25 @@
+"""
+Tests that re-rankers must implement score.
+"""
+
+from typing import List
+
+import pytest
+from langchain.docstore.document import Document
+
+from rag.reranking import LexicalOverlapReranker, Reranker
+
+def test_reranker_without_score_cannot_be_created():
+    class IncompleteReranker(Reranker):
+        pass
+
+    with pytest.raises(TypeError, match="score"):
+        IncompleteReranker()
+
+def test_reranker_subclasses_with_score_can_be_created():
+    class ConstantReranker(Reranker):
+        def score(self, query: str, documents: List[Document]) -> List[float]:
+            return [0.5] * len(documents)
+
+    assert ConstantReranker().score("question", [Document(page_content="text")]) == [0.5]
+    assert len(LexicalOverlapReranker().score("question", [Document(page_content="a question", metadata={"score": 1.0})])) == 1
@@ -0,0 +1,41 @@
+"""
+Tests that federated queries fuse the results of stores whose scores are on different scales by rank.
+"""
+
+from typing import List
+
+from langchain.docstore.document import Document
+from langchain.schema import BaseRetriever
+
+from rag.retrievers import FederatedRetriever
+
+class _FixedRetriever(BaseRetriever):
+    documents: List[Document]
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.documents
+
+def _documents(store, scores):
+    return [Document(page_content=f"{store} {rank}", metadata={"chunk_id": f"{store}-{rank}", "score": score}) for rank, score in enumerate(scores)]
+
+def test_results_are_fused_by_rank_not_by_score():
+    # A re-ranked store scores on a much lower scale than a hybrid store
+    reranked = _FixedRetriever(documents=_documents("reranked", [0.09, 0.08, 0.07]))
+    hybrid = _FixedRetriever(documents=_documents("hybrid", [1.0, 0.99, 0.98]))
+    retriever = FederatedRetriever(retrievers=[reranked, hybrid], k=4)
+
+    documents = retriever.get_relevant_documents("question")
+
+    assert [document.metadata["chunk_id"] for document in documents] == ["reranked-0", "hybrid-0", "reranked-1", "hybrid-1"]
+    assert documents[0].metadata["score"] == 1.0
+    assert documents[0].metadata["store_score"] == 0.09
+
+def test_a_document_found_in_several_stores_is_returned_once():
+    first = _FixedRetriever(documents=_documents("shared", [0.5, 0.4]))
+    second = _FixedRetriever(documents=list(reversed(_documents("shared", [0.5, 0.4]))))
+    retriever = FederatedRetriever(retrievers=[first, second], k=4)
+
+    documents = retriever.get_relevant_documents("question")
+
+    assert [document.metadata["chunk_id"] for document in documents] == ["shared-0", "shared-1"]
+    assert all(document.metadata["score"] == 1.0 for document in documents)
@@ -0,0 +1,51 @@
+"""
+Tests that store IDs can't reach outside the persist directory of a RAGService.
+"""
+
+import json
+import os
+
+import pytest
+
+from rag.rag_api import RAGService
+
+def make_store(directory: str) -> None:
+    """
+    Create a store directory with a store configuration and one data file.
+    """
+    os.makedirs(directory)
+    with open(os.path.join(directory, RAGService.STORE_CONFIG_FILE), "w") as config_file:
+        json.dump({"vector_backend": "numpy"}, config_file)
+    with open(os.path.join(directory, "data.bin"), "wb") as data_file:
+        data_file.write(b"0" * 16)
+
+@pytest.mark.parametrize("store_id", ["store/../../victim", "../victim", "", ".", "..", ".parse_cache", "store/nested"])
+def test_invalid_store_ids_are_rejected(tmp_path, store_id):
+    persist_dir = tmp_path / "stores"
+    make_store(str(persist_dir / "store"))
+    make_store(str(tmp_path / "victim"))
+    os.makedirs(persist_dir / ".parse_cache")
+    rag_service = RAGService(persist_dir=str(persist_dir))
+
+    for method in (rag_service.delete_store, rag_service.stats, rag_service.compact, rag_service.load_vectorstore):
+        with pytest.raises(ValueError, match="Invalid store ID"):
+            method(store_id)
+
+    assert os.path.exists(tmp_path / "victim" / "data.bin")
+    assert os.path.exists(persist_dir / "store" / "data.bin")
+    assert os.path.isdir(persist_dir / ".parse_cache")
+
+def test_absolute_store_id_is_rejected(tmp_path):
+    make_store(str(tmp_path / "victim"))
+    rag_service = RAGService(persist_dir=str(tmp_path / "stores"))
+
+    with pytest.raises(ValueError, match="Invalid store ID"):
+        rag_service.delete_store(str(tmp_path / "victim"))
+    assert os.path.exists(tmp_path / "victim" / "data.bin")
+
+def test_valid_store_id_is_deleted(tmp_path):
+    make_store(str(tmp_path / "stores" / "store"))
+    rag_service = RAGService(persist_dir=str(tmp_path / "stores"))
+
+    assert rag_service.delete_store("store")["reclaimed_bytes"] > 0
+    assert not os.path.exists(tmp_path / "stores" / "store")
@@ -0,0 +1,223 @@
+"""
+Tests that the tenants of a MultiTenantRAGService can't reach each other's stores, share the
+query and ingestion slots fairly and stay within their quotas.
+"""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+from langchain.embeddings import FakeEmbeddings
+
+from rag.rag_api import RAGService
+from rag.tenancy import FairScheduler, MultiTenantRAGService, QuotaExceededError
+
+def make_store(directory: str) -> None:
+    """
+    Create a store directory with a store configuration and one data file.
+    """
+    os.makedirs(directory)
+    with open(os.path.join(directory, RAGService.STORE_CONFIG_FILE), "w") as config_file:
+        json.dump({"vector_backend": "numpy"}, config_file)
+    with open(os.path.join(directory, "data.bin"), "wb") as data_file:
+        data_file.write(b"0" * 16)
+
+@pytest.mark.parametrize("store_id", ["x/../../bob/secret", "../bob/secret", "secret/..", "bob.secret"])
+def test_store_ids_cannot_reach_other_tenants(tmp_path, store_id):
+    make_store(str(tmp_path / "bob" / "secret"))
+    tenants = MultiTenantRAGService(persist_dir=str(tmp_path), embeddings=FakeEmbeddings(size=16))
+    alice = tenants.get_service("alice")
+
+    for method in (alice.stats, alice.delete_store, alice.compact, alice.load_vectorstore, alice.get_build_progress):
+        with pytest.raises(ValueError, match="Invalid store ID"):
+            method(store_id)
+    with pytest.raises(ValueError, match="Invalid store ID"):
+        alice.export_store(store_id, str(tmp_path / "secret.tar"))
+
+    assert os.path.exists(tmp_path / "bob" / "secret" / "data.bin")
+    assert tenants.get_service("bob").stats("secret")["store_id"] == "secret"
+
+def test_tenants_only_see_their_own_stores(tmp_path):
+    make_store(str(tmp_path / "bob" / "secret"))
+    tenants = MultiTenantRAGService(persist_dir=str(tmp_path), embeddings=FakeEmbeddings(size=16))
+    alice = tenants.get_service("alice")
+
+    assert alice.stats("secret") is None
+    with pytest.raises(ValueError, match="not found"):
+        alice.delete_store("secret")
+    assert tenants.get_usage("alice")["stores"] == 0
+    assert tenants.get_usage("bob")["stores"] == 1
+    assert os.path.exists(tmp_path / "bob" / "secret" / "data.bin")
+
+def parse_text(path):
+    with open(path) as text_file:
+        return [{"page_content": text_file.read(), "metadata": {"source": path}}]
+
+def make_tenants(tmp_path, **options):
+    from langchain.llms.fake import FakeListLLM
+    from rag.parsing import DocumentParser
+
+    return MultiTenantRAGService(
+        persist_dir=str(tmp_path / "stores"),
+        embeddings=FakeEmbeddings(size=16),
+        document_parser=DocumentParser(cache_dir=None, max_workers=1, parse_function=parse_text),
+        vector_backend="numpy",
+        llm_factory=lambda streaming=False: FakeListLLM(responses=["answer"] * 100),
+        **options
+    )
+
+def make_files(tmp_path, count, words=2000):
+    directory = tmp_path / "corpus"
+    directory.mkdir(exist_ok=True)
+    paths = []
+    for number in range(count):
+        path = directory / f"doc{number}.txt"
+        path.write_text(" ".join(f"word{(number * 7 + word) % 997}" for word in range(words)))
+        paths.append(str(path))
+    return paths
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+def test_free_slots_go_to_the_tenant_with_the_fewest_slots_in_use():
+    scheduler = FairScheduler(2, "test")
+    scheduler.acquire("alice")
+    scheduler.acquire("alice")
+    granted = []
+
+    def work(tenant_id):
+        with scheduler.slot(tenant_id):
+            granted.append(tenant_id)
+
+    threads = [threading.Thread(target=work, args=("alice",)) for _ in range(2)]
+    for number, thread in enumerate(threads):
+        thread.start()
+        wait_until(lambda: scheduler.get_usage("alice")["waiting"] == number + 1)
+    bob = threading.Thread(target=work, args=("bob",))
+    bob.start()
+    wait_until(lambda: scheduler.get_usage("bob")["waiting"] == 1)
+
+    # Alice waited longer, but still uses a slot, so bob gets the free one first
+    scheduler.release("alice")
+    for thread in threads + [bob]:
+        thread.join(5)
+    assert granted == ["bob", "alice", "alice"]
+
+    scheduler.release("alice")
+    assert scheduler.get_usage("alice") == {"active": 0, "waiting": 0}
+
+def test_tenants_with_equal_slots_take_turns():
+    scheduler = FairScheduler(1, "test")
+    scheduler.acquire("alice")
+    granted = []
+
+    def work(tenant_id):
+        with scheduler.slot(tenant_id):
+            granted.append(tenant_id)
+
+    threads = []
+    for tenant_id in ("alice", "alice", "alice", "bob", "bob"):
+        waiting = scheduler.get_usage(tenant_id)["waiting"]
+        threads.append(threading.Thread(target=work, args=(tenant_id,)))
+        threads[-1].start()
+        wait_until(lambda: scheduler.get_usage(tenant_id)["waiting"] == waiting + 1)
+
+    scheduler.release("alice")
+    for thread in threads:
+        thread.join(5)
+    assert granted == ["alice", "bob", "alice", "bob", "alice"]
+
+def test_tenant_limit_leaves_slots_to_other_tenants():
+    scheduler = FairScheduler(3, "test")
+    scheduler.acquire("alice", limit=2)
+    scheduler.acquire("alice", limit=2)
+    blocked = threading.Thread(target=scheduler.acquire, args=("alice", 2))
+    blocked.start()
+    wait_until(lambda: scheduler.get_usage("alice")["waiting"] == 1)
+
+    # The third slot is free, but alice is at her limit; bob gets it right away
+    scheduler.acquire("bob")
+    assert scheduler.get_usage("alice") == {"active": 2, "waiting": 1}
+
+    scheduler.release("alice")
+    blocked.join(5)
+    assert scheduler.get_usage("alice") == {"active": 2, "waiting": 0}
+
+def test_queries_over_max_inflight_queries_wait(tmp_path, monkeypatch):
+    tenants = make_tenants(tmp_path, default_quota={"max_inflight_queries": 1})
+    release = threading.Event()
+    running = []
+    max_running = {}
+
+    def query(self, store_id, query, filter=None):
+        running.append(self.tenant_id)
+        max_running[self.tenant_id] = max(max_running.get(self.tenant_id, 0), running.count(self.tenant_id))
+        release.wait(5)
+        running.remove(self.tenant_id)
+        return {"answer": "answer"}
+
+    monkeypatch.setattr(RAGService, "query", query)
+    threads = [threading.Thread(target=tenants.get_service(tenant_id).query, args=("store", "question")) for tenant_id in ("alice", "alice", "alice", "bob")]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: tenants.get_usage("alice")["waiting_queries"] == 2 and "bob" in running)
+    assert tenants.get_usage("alice")["running_queries"] == 1
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert max_running == {"alice": 1, "bob": 1}
+
+def test_build_stops_when_it_exceeds_the_chunk_quota(tmp_path):
+    tenants = make_tenants(tmp_path, default_quota={"max_chunks": 10})
+    alice = tenants.get_service("alice")
+    alice.INGEST_BATCH_SIZE = 4
+    files = make_files(tmp_path, 3)
+
+    with pytest.raises(QuotaExceededError, match="building manuals stopped"):
+        alice.create_vectorstore(files, "manuals")
+
+    progress = alice.get_build_progress("manuals")
+    assert progress["status"] != "complete"
+    assert 10 < progress["document_count"] <= 10 + alice.INGEST_BATCH_SIZE
+    assert tenants.get_usage("alice")["chunks"] == progress["document_count"]
+
+    # The build resumes once the quota allows the whole store
+    tenants.set_quota("alice", {"max_chunks": None})
+    result = alice.create_vectorstore(files, "manuals")
+    assert result["document_count"] > 10
+    assert alice.get_build_progress("manuals")["status"] == "complete"
+
+def test_build_of_a_store_over_the_store_quota_is_rejected(tmp_path):
+    tenants = make_tenants(tmp_path, default_quota={"max_stores": 1})
+    alice = tenants.get_service("alice")
+    files = make_files(tmp_path, 1, words=50)
+    alice.create_vectorstore(files, "first")
+
+    with pytest.raises(QuotaExceededError, match="quota of 1 stores"):
+        alice.create_vectorstore(files, "second")
+    assert alice.stats("second") is None
+    # Rebuilding an existing store is not a new store
+    alice.create_vectorstore(files, "first")
+
+def test_import_over_the_chunk_quota_is_rejected(tmp_path):
+    tenants = make_tenants(tmp_path, quotas={"alice": {"max_chunks": 5}})
+    bob = tenants.get_service("bob")
+    bob.create_vectorstore(make_files(tmp_path, 2), "manuals")
+    archive_path = str(tmp_path / "manuals.tar")
+    chunk_count = bob.export_store("manuals", archive_path)["document_count"]
+    assert chunk_count > 5
+
+    alice = tenants.get_service("alice")
+    with pytest.raises(QuotaExceededError, match=f"with the {chunk_count} chunks of manuals"):
+        alice.import_store(archive_path)
+    assert alice.stats("manuals") is None
+    assert tenants.get_usage("alice")["chunks"] == 0
+
+    tenants.set_quota("alice", {"max_chunks": chunk_count})
+    assert alice.import_store(archive_path)["document_count"] == chunk_count